@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+
+import metrics
+from order_tracker import open_orders
+from rate_limit import MONITORING, log_usage, priority
+from scheduler import MarketScheduler
+
+
+def share_connection_pool(clients, size):
+    """Point every Alpaca REST client at one requests session with `size` pooled connections per host."""
+    # Unwrap RateLimitedClient so the session is set on the Alpaca client itself
+    clients = [getattr(client, 'client', client) for client in clients]
+    clients = [client for client in clients if hasattr(client, '_session')]
+    if not clients:
+        return None
+    session = clients[0]._session
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    for client in clients[1:]:
+        client._session = session
+    return session
+
+
+class AsyncTraderLoop:
+    """Asyncio version of OnePercentTrader.run.
+
+    The clock, the trading decision and order monitoring each run on their own
+    cadence. The independent requests inside a decision (positions, orders
+    and market conditions) are issued concurrently, so a tick takes as long
+    as its slowest call rather than the sum of them. The Alpaca clients are
+    synchronous, so calls run on a bounded thread pool that shares one HTTP
+    connection pool.
+    """
+
+    def __init__(self, trader, decision_interval=60, monitor_interval=60, clock_interval=60, max_workers=8,
+                 scheduler=None):
+        self.trader = trader
+        # Cached clock; only hits the API when the market opens or closes
+        self.scheduler = scheduler or MarketScheduler(trader.trading_client)
+        self.decision_interval = decision_interval
+        self.monitor_interval = monitor_interval
+        self.clock_interval = clock_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="broker")
+        share_connection_pool([trader.trading_client, trader.data_client], max_workers)
+        self.clock = None
+        self._market_open = None  # asyncio.Event, created in run() on the loop that waits on it
+        self._warmed_for = None  # next_open the trader was last warmed up for
+        self._synced_for = None  # next_open trades were last recorded ahead of
+
+    async def call(self, func, *args, **kwargs):
+        """Run a blocking broker call on the shared thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _every(self, interval, task, first_delay=0):
+        """Run task() every interval seconds on a fixed schedule, logging failures."""
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + first_delay
+        await asyncio.sleep(first_delay)
+        while True:
+            try:
+                await task()
+            except Exception as e:
+                logging.error(f"Error in {task.__name__}: {e}")
+            next_run += interval
+            await asyncio.sleep(max(0, next_run - loop.time()))
+
+    async def refresh_clock(self):
+        self.clock = await self.call(self.scheduler.get_clock)
+        if self.clock.is_open:
+            self._market_open.set()
+            return
+
+        if self._market_open.is_set():
+            logging.info("Market is closed. Waiting...")
+            log_usage([self.trader.trading_client, self.trader.data_client])
+        self._market_open.clear()
+
+        # Record the session's completed trades once per close, as OnePercentTrader.run does
+        if self.trader.trade_store is not None and self._synced_for != self.clock.next_open:
+            self._synced_for = self.clock.next_open
+            await self.call(self.trader.sync_trades, self.trader.trade_store)
+
+        # Warm indicators up once, shortly before the next open
+        seconds_to_open = (self.clock.next_open - self.scheduler.now()).total_seconds()
+        if seconds_to_open <= self.scheduler.warm_up_seconds and self._warmed_for != self.clock.next_open:
+            self._warmed_for = self.clock.next_open
+            await self.call(self.trader.warm_up)
+
+    async def decide(self):
+        if not self._market_open.is_set():
+            return
+        started = time.monotonic()
+        if self.trader.order_book is not None:
+            # Positions and orders are local lookups; only market data goes out
+            positions = orders = None
+            market_ok = await self.call(self.trader.check_market_conditions)
+        else:
+            trading_client = self.trader.trading_client
+            positions, orders, market_ok = await asyncio.gather(
+                self.call(trading_client.get_all_positions),
+                self.call(open_orders, trading_client, [self.trader.symbol]),
+                self.call(self.trader.check_market_conditions)
+            )
+        await self.call(self.trader.step, positions, orders, market_ok)
+        elapsed = time.monotonic() - started
+        metrics.iteration_seconds.observe(elapsed, loop='async')
+        logging.info(f"Decision for {self.trader.symbol} took {elapsed:.2f}s")
+
+    async def monitor(self):
+        if not self._market_open.is_set():
+            return
+        orders = None
+        if self.trader.order_book is None:
+            orders = await self.call(self._monitoring_orders)
+        await self.call(self.trader.monitor_orders, orders)
+
+    def _monitoring_orders(self):
+        with priority(MONITORING):
+            return open_orders(self.trader.trading_client, [self.trader.symbol])
+
+    async def run(self):
+        """Run until cancelled."""
+        logging.info(f"Starting async trading bot for {self.trader.symbol}")
+        # Before Python 3.10 an Event binds to the loop current at creation
+        self._market_open = asyncio.Event()
+        await self.refresh_clock()
+        try:
+            await asyncio.gather(
+                self._every(self.clock_interval, self.refresh_clock, first_delay=self.clock_interval),
+                # Decide just after each bar closes
+                self._every(self.decision_interval, self.decide,
+                            first_delay=self.scheduler.seconds_until_next_bar()),
+                self._every(self.monitor_interval, self.monitor)
+            )
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+def run(trader, **kwargs):
+    """Run a trader on the asyncio loop until interrupted."""
+    asyncio.run(AsyncTraderLoop(trader, **kwargs).run())
@@ -0,0 +1,216 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+from dotenv import load_dotenv
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.timeframe import TimeFrame
+
+from bar_cache import open_cache, timeframe_key, to_utc
+from bar_sources import DATA_PAGE_LIMIT, AlpacaBarSource
+from rate_limit import RateLimitedClient, TokenBucket
+
+# Load environment variables
+load_dotenv()
+
+
+def _windows(start, end, chunk_days):
+    """[start, end) UTC day windows on a grid of chunk_days, so keys survive a changed start."""
+    epoch_day = start.value // (86400 * 10**9)
+    first = start - pd.Timedelta(days=epoch_day % chunk_days)
+    window_start = first
+    while window_start < end:
+        window_end = window_start + pd.Timedelta(days=chunk_days)
+        yield max(window_start, start), min(window_end, end)
+        window_start = window_end
+
+
+class Backfill:
+    """Bulk download of historical bars for many symbols into a BarCache.
+
+    The (symbols x date range) grid is split into chunks of batch_size
+    symbols over chunk_days UTC days, each fetched with one multi-symbol
+    request by a pool of worker threads sharing the source's client. The main
+    thread writes every finished chunk into the cache's daily partitions and
+    then appends one line per symbol and window to the checkpoint file, so a
+    rerun skips what is already done, as well as windows a backtest already
+    cached. Failed chunks are retried with backoff, and left for the next run
+    if they keep failing.
+    """
+
+    def __init__(self, cache, source, checkpoint='backfill_checkpoint.jsonl',
+                 batch_size=25, chunk_days=14, workers=4, retries=3):
+        self.cache = cache
+        self.source = source
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.chunk_days = chunk_days
+        self.workers = workers
+        self.retries = retries
+
+    def _key(self, symbol, window_start, window_end):
+        return (f'{symbol}/{timeframe_key(self.source.timeframe)}/'
+                f'{window_start:%Y-%m-%d}/{window_end:%Y-%m-%d}')
+
+    def load_checkpoint(self):
+        """Keys of the symbol windows already backfilled."""
+        done = set()
+        if not os.path.exists(self.checkpoint):
+            return done
+        with open(self.checkpoint) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['key'])
+                except (ValueError, KeyError):
+                    pass  # Torn last line from an interrupted run
+        return done
+
+    def plan(self, symbols, start, end):
+        """(symbols, window start, window end) chunks still to fetch."""
+        done = self.load_checkpoint()
+        chunks = []
+        for window_start, window_end in _windows(start, end, self.chunk_days):
+            days = pd.date_range(window_start, window_end, freq='D', inclusive='left')
+            pending = [
+                symbol for symbol in symbols
+                if self._key(symbol, window_start, window_end) not in done
+                and not all(self.cache.has(symbol, self.source.timeframe, day) for day in days)
+            ]
+            for i in range(0, len(pending), self.batch_size):
+                chunks.append((pending[i:i + self.batch_size], window_start, window_end))
+        return chunks
+
+    def _fetch(self, chunk):
+        symbols, window_start, window_end = chunk
+        for attempt in range(self.retries + 1):
+            try:
+                bars = self.source.get_bars(symbols, window_start.to_pydatetime(), window_end.to_pydatetime(),
+                                            columns=self.cache.columns)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    raise
+                delay = 2 ** attempt
+                logging.warning(f"Chunk {window_start.date()} x {len(symbols)} symbols failed ({e}), "
+                                f"retrying in {delay}s")
+                time.sleep(delay)
+
+        return bars, sum(len(arrays['timestamp']) for arrays in bars.values())
+
+    def _store(self, chunk, bars, checkpoint_file):
+        symbols, window_start, window_end = chunk
+        days = pd.date_range(window_start, window_end, freq='D', inclusive='left')
+        for symbol in symbols:
+            self.cache.put(symbol, self.source.timeframe, days, bars[symbol])
+        for symbol in symbols:
+            checkpoint_file.write(json.dumps({
+                'key': self._key(symbol, window_start, window_end),
+                'bars': int(len(bars[symbol]['timestamp'])),
+            }) + '\n')
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+
+    def run(self, symbols, start, end):
+        """Backfill start..end (UTC days, end exclusive and capped at today); returns a summary."""
+        start = to_utc(start).floor('D')
+        end = min(to_utc(end).floor('D'), pd.Timestamp.now(tz='UTC').floor('D'))
+        chunks = self.plan(list(dict.fromkeys(symbols)), start, end)
+        logging.info(f"Backfilling {len(chunks)} chunks from {start.date()} to {end.date()}")
+
+        summary = {'chunks': len(chunks), 'done': 0, 'failed': 0, 'bars': 0}
+        started = time.monotonic()
+        with open(self.checkpoint, 'a') as checkpoint_file, ThreadPoolExecutor(self.workers) as pool:
+            pending = {}  # future -> chunk
+
+            def handle(futures):
+                for future in futures:
+                    chunk = pending.pop(future)
+                    try:
+                        bars, total = future.result()
+                    except Exception as e:
+                        summary['failed'] += 1
+                        logging.error(f"Chunk {chunk[1].date()}..{chunk[2].date()} for "
+                                      f"{chunk[0][0]}..{chunk[0][-1]} failed: {e}")
+                        continue
+                    self._store(chunk, bars, checkpoint_file)
+                    summary['done'] += 1
+                    summary['bars'] += total
+                    elapsed = time.monotonic() - started
+                    remaining = summary['chunks'] - summary['done'] - summary['failed']
+                    eta = elapsed / (summary['done'] + summary['failed']) * remaining
+                    logging.info(f"{summary['done']}/{summary['chunks']} chunks, {summary['bars']:,} bars "
+                                 f"({summary['bars'] / elapsed:,.0f}/s), ETA {eta / 60:.1f} min")
+
+            # Keep a couple of chunks per worker in flight, so fetched bars
+            # don't pile up faster than they are written
+            for chunk in chunks:
+                pending[pool.submit(self._fetch, chunk)] = chunk
+                if len(pending) >= 2 * self.workers:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    handle(finished)
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                handle(finished)
+
+        summary['seconds'] = time.monotonic() - started
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk download historical minute bars into the local bar cache")
+    parser.add_argument("symbols", nargs="*", type=str.upper, help="symbols to backfill")
+    parser.add_argument("--symbols-file", help="file with one symbol per line")
+    parser.add_argument("--years", type=float, default=5, help="years of history ending today (default 5)")
+    parser.add_argument("--start", help="first UTC date, overrides --years")
+    parser.add_argument("--end", help="UTC date to stop before (default: today)")
+    parser.add_argument("--batch-size", type=int, default=25, help="symbols per request")
+    parser.add_argument("--chunk-days", type=int, default=14, help="days per request")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent requests")
+    parser.add_argument("--cache-dir", default="bar_cache")
+    parser.add_argument("--max-gb", type=float, default=100,
+                        help="bar cache size limit in GB, saved with the cache for later readers (default 100)")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.jsonl")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    symbols = list(args.symbols)
+    if args.symbols_file:
+        with open(args.symbols_file) as f:
+            symbols += [line.strip().upper() for line in f if line.strip()]
+    if not symbols:
+        parser.error("no symbols given")
+
+    end = pd.Timestamp(args.end) if args.end else pd.Timestamp.now(tz='UTC')
+    start = pd.Timestamp(args.start) if args.start else to_utc(end) - pd.Timedelta(days=round(args.years * 365.25))
+
+    limiter = TokenBucket(
+        rate=float(os.getenv("ALPACA_RATE_LIMIT", 200)) / 60,
+        capacity=int(os.getenv("ALPACA_RATE_BURST", 10))
+    )
+    client = RateLimitedClient(StockHistoricalDataClient(
+        os.getenv("ALPACA_API_KEY"),
+        os.getenv("ALPACA_API_SECRET"),
+        raw_data=True
+    ), limiter)
+    backfill = Backfill(
+        open_cache(args.max_gb, args.cache_dir),
+        # Request every page ourselves, so each one waits for the rate limiter
+        AlpacaBarSource(client, TimeFrame.Minute, batch_size=args.batch_size, page_limit=DATA_PAGE_LIMIT),
+        checkpoint=args.checkpoint,
+        batch_size=args.batch_size,
+        chunk_days=args.chunk_days,
+        workers=args.workers,
+    )
+    summary = backfill.run(symbols, start, end)
+    print(f"Fetched {summary['bars']:,} bars in {summary['done']} chunks ({summary['failed']} failed) "
+          f"in {summary['seconds'] / 60:.1f} min")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,71 +1,164 @@
-import os
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
+from bar_cache import BarCache
+from bar_sources import AlpacaBarSource
+from engine import arrays_to_frame, simulate
+from indicators import VolumeSpike, volume_spike_mask
+from ingest import column_dtype
 
 # Load environment variables
 load_dotenv()
 
+
+def calculate_stats(trades, initial_capital, capital):
+    """Calculate backtest statistics for a list of trades."""
+    if not trades:
+        return "No trades executed"
+    
+    total_trades = len(trades)
+    profitable_trades = len([t for t in trades if t['pl'] > 0])
+    losing_trades = total_trades - profitable_trades
+    total_pl = sum(t['pl'] for t in trades)
+    win_rate = profitable_trades / total_trades if total_trades > 0 else 0
+    
+    # Calculate additional statistics
+    if profitable_trades > 0:
+        avg_profit = sum(t['pl'] for t in trades if t['pl'] > 0) / profitable_trades
+        max_profit = max(t['pl'] for t in trades if t['pl'] > 0)
+    else:
+        avg_profit = 0
+        max_profit = 0
+        
+    if losing_trades > 0:
+        avg_loss = sum(t['pl'] for t in trades if t['pl'] <= 0) / losing_trades
+        max_loss = min(t['pl'] for t in trades if t['pl'] <= 0)
+    else:
+        avg_loss = 0
+        max_loss = 0
+    
+    target_exits = len([t for t in trades if t['exit_type'] == 'target'])
+    stop_exits = len([t for t in trades if t['exit_type'] == 'stop'])
+    
+    return {
+        'Initial Capital': f"${initial_capital:,.2f}",
+        'Final Capital': f"${capital:,.2f}",
+        'Total Return': f"{((capital - initial_capital) / initial_capital * 100):.2f}%",
+        'Total Trades': total_trades,
+        'Profitable Trades': profitable_trades,
+        'Losing Trades': losing_trades,
+        'Win Rate': f"{win_rate * 100:.2f}%",
+        'Total P/L': f"${total_pl:,.2f}",
+        'Average Profit': f"${avg_profit:,.2f}",
+        'Average Loss': f"${avg_loss:,.2f}",
+        'Max Profit': f"${max_profit:,.2f}",
+        'Max Loss': f"${max_loss:,.2f}",
+        'Target Exits': target_exits,
+        'Stop-Loss Exits': stop_exits
+    }
+
+
 class OnePercentBacktest:
-    def __init__(self, symbol, initial_capital=10000):
+    ENGINES = ('loop', 'vectorized', 'streaming')
+
+    def __init__(self, symbol, initial_capital=10000, engine='loop', cache=None, source=None,
+                 target_profit_pct=0.01, stop_loss_pct=0.005,
+                 volume_window=20, volume_multiplier=1.2, chunk_days=5,
+                 price_dtype=np.float64, volume_dtype=np.float64):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {self.ENGINES}")
         self.symbol = symbol
+        self.engine = engine
         self.initial_capital = initial_capital
         self.capital = initial_capital
         self.position = None
         self.entry_price = None
-        self.target_profit_pct = 0.01  # 1%
-        self.stop_loss_pct = 0.005     # 0.5%
+        self.target_profit_pct = target_profit_pct  # 1% by default
+        self.stop_loss_pct = stop_loss_pct          # 0.5% by default
+        self.volume_window = volume_window          # Bars in the volume average
+        self.volume_multiplier = volume_multiplier  # Spike threshold over the average
         self.trades = []
-        
-        # Initialize Alpaca client
-        self.data_client = StockHistoricalDataClient(
-            os.getenv("ALPACA_API_KEY"),
-            os.getenv("ALPACA_API_SECRET")
-        )
+        self.cache = cache  # Optional BarCache for repeat runs
+        # Where bars come from; a local BarSource skips the Alpaca client entirely
+        self.source = source if source is not None else AlpacaBarSource()
+        self.data_client = getattr(self.source, 'client', None)  # Alpaca client, if the source has one
+        self.chunk_days = chunk_days  # Days of bars held in memory by the streaming engine
+        self.price_dtype = price_dtype    # e.g. np.float32 to halve price memory
+        self.volume_dtype = volume_dtype  # e.g. np.int64 for integer volumes
 
-    def get_historical_data(self, start_date, end_date):
-        """Fetch historical data for the specified period."""
-        request = StockBarsRequest(
-            symbol_or_symbols=[self.symbol],
-            timeframe=TimeFrame.Minute,
-            start=start_date,
-            end=end_date
-        )
-        return self.data_client.get_stock_bars(request)
+    def _fetch_arrays(self, start_date, end_date):
+        """Read bars from the source as column arrays."""
+        return self.source.fetch(self.symbol, start_date, end_date,
+                                 price_dtype=self.price_dtype, volume_dtype=self.volume_dtype)
+
+    def get_bar_arrays(self, start_date, end_date):
+        """Get bar column arrays, served from the local cache when one is configured."""
+        if self.cache is None:
+            return self._fetch_arrays(start_date, end_date)
+        arrays = self.cache.get(self.symbol, self.source.timeframe, start_date, end_date, self._fetch_arrays)
+        # Cached days keep the dtypes of the run that fetched them
+        return {
+            column: np.asarray(values, dtype=column_dtype(column, self.price_dtype, self.volume_dtype))
+            for column, values in arrays.items()
+        }
+
+    def iter_bar_chunks(self, start_date, end_date):
+        """Yield bar column arrays for the period, chunk_days at a time."""
+        chunk = timedelta(days=self.chunk_days)
+        last_timestamp = None
+        chunk_start = start_date
+        while chunk_start < end_date:
+            chunk_end = min(chunk_start + chunk, end_date)
+            arrays = self.get_bar_arrays(chunk_start, chunk_end)
+            if last_timestamp is not None:
+                # Chunk ends are inclusive, so drop a bar already seen
+                keep = np.searchsorted(arrays['timestamp'], last_timestamp, side='right')
+                arrays = {column: values[keep:] for column, values in arrays.items()}
+            if len(arrays['timestamp']):
+                last_timestamp = arrays['timestamp'][-1]
+                yield arrays
+            chunk_start = chunk_end
 
     def run_backtest(self, start_date, end_date):
         """Run backtest over the specified period."""
-        # Get historical data
-        bars = self.get_historical_data(start_date, end_date)
-        df = pd.DataFrame([bar.__dict__ for bar in bars[self.symbol]])
-        
         # Reset metrics
         self.capital = self.initial_capital
         self.trades = []
         self.position = None
+
+        if self.engine == 'streaming':
+            self._run_streaming(start_date, end_date)
+            return
+
+        # Get historical data
+        arrays = self.get_bar_arrays(start_date, end_date)
         
+        if self.engine == 'vectorized':
+            self._run_vectorized(arrays)
+            return
+
+        df = arrays_to_frame(arrays)
+        volume_spike = VolumeSpike(self.volume_window, self.volume_multiplier)
         # Iterate through each bar
         for i in range(len(df)):
             current_bar = df.iloc[i]
+            # Every bar feeds the rolling volume average, in or out of a position
+            spike = volume_spike.update(current_bar['volume'])
             
             if self.position is None:
                 # Check for entry conditions (simple volume-based condition)
-                if i >= 20:  # Need some bars for volume average
-                    avg_volume = df.iloc[i-20:i]['volume'].mean()
-                    if current_bar['volume'] > avg_volume * 1.2:  # Volume spike
-                        # Enter position
-                        self.entry_price = current_bar['close']
-                        shares = int(self.capital / self.entry_price)
-                        self.position = {
-                            'shares': shares,
-                            'entry_price': self.entry_price,
-                            'entry_time': current_bar['timestamp'],
-                            'target_price': self.entry_price * (1 + self.target_profit_pct),
-                            'stop_price': self.entry_price * (1 - self.stop_loss_pct)
-                        }
+                if spike:
+                    # Enter position
+                    self.entry_price = current_bar['close']
+                    shares = int(self.capital / self.entry_price)
+                    self.position = {
+                        'shares': shares,
+                        'entry_price': self.entry_price,
+                        'entry_time': current_bar['timestamp'],
+                        'target_price': self.entry_price * (1 + self.target_profit_pct),
+                        'stop_price': self.entry_price * (1 - self.stop_loss_pct)
+                    }
             else:
                 # Check for exit conditions
                 if (current_bar['high'] >= self.position['target_price'] or 
@@ -97,51 +190,37 @@ class OnePercentBacktest:
                     # Reset position
                     self.position = None
 
+    def _run_vectorized(self, arrays):
+        """Run the strategy on NumPy column arrays, jumping from each entry straight to its exit."""
+        entry_mask = volume_spike_mask(
+            arrays['volume'], window=self.volume_window, multiplier=self.volume_multiplier
+        )
+        self.trades, self.capital, self.position = simulate(
+            arrays, entry_mask, self.capital,
+            self.target_profit_pct, self.stop_loss_pct
+        )
+        self.entry_price = self.position['entry_price'] if self.position else None
+
+    def _run_streaming(self, start_date, end_date):
+        """Run the vectorized engine chunk by chunk, so memory stays flat over long ranges."""
+        # The last volume_window volumes are all the entry signal needs from earlier chunks
+        volume_tail = np.empty(0)
+        for arrays in self.iter_bar_chunks(start_date, end_date):
+            volume = np.concatenate((volume_tail, arrays['volume']))
+            entry_mask = volume_spike_mask(
+                volume, window=self.volume_window, multiplier=self.volume_multiplier
+            )[len(volume_tail):]
+            trades, self.capital, self.position = simulate(
+                arrays, entry_mask, self.capital,
+                self.target_profit_pct, self.stop_loss_pct, position=self.position
+            )
+            self.trades.extend(trades)
+            volume_tail = volume[-self.volume_window:]
+        self.entry_price = self.position['entry_price'] if self.position else None
+
     def get_stats(self):
         """Calculate and return backtest statistics."""
-        if not self.trades:
-            return "No trades executed"
-        
-        total_trades = len(self.trades)
-        profitable_trades = len([t for t in self.trades if t['pl'] > 0])
-        losing_trades = total_trades - profitable_trades
-        total_pl = sum(t['pl'] for t in self.trades)
-        win_rate = profitable_trades / total_trades if total_trades > 0 else 0
-        
-        # Calculate additional statistics
-        if profitable_trades > 0:
-            avg_profit = sum(t['pl'] for t in self.trades if t['pl'] > 0) / profitable_trades
-            max_profit = max(t['pl'] for t in self.trades if t['pl'] > 0)
-        else:
-            avg_profit = 0
-            max_profit = 0
-            
-        if losing_trades > 0:
-            avg_loss = sum(t['pl'] for t in self.trades if t['pl'] <= 0) / losing_trades
-            max_loss = min(t['pl'] for t in self.trades if t['pl'] <= 0)
-        else:
-            avg_loss = 0
-            max_loss = 0
-        
-        target_exits = len([t for t in self.trades if t['exit_type'] == 'target'])
-        stop_exits = len([t for t in self.trades if t['exit_type'] == 'stop'])
-        
-        return {
-            'Initial Capital': f"${self.initial_capital:,.2f}",
-            'Final Capital': f"${self.capital:,.2f}",
-            'Total Return': f"{((self.capital - self.initial_capital) / self.initial_capital * 100):.2f}%",
-            'Total Trades': total_trades,
-            'Profitable Trades': profitable_trades,
-            'Losing Trades': losing_trades,
-            'Win Rate': f"{win_rate * 100:.2f}%",
-            'Total P/L': f"${total_pl:,.2f}",
-            'Average Profit': f"${avg_profit:,.2f}",
-            'Average Loss': f"${avg_loss:,.2f}",
-            'Max Profit': f"${max_profit:,.2f}",
-            'Max Loss': f"${max_loss:,.2f}",
-            'Target Exits': target_exits,
-            'Stop-Loss Exits': stop_exits
-        }
+        return calculate_stats(self.trades, self.initial_capital, self.capital)
 
     def get_trade_summary(self):
         """Generate a summary of trade performance by day."""
@@ -209,7 +288,7 @@ def main():
     start_date = end_date - timedelta(days=days)
     
     # Run backtest
-    backtest = OnePercentBacktest(symbol, capital)
+    backtest = OnePercentBacktest(symbol, capital, cache=BarCache())
     print(f"\nRunning backtest for {symbol} from {start_date.date()} to {end_date.date()}...")
     backtest.run_backtest(start_date, end_date)
     
@@ -0,0 +1,316 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import BAR_COLUMNS
+
+DAY_NS = 24 * 60 * 60 * 10**9
+DEFAULT_MAX_BYTES = 2 * 1024**3
+# Settings kept in the cache root, so every process opening it uses the same size limit
+SETTINGS_FILE = 'cache.json'
+# Partition sizes and last use, so opening a cache doesn't walk every partition
+INDEX_FILE = 'index.db'
+# Partitions are written here first, then moved into place
+TMP_DIR = '.tmp'
+# Leftovers in TMP_DIR older than this are from interrupted writes
+STALE_TMP_SECONDS = 3600
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS partitions (
+    symbol TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    day TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL,
+    PRIMARY KEY (symbol, timeframe, day)
+);
+CREATE INDEX IF NOT EXISTS partitions_used ON partitions (used_at);
+"""
+
+
+def to_utc(value):
+    """Normalize a datetime (naive values are treated as UTC) to a UTC pandas Timestamp."""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+def timeframe_key(timeframe):
+    """Directory-safe name for an Alpaca TimeFrame, e.g. '1Min'."""
+    return getattr(timeframe, 'value', str(timeframe))
+
+
+def open_cache(max_gb=None, root='bar_cache'):
+    """BarCache for the command-line tools; max_gb None keeps the cache's saved limit."""
+    return BarCache(root, max_bytes=None if max_gb is None else int(max_gb * 1024**3))
+
+
+class BarCache:
+    """Local columnar bar cache partitioned by symbol, timeframe and UTC date.
+
+    Each partition is a directory holding one .npy file per column. A
+    single-day read is memory-mapped; longer ranges read each partition into
+    memory, since every memmap keeps a file descriptor open. Only fully
+    elapsed days are stored, and the least recently used partitions are
+    evicted once a write takes the cache past max_bytes. An explicit
+    max_bytes is saved in the cache root and becomes the limit for every
+    later BarCache opened without one, so a large backfill isn't evicted by
+    the next default-sized reader.
+
+    Partition sizes and last-use times live in a SQLite index in the cache
+    root, so opening even a multi-year, many-symbol cache costs one query
+    rather than a walk of every partition. The days cached for a symbol are
+    read from it the first time that symbol is used.
+    """
+
+    def __init__(self, root='bar_cache', max_bytes=None, columns=BAR_COLUMNS):
+        self.root = root
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._days = {}  # (symbol, timeframe key) -> cached day strings, loaded on first use
+        os.makedirs(self.root, exist_ok=True)
+        if max_bytes is None:
+            max_bytes = self._load_settings().get('max_bytes', DEFAULT_MAX_BYTES)
+        else:
+            self._save_settings({'max_bytes': max_bytes})
+        self.max_bytes = max_bytes
+        self._open_index()
+        self._remove_stale_tmp()
+
+    def _load_settings(self):
+        try:
+            with open(os.path.join(self.root, SETTINGS_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_settings(self, settings):
+        path = os.path.join(self.root, SETTINGS_FILE)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(settings, f)
+        os.replace(tmp_path, path)
+
+    def _open_index(self):
+        path = os.path.join(self.root, INDEX_FILE)
+        new = not os.path.exists(path)
+        self._index = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._index.execute('PRAGMA journal_mode=WAL')
+        self._index.execute('PRAGMA synchronous=NORMAL')
+        self._index.executescript(INDEX_SCHEMA)
+        if new:
+            self._scan()
+        self._size = self._query('SELECT COALESCE(SUM(size), 0) FROM partitions')[0][0]
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._index.execute(sql, params).fetchall()
+
+    def _write_index(self, sql, rows):
+        with self._lock:
+            self._index.execute('BEGIN')
+            try:
+                self._index.executemany(sql, rows)
+                self._index.execute('COMMIT')
+            except Exception:
+                self._index.execute('ROLLBACK')
+                raise
+
+    def _scan(self):
+        """Index partitions left by a cache written before the index existed."""
+        rows = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            parts = os.path.relpath(dirpath, self.root).split(os.sep)
+            if parts[0] == TMP_DIR:
+                dirnames.clear()
+                continue
+            if len(parts) != 3 or not filenames:
+                continue
+            if '.tmp-' in parts[2]:
+                # Leftover from an interrupted write
+                shutil.rmtree(dirpath, ignore_errors=True)
+                continue
+            size = sum(os.path.getsize(os.path.join(dirpath, f)) for f in filenames)
+            rows.append((*parts, size, os.path.getmtime(dirpath)))
+        self._write_index('INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?, ?)', rows)
+
+    def _remove_stale_tmp(self):
+        """Drop partial partitions from interrupted writes, leaving other processes' writes alone."""
+        tmp_root = os.path.join(self.root, TMP_DIR)
+        if not os.path.isdir(tmp_root):
+            return
+        cutoff = time.time() - STALE_TMP_SECONDS
+        for entry in os.scandir(tmp_root):
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _cached_days(self, symbol, timeframe):
+        """Set of cached day strings for a symbol and timeframe."""
+        key = (symbol, timeframe_key(timeframe))
+        days = self._days.get(key)
+        if days is None:
+            days = {row[0] for row in self._query(
+                'SELECT day FROM partitions WHERE symbol = ? AND timeframe = ?', key)}
+            self._days[key] = days
+        return days
+
+    def _partition_path(self, symbol, timeframe, day):
+        return os.path.join(self.root, symbol, timeframe_key(timeframe), day)
+
+    def _read_partition(self, path, mmap_mode=None):
+        return {
+            column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mmap_mode)
+            for column in self.columns
+        }
+
+    def _write_partition(self, symbol, timeframe, day, arrays):
+        path = self._partition_path(symbol, timeframe, day)
+        tmp_path = os.path.join(self.root, TMP_DIR, f'{symbol}-{timeframe_key(timeframe)}-{day}-{os.getpid()}')
+        os.makedirs(tmp_path, exist_ok=True)
+        size = 0
+        for column in self.columns:
+            column_path = os.path.join(tmp_path, f'{column}.npy')
+            np.save(column_path, np.ascontiguousarray(arrays[column]))
+            size += os.path.getsize(column_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+        key = (symbol, timeframe_key(timeframe), day)
+        previous = self._query('SELECT size FROM partitions WHERE symbol = ? AND timeframe = ? AND day = ?', key)
+        self._write_index('INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?, ?)', [(*key, size, time.time())])
+        self._size += size - (previous[0][0] if previous else 0)
+        self._cached_days(symbol, timeframe).add(day)
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used partitions until the cache fits in max_bytes."""
+        if self._size <= self.max_bytes:
+            return
+        # Other processes may have written or evicted since we last looked
+        self._size = self._query('SELECT COALESCE(SUM(size), 0) FROM partitions')[0][0]
+        while self._size > self.max_bytes:
+            # Oldest first, always keeping the most recently used partition however large
+            oldest = self._query(
+                'SELECT symbol, timeframe, day, size FROM partitions WHERE rowid != '
+                '(SELECT rowid FROM partitions ORDER BY used_at DESC LIMIT 1) ORDER BY used_at LIMIT 100')
+            if not oldest:
+                break
+            evicted = []
+            for symbol, timeframe, day, size in oldest:
+                if self._size <= self.max_bytes:
+                    break
+                shutil.rmtree(os.path.join(self.root, symbol, timeframe, day), ignore_errors=True)
+                self._days.get((symbol, timeframe), set()).discard(day)
+                self._size -= size
+                evicted.append((symbol, timeframe, day))
+            self._write_index('DELETE FROM partitions WHERE symbol = ? AND timeframe = ? AND day = ?', evicted)
+
+    def get(self, symbol, timeframe, start, end, fetch):
+        """Return column arrays for start..end, fetching only uncached days.
+
+        `fetch(start, end)` must return a dict of column arrays (timestamps as
+        int64 UTC nanoseconds) covering that range.
+        """
+        start, end = to_utc(start), to_utc(end)
+        now = pd.Timestamp.now(tz='UTC')
+        days = pd.date_range(start.floor('D'), end.floor('D'), freq='D')
+
+        # Memory-map only a lone partition; a year of memmaps would need ~1,800 open files
+        mmap_mode = 'r' if len(days) == 1 else None
+        cached = self._cached_days(symbol, timeframe)
+        parts = {}
+        missing = []
+        used = []
+        for day in days:
+            key = day.strftime('%Y-%m-%d')
+            if key in cached:
+                try:
+                    parts[day] = self._read_partition(self._partition_path(symbol, timeframe, key), mmap_mode)
+                    used.append(key)
+                    continue
+                except FileNotFoundError:
+                    cached.discard(key)  # Evicted by another process
+            missing.append(day)
+        if used:
+            self._write_index('UPDATE partitions SET used_at = ? WHERE symbol = ? AND timeframe = ? AND day = ?',
+                              [(time.time(), symbol, timeframe_key(timeframe), key) for key in used])
+
+        # Fetch contiguous runs of missing days with a single request each
+        for run in self._contiguous(missing):
+            run_start = run[0]
+            run_end = min(run[-1] + pd.Timedelta(days=1), max(now, run_start))
+            fetched = fetch(run_start.to_pydatetime(), run_end.to_pydatetime())
+            parts.update(self.put(symbol, timeframe, run, fetched, now))
+
+        ordered = [parts[day] for day in days]
+        result = {}
+        for column in self.columns:
+            chunks = [part[column] for part in ordered]
+            if len(chunks) == 1:
+                result[column] = chunks[0]
+            elif chunks:
+                result[column] = np.concatenate(chunks)
+            else:
+                result[column] = np.empty(0, dtype=np.int64 if column == 'timestamp' else np.float64)
+
+        # Trim the first and last day to the requested range
+        if len(result['timestamp']):
+            lo = np.searchsorted(result['timestamp'], start.value, side='left')
+            hi = np.searchsorted(result['timestamp'], end.value, side='right')
+            result = {column: values[lo:hi] for column, values in result.items()}
+        return result
+
+    def put(self, symbol, timeframe, days, fetched, now=None):
+        """Split arrays fetched for consecutive UTC days into one partition per day.
+
+        Days that have fully elapsed are written to the cache, including
+        empty ones, so they are never fetched again. Returns {day: arrays}.
+        """
+        now = pd.Timestamp.now(tz='UTC') if now is None else now
+        day_index = (fetched['timestamp'] - days[0].value) // DAY_NS
+        parts = {}
+        for offset, day in enumerate(days):
+            selected = day_index == offset
+            arrays = {column: fetched[column][selected] for column in self.columns}
+            if day + pd.Timedelta(days=1) <= now:
+                self._write_partition(symbol, timeframe, day.strftime('%Y-%m-%d'), arrays)
+            parts[day] = arrays
+        return parts
+
+    def has(self, symbol, timeframe, day):
+        """Whether a UTC day is cached for the symbol."""
+        return day.strftime('%Y-%m-%d') in self._cached_days(symbol, timeframe)
+
+    @staticmethod
+    def _contiguous(days):
+        run = []
+        for day in days:
+            if run and day - run[-1] != pd.Timedelta(days=1):
+                yield run
+                run = []
+            run.append(day)
+        if run:
+            yield run
+
+    def clear(self):
+        """Remove every cached partition."""
+        settings = self._load_settings()
+        with self._lock:
+            self._index.close()
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        if settings:
+            self._save_settings(settings)
+        self._days.clear()
+        self._open_index()
+
+    def close(self):
+        with self._lock:
+            self._index.close()
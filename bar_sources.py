@@ -0,0 +1,282 @@
+import os
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from alpaca.data.historical import StockHistoricalDataClient
+from alpaca.data.requests import StockBarsRequest
+from alpaca.data.timeframe import TimeFrame
+
+from bar_cache import BarCache, to_utc
+from engine import BAR_COLUMNS
+from ingest import column_dtype, empty_arrays, to_arrays
+
+# Load environment variables
+load_dotenv()
+
+# Most bars the data API returns per page
+DATA_PAGE_LIMIT = 10_000
+
+
+def _typed(arrays, columns, price_dtype, volume_dtype):
+    """The requested columns, converted to their dtypes only where they differ."""
+    return {
+        column: np.asarray(arrays[column], dtype=column_dtype(column, price_dtype, volume_dtype))
+        for column in columns
+    }
+
+
+def _slice_range(arrays, start, end):
+    """Rows of sorted column arrays with timestamps in start..end (UTC nanoseconds, inclusive)."""
+    lo = np.searchsorted(arrays['timestamp'], start, side='left')
+    hi = np.searchsorted(arrays['timestamp'], end, side='right')
+    return {column: values[lo:hi] for column, values in arrays.items()}
+
+
+class BarSource(ABC):
+    """Where backtests read bars from.
+
+    get_bars returns {symbol: column arrays} for every requested symbol, in
+    the same form as ingest.to_arrays: only the requested columns, timestamps
+    as sorted int64 UTC nanoseconds within start..end (inclusive; naive
+    datetimes are UTC), and empty arrays for symbols without bars.
+    Implementations push the range, columns and symbols down to the storage
+    they read, rather than filtering afterwards.
+    """
+
+    timeframe = TimeFrame.Minute
+
+    @abstractmethod
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        """Column arrays per symbol for start..end."""
+
+    def fetch(self, symbol, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        """Column arrays for one symbol."""
+        return self.get_bars([symbol], start, end, columns, price_dtype, volume_dtype)[symbol]
+
+
+class AlpacaBarSource(BarSource):
+    """Bars from the Alpaca historical data API, batch_size symbols per request.
+
+    alpaca-py follows the pages of a large response inside one
+    get_stock_bars call. With page_limit set, each call asks for at most that
+    many bars and the source requests the next page itself, so a rate-limited
+    client is charged once per page.
+    """
+
+    def __init__(self, client=None, timeframe=TimeFrame.Minute, batch_size=100, page_limit=None):
+        if client is None:
+            # Raw responses skip building a Bar object per row
+            client = StockHistoricalDataClient(
+                os.getenv("ALPACA_API_KEY"),
+                os.getenv("ALPACA_API_SECRET"),
+                raw_data=True
+            )
+        self.client = client
+        self.timeframe = timeframe
+        self.batch_size = batch_size
+        self.page_limit = page_limit
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        symbols = list(symbols)
+        result = {}
+        for i in range(0, len(symbols), self.batch_size):
+            batch = symbols[i:i + self.batch_size]
+            if self.page_limit:
+                result.update(self._get_pages(batch, start, end, columns, price_dtype, volume_dtype))
+                continue
+            request = StockBarsRequest(
+                symbol_or_symbols=batch,
+                timeframe=self.timeframe,
+                start=start,
+                end=end
+            )
+            response = self.client.get_stock_bars(request)
+            for symbol in batch:
+                result[symbol] = to_arrays(response, symbol, columns, price_dtype, volume_dtype)
+        return result
+
+    def _get_pages(self, symbols, start, end, columns, price_dtype, volume_dtype):
+        """Bars for symbols, one page_limit request at a time.
+
+        Multi-symbol responses list bars by symbol, then time, so a full page
+        stops part way through its last symbol. That symbol continues from
+        its last bar, and the symbols after it from start.
+        """
+        read_columns = list(dict.fromkeys(['timestamp', *columns]))
+        pieces = {symbol: [] for symbol in symbols}
+        pending = [(sorted(symbols), start)]
+        while pending:
+            batch, batch_start = pending.pop()
+            response = self.client.get_stock_bars(StockBarsRequest(
+                symbol_or_symbols=batch,
+                timeframe=self.timeframe,
+                start=batch_start,
+                end=end,
+                limit=self.page_limit
+            ))
+            received = []
+            for symbol in batch:
+                arrays = to_arrays(response, symbol, read_columns, price_dtype, volume_dtype)
+                if len(arrays['timestamp']):
+                    pieces[symbol].append(arrays)
+                    received.append(symbol)
+            if sum(len(pieces[symbol][-1]['timestamp']) for symbol in received) < self.page_limit:
+                continue
+            last = received[-1]
+            rest = batch[batch.index(last) + 1:]
+            if rest:
+                pending.append((rest, batch_start))
+            last_bar = pd.Timestamp(int(pieces[last][-1]['timestamp'][-1]), tz='UTC')
+            pending.append(([last], (last_bar + pd.Timedelta(microseconds=1)).to_pydatetime()))
+
+        return {
+            symbol: ({column: np.concatenate([piece[column] for piece in pieces[symbol]]) for column in columns}
+                     if pieces[symbol] else empty_arrays(columns, price_dtype, volume_dtype))
+            for symbol in symbols
+        }
+
+
+class MemoryBarSource(BarSource):
+    """Bars already in memory, as {symbol: column arrays} sorted by timestamp."""
+
+    def __init__(self, bars, timeframe=TimeFrame.Minute):
+        self.bars = bars
+        self.timeframe = timeframe
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        start, end = to_utc(start).value, to_utc(end).value
+        result = {}
+        for symbol in symbols:
+            arrays = self.bars.get(symbol)
+            if arrays is None:
+                result[symbol] = empty_arrays(columns, price_dtype, volume_dtype)
+                continue
+            arrays = _slice_range({column: arrays[column] for column in dict.fromkeys(['timestamp', *columns])},
+                                  start, end)
+            result[symbol] = _typed(arrays, columns, price_dtype, volume_dtype)
+        return result
+
+
+class CSVBarSource(BarSource):
+    """Bars from one CSV file per symbol, named by pattern under root.
+
+    Files need a header naming the bar columns (timestamp, high, low, ...)
+    and rows sorted by timestamp, given as ISO strings or UTC nanoseconds.
+    Only the requested columns are parsed, and files are read chunk_rows at a
+    time so reading stops at the first chunk past the end of the range.
+    """
+
+    def __init__(self, root, pattern='{symbol}.csv', timeframe=TimeFrame.Minute, chunk_rows=250_000):
+        self.root = root
+        self.pattern = pattern
+        self.timeframe = timeframe
+        self.chunk_rows = chunk_rows
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        start, end = to_utc(start).value, to_utc(end).value
+        result = {}
+        for symbol in symbols:
+            path = os.path.join(self.root, self.pattern.format(symbol=symbol))
+            if not os.path.exists(path):
+                result[symbol] = empty_arrays(columns, price_dtype, volume_dtype)
+                continue
+            result[symbol] = self._read(path, start, end, columns, price_dtype, volume_dtype)
+        return result
+
+    def _read(self, path, start, end, columns, price_dtype, volume_dtype):
+        usecols = list(dict.fromkeys(['timestamp', *columns]))
+        chunks = []
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=self.chunk_rows):
+            timestamp = np.asarray(pd.to_datetime(chunk['timestamp'], utc=True).values.astype('datetime64[ns]'),
+                                   dtype=np.int64)
+            if not len(timestamp) or timestamp[-1] < start:
+                continue
+            arrays = {column: chunk[column].to_numpy() for column in usecols if column != 'timestamp'}
+            arrays['timestamp'] = timestamp
+            chunks.append(_slice_range(arrays, start, end))
+            if timestamp[-1] > end:
+                break
+
+        if not chunks:
+            return empty_arrays(columns, price_dtype, volume_dtype)
+        arrays = {column: np.concatenate([chunk[column] for chunk in chunks]) for column in columns}
+        return _typed(arrays, columns, price_dtype, volume_dtype)
+
+
+class ParquetBarSource(BarSource):
+    """Bars from one Parquet file per symbol, named by pattern under root.
+
+    Needs pyarrow. The timestamp column may be a Parquet timestamp or int64
+    UTC nanoseconds; the range is passed to pyarrow as a filter, so row
+    groups outside it are skipped using their statistics, and only the
+    requested columns are read.
+    """
+
+    def __init__(self, root, pattern='{symbol}.parquet', timeframe=TimeFrame.Minute):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("ParquetBarSource needs pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.root = root
+        self.pattern = pattern
+        self.timeframe = timeframe
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        start, end = to_utc(start), to_utc(end)
+        result = {}
+        for symbol in symbols:
+            path = os.path.join(self.root, self.pattern.format(symbol=symbol))
+            if not os.path.exists(path):
+                result[symbol] = empty_arrays(columns, price_dtype, volume_dtype)
+                continue
+            result[symbol] = self._read(path, start, end, columns, price_dtype, volume_dtype)
+        return result
+
+    def _read(self, path, start, end, columns, price_dtype, volume_dtype):
+        timestamp_type = self._pq.read_schema(path).field('timestamp').type
+        if self._pa.types.is_timestamp(timestamp_type):
+            if timestamp_type.tz is None:
+                start, end = start.tz_localize(None), end.tz_localize(None)
+            bounds = (start, end)
+        else:
+            bounds = (start.value, end.value)
+
+        table = self._pq.read_table(
+            path,
+            columns=list(dict.fromkeys(['timestamp', *columns])),
+            filters=[('timestamp', '>=', bounds[0]), ('timestamp', '<=', bounds[1])]
+        )
+        timestamp = table.column('timestamp').to_numpy()
+        if self._pa.types.is_timestamp(timestamp_type):
+            timestamp = timestamp.astype('datetime64[ns]')
+        arrays = {column: table.column(column).to_numpy() for column in columns if column != 'timestamp'}
+        arrays['timestamp'] = np.asarray(timestamp, dtype=np.int64)
+        return _typed(arrays, columns, price_dtype, volume_dtype)
+
+
+class CachedBarSource(BarSource):
+    """Another source behind a BarCache, so only uncached days are fetched from it."""
+
+    def __init__(self, source, cache=None):
+        self.source = source
+        self.cache = cache if cache is not None else BarCache()
+        self.timeframe = source.timeframe
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        if not set(columns) <= set(self.cache.columns):
+            # The cache can't serve these columns
+            return self.source.get_bars(symbols, start, end, columns, price_dtype, volume_dtype)
+
+        result = {}
+        for symbol in symbols:
+            def fetch(fetch_start, fetch_end, symbol=symbol):
+                return self.source.fetch(symbol, fetch_start, fetch_end, self.cache.columns, price_dtype, volume_dtype)
+
+            arrays = self.cache.get(symbol, self.timeframe, start, end, fetch)
+            result[symbol] = _typed(arrays, columns, price_dtype, volume_dtype)
+        return result
@@ -0,0 +1,267 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import pandas as pd
+
+from sim_broker import use_placeholder_credentials
+
+use_placeholder_credentials()
+
+SESSION_MINUTES = 390
+TRADING_DAYS_PER_YEAR = 252
+
+# Metrics where a lower value is better; every other numeric metric is a rate
+LOWER_IS_BETTER = {'seconds', 'peak_rss_mb', 'step_p50_ms', 'step_p99_ms'}
+
+
+def session_range(days, start='2015-01-02'):
+    """Naive UTC start and end covering `days` weekday sessions from start."""
+    last_session = pd.bdate_range(start, periods=days)[-1]
+    return pd.Timestamp(start).to_pydatetime(), (last_session + pd.Timedelta(days=1)).to_pydatetime()
+
+
+def synthetic_minute_bars(days, symbol='BENCH', start='2015-01-02'):
+    """Seeded synthetic minute bars for `days` weekday sessions from start."""
+    from synthetic import SyntheticBars
+
+    return SyntheticBars().fetch(symbol, *session_range(days, start))
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _bar_range(arrays):
+    """First and last bar time, as the naive UTC datetimes run_backtest takes."""
+    return tuple(pd.Timestamp(arrays['timestamp'][i], tz='UTC').tz_localize(None).to_pydatetime() for i in (0, -1))
+
+
+def bench_backtest(engine, days):
+    from backtest import OnePercentBacktest
+    from bar_sources import MemoryBarSource
+    from synthetic import SyntheticBars
+
+    if engine == 'streaming':
+        # Bars are generated a chunk at a time, as a cache or CSV source would
+        # read them, so peak RSS shows the engine's bounded memory. Timings
+        # include generating them.
+        start, end = session_range(days)
+        source = SyntheticBars()
+        bars = days * SESSION_MINUTES
+    else:
+        # Pre-generated bars, so only the engine is timed
+        arrays = synthetic_minute_bars(days)
+        start, end = _bar_range(arrays)
+        source = MemoryBarSource({'BENCH': arrays})
+        bars = len(arrays['timestamp'])
+    backtest = OnePercentBacktest('BENCH', engine=engine, source=source)
+
+    started = time.perf_counter()
+    backtest.run_backtest(start, end)
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': seconds,
+        'bars_per_sec': bars / seconds,
+        'trades_per_sec': len(backtest.trades) / seconds,
+        'trades': len(backtest.trades),
+    }
+
+
+def bench_portfolio(symbols, days):
+    from bar_sources import MemoryBarSource
+    from portfolio import PortfolioBacktest
+
+    bars = {symbol: synthetic_minute_bars(days, symbol) for symbol in (f'S{i:03d}' for i in range(symbols))}
+    backtest = PortfolioBacktest(list(bars), initial_capital=100000, max_positions=10, source=MemoryBarSource(bars))
+
+    started = time.perf_counter()
+    backtest.run_backtest(*_bar_range(bars['S000']))
+    seconds = time.perf_counter() - started
+    trades = len(backtest.get_all_trades())
+    return {
+        'seconds': seconds,
+        'bars_per_sec': sum(len(arrays['timestamp']) for arrays in bars.values()) / seconds,
+        'trades_per_sec': trades / seconds,
+        'trades': trades,
+    }
+
+
+def bench_exit_sweep(days):
+    from engine import ExitIndex, simulate
+    from indicators import volume_spike_mask
+
+    arrays = synthetic_minute_bars(days)
+    entry_mask = volume_spike_mask(arrays['volume'])
+    exits = [(target, stop) for target in (0.005, 0.01, 0.02, 0.05) for stop in (0.0025, 0.005, 0.01, 0.05)]
+
+    started = time.perf_counter()
+    exit_index = ExitIndex(arrays['high'], arrays['low'])
+    trades = 0
+    for target_profit_pct, stop_loss_pct in exits:
+        trades += len(simulate(arrays, entry_mask, 10000, target_profit_pct, stop_loss_pct,
+                               exit_index=exit_index)[0])
+    seconds = time.perf_counter() - started
+    return {
+        'seconds': seconds,
+        'cells_per_sec': len(exits) / seconds,
+        'trades_per_sec': trades / seconds,
+        'trades': trades,
+    }
+
+
+def bench_synthetic(days):
+    started = time.perf_counter()
+    arrays = synthetic_minute_bars(days)
+    seconds = time.perf_counter() - started
+    return {'seconds': seconds, 'bars_per_sec': len(arrays['timestamp']) / seconds}
+
+
+def bench_stats(days):
+    from backtest import OnePercentBacktest
+    from bar_sources import MemoryBarSource
+
+    arrays = synthetic_minute_bars(days)
+    backtest = OnePercentBacktest('BENCH', engine='vectorized', source=MemoryBarSource({'BENCH': arrays}))
+    backtest.run_backtest(*_bar_range(arrays))
+
+    started = time.perf_counter()
+    backtest.get_stats()
+    stats_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    backtest.get_trade_summary()
+    summary_seconds = time.perf_counter() - started
+    return {
+        'seconds': stats_seconds + summary_seconds,
+        'stats_trades_per_sec': len(backtest.trades) / stats_seconds,
+        'summary_trades_per_sec': len(backtest.trades) / summary_seconds,
+        'trades': len(backtest.trades),
+    }
+
+
+def bench_trader(symbols, days):
+    from multi_trader import MultiSymbolTrader
+    from sim_broker import SimBroker
+    from trader import OnePercentTrader
+
+    # A week of history ahead of the replay warms the hourly volume window up
+    warm_up_days = 5
+    bars = {symbol: synthetic_minute_bars(days + warm_up_days, symbol)
+            for symbol in (f'S{i:03d}' for i in range(symbols))}
+    timestamps = next(iter(bars.values()))['timestamp']
+    start = pd.Timestamp(timestamps[warm_up_days * SESSION_MINUTES], tz='UTC') - pd.Timedelta(minutes=5)
+    end = pd.Timestamp(timestamps[-1], tz='UTC') + pd.Timedelta(minutes=2)
+
+    broker = SimBroker(bars, start, end, cash=10**9)
+    if symbols == 1:
+        bot = OnePercentTrader('S000', trading_client=broker.trading_client, data_client=broker.data_client,
+                               now=broker.clock.now)
+    else:
+        bot = MultiSymbolTrader(list(bars), trading_client=broker.trading_client, data_client=broker.data_client,
+                                now=broker.clock.now)
+    result = broker.replay(bot)
+    return {
+        'seconds': result['wall_seconds'],
+        'bars_per_sec': symbols * days * SESSION_MINUTES / result['wall_seconds'],
+        'decisions_per_sec': result['decisions'] / result['wall_seconds'],
+        'step_p50_ms': result['decision_p50_ms'],
+        'step_p99_ms': result['decision_p99_ms'],
+        'fills': result['fills'],
+    }
+
+
+CASES = {
+    'backtest-loop-1d': (bench_backtest, ('loop', 1)),
+    'backtest-loop-1y': (bench_backtest, ('loop', TRADING_DAYS_PER_YEAR)),
+    'backtest-loop-10y': (bench_backtest, ('loop', 10 * TRADING_DAYS_PER_YEAR)),
+    'backtest-vectorized-1d': (bench_backtest, ('vectorized', 1)),
+    'backtest-vectorized-1y': (bench_backtest, ('vectorized', TRADING_DAYS_PER_YEAR)),
+    'backtest-vectorized-10y': (bench_backtest, ('vectorized', 10 * TRADING_DAYS_PER_YEAR)),
+    'backtest-streaming-1y': (bench_backtest, ('streaming', TRADING_DAYS_PER_YEAR)),
+    'backtest-streaming-10y': (bench_backtest, ('streaming', 10 * TRADING_DAYS_PER_YEAR)),
+    'portfolio-10sym-1y': (bench_portfolio, (10, TRADING_DAYS_PER_YEAR)),
+    'portfolio-100sym-1y': (bench_portfolio, (100, TRADING_DAYS_PER_YEAR)),
+    'exit-sweep-1y': (bench_exit_sweep, (TRADING_DAYS_PER_YEAR,)),
+    'stats-1y': (bench_stats, (TRADING_DAYS_PER_YEAR,)),
+    'stats-10y': (bench_stats, (10 * TRADING_DAYS_PER_YEAR,)),
+    'synthetic-10y': (bench_synthetic, (10 * TRADING_DAYS_PER_YEAR,)),
+    'trader-1sym-1d': (bench_trader, (1, 1)),
+    'trader-500sym-1d': (bench_trader, (500, 1)),
+}
+SLOW_CASES = {'backtest-loop-10y', 'backtest-streaming-10y', 'portfolio-100sym-1y', 'stats-10y', 'trader-500sym-1d'}
+
+
+def _run_case(name):
+    logging.disable(logging.CRITICAL)  # Traders log every decision
+    func, args = CASES[name]
+    result = func(*args)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def run_case(name):
+    """Run one case in a fresh process, so peak RSS belongs to that case alone."""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_run_case, (name,))
+
+
+def compare(results, baseline, threshold):
+    """Metrics that got worse than the baseline by more than threshold (a fraction)."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not isinstance(value, float) or not base:
+                continue
+            change = value / base - 1
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            if worse:
+                regressions.append((name, metric, base, value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the backtester and trader")
+    parser.add_argument("cases", nargs="*", help=f"cases to run (default: all); one of {', '.join(CASES)}")
+    parser.add_argument("--quick", action="store_true", help="skip the 10-year and 100+ symbol cases")
+    parser.add_argument("--baseline", default="bench_baseline.json", help="JSON baseline to compare against")
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="regression threshold (default 20%%)")
+    args = parser.parse_args()
+
+    names = args.cases or [name for name in CASES if not (args.quick and name in SLOW_CASES)]
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    results = {}
+    for name in names:
+        results[name] = run_case(name)
+        print(f"{name}: " + ", ".join(
+            f"{metric}={value:,.2f}" if isinstance(value, float) else f"{metric}={value}"
+            for metric, value in results[name].items()
+        ))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for name, metric, base, value, change in regressions:
+        print(f"REGRESSION {name} {metric}: {base:,.2f} -> {value:,.2f} ({change:+.0%})")
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
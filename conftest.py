@@ -0,0 +1,4 @@
+from sim_broker import use_placeholder_credentials
+
+# Before any test module imports trader
+use_placeholder_credentials()
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+
+# Columns the 1% strategy actually reads
+BAR_COLUMNS = ['timestamp', 'high', 'low', 'close', 'volume']
+
+
+def frame_to_arrays(df):
+    """Convert a bar DataFrame into plain NumPy column arrays.
+
+    Timestamps are stored as int64 nanoseconds since the epoch (UTC).
+    """
+    if df.empty:
+        return {
+            column: np.empty(0, dtype=np.int64 if column == 'timestamp' else np.float64)
+            for column in BAR_COLUMNS
+        }
+    timestamps = pd.to_datetime(df['timestamp'], utc=True)
+    return {
+        'timestamp': timestamps.values.astype('datetime64[ns]').astype(np.int64),
+        'high': df['high'].to_numpy(dtype=np.float64),
+        'low': df['low'].to_numpy(dtype=np.float64),
+        'close': df['close'].to_numpy(dtype=np.float64),
+        'volume': df['volume'].to_numpy(dtype=np.float64),
+    }
+
+
+def arrays_to_frame(arrays):
+    """Build a bar DataFrame from column arrays, with UTC timestamps."""
+    df = pd.DataFrame({column: arrays[column] for column in BAR_COLUMNS})
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+    return df
+
+
+def to_timestamp(value):
+    """Turn an int64 nanosecond timestamp back into a UTC pandas Timestamp."""
+    return pd.Timestamp(int(value), tz='UTC')
+
+
+class ExitIndex:
+    """Block max/min pyramid over high and low for first-hit exit searches.
+
+    Level 0 is the bars themselves; each level above holds the highest high
+    and lowest low of every `block` entries of the level below. A search
+    scans forward at each level on the way up until some block holds a hit,
+    then descends into that block level by level, so it reads O(block) entries
+    per level: O(block * log_block(n)) however long the position is held.
+    The first scan covers lead_blocks blocks of bars, since most positions
+    close within a few hundred. Building it is one O(n) pass, and the index
+    can be shared by every simulation over the same bars, e.g. across exit
+    parameters in a sweep.
+    """
+
+    def __init__(self, high, low, block=64, lead_blocks=4):
+        self.block = block
+        self.lead_blocks = lead_blocks
+        self.levels = [(high, low)]
+        while len(high) > block:
+            pad = -len(high) % block
+            # fmax/fmin skip NaNs, which never trigger an exit
+            high = np.fmax.reduce(np.concatenate((high, np.full(pad, np.nan, high.dtype))).reshape(-1, block), axis=1)
+            low = np.fmin.reduce(np.concatenate((low, np.full(pad, np.nan, low.dtype))).reshape(-1, block), axis=1)
+            self.levels.append((high, low))
+
+    def __len__(self):
+        return len(self.levels[0][0])
+
+    def first_hit(self, start, target_price, stop_price):
+        """Return the first index >= start where the target or stop is hit, or None."""
+        block = self.block
+        pos = start
+        for level, (high, low) in enumerate(self.levels):
+            n = len(high)
+            if pos >= n:
+                return None
+            # Scans end on a block boundary, so the level above picks up exactly where they stop
+            end = min((pos // block + (self.lead_blocks if level == 0 else 1)) * block, n)
+            hit = (high[pos:end] >= target_price) | (low[pos:end] <= stop_price)
+            first = int(hit.argmax())
+            if hit[first]:
+                index = pos + first
+                # Every entry of the hit block lies past start; find the first hit inside it
+                for high, low in reversed(self.levels[:level]):
+                    lo = index * block
+                    hi = min(lo + block, len(high))
+                    index = lo + int(((high[lo:hi] >= target_price) | (low[lo:hi] <= stop_price)).argmax())
+                return index
+            if end == n:
+                return None
+            pos = end // block
+        return None
+
+
+def simulate(arrays, entry_mask, capital, target_profit_pct, stop_loss_pct, position=None, start=0,
+             exit_index=None):
+    """Jump from entry to exit over `arrays`, mirroring the bar-by-bar loop.
+
+    Exits are found with `exit_index`, an ExitIndex over the arrays' high and
+    low, built here when not given. Returns (trades, capital, position),
+    where position is the still-open position at the end of the data, or
+    None.
+    """
+    timestamp = arrays['timestamp']
+    high = arrays['high']
+    low = arrays['low']
+    close = arrays['close']
+    if exit_index is None:
+        exit_index = ExitIndex(high, low)
+    entries = np.flatnonzero(entry_mask)
+    trades = []
+    i = start
+
+    while True:
+        if position is not None:
+            exit_idx = exit_index.first_hit(i, position['target_price'], position['stop_price'])
+            if exit_idx is None:
+                break
+
+            # Determine exit price
+            if high[exit_idx] >= position['target_price']:
+                exit_price = position['target_price']
+                exit_type = 'target'
+            else:
+                exit_price = position['stop_price']
+                exit_type = 'stop'
+
+            pl = (exit_price - position['entry_price']) * position['shares']
+            capital += pl
+            trades.append({
+                'entry_time': position['entry_time'],
+                'exit_time': to_timestamp(timestamp[exit_idx]),
+                'entry_price': position['entry_price'],
+                'exit_price': exit_price,
+                'shares': position['shares'],
+                'pl': pl,
+                'exit_type': exit_type
+            })
+            position = None
+            # The exit bar can't also be an entry bar
+            i = exit_idx + 1
+
+        # Jump to the next volume spike
+        k = np.searchsorted(entries, i)
+        if k >= len(entries):
+            break
+        entry_idx = int(entries[k])
+        entry_price = float(close[entry_idx])
+        position = {
+            'shares': int(capital / entry_price),
+            'entry_price': entry_price,
+            'entry_time': to_timestamp(timestamp[entry_idx]),
+            'target_price': entry_price * (1 + target_profit_pct),
+            'stop_price': entry_price * (1 - stop_loss_pct)
+        }
+        i = entry_idx + 1
+
+    return trades, capital, position
@@ -0,0 +1,115 @@
+import asyncio
+import itertools
+import threading
+
+import msgpack
+import pandas as pd
+import websockets
+
+
+def _timestamp(moment):
+    """A msgpack timestamp, which is how the stream sends times."""
+    return msgpack.Timestamp.from_unix_nano(pd.Timestamp(moment).value)
+
+
+class FakeDataStreamServer:
+    """Local websocket server speaking Alpaca's market data stream protocol.
+
+    Accepts any credentials, records subscriptions and pushes the trades and
+    bars it is given to every connected client. Point MarketDataStream's
+    url_override (or ALPACA_DATA_STREAM_URL) at `url` to run it without a live
+    feed. Serves from its own event loop in a background thread.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port  # 0 picks a free port on start()
+        self.subscriptions = {'trades': set(), 'quotes': set(), 'bars': set()}
+        self._clients = set()
+        self._subscribed = threading.Event()
+        self._trade_ids = itertools.count(1)
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'ws://{self.host}:{self.port}'
+
+    async def _handle(self, websocket, path=None):
+        await websocket.send(msgpack.packb([{'T': 'success', 'msg': 'connected'}]))
+        try:
+            async for message in websocket:
+                request = msgpack.unpackb(message)
+                action = request.get('action')
+                if action == 'auth':
+                    self._clients.add(websocket)
+                    reply = {'T': 'success', 'msg': 'authenticated'}
+                elif action in ('subscribe', 'unsubscribe'):
+                    for channel, symbols in self.subscriptions.items():
+                        if action == 'subscribe':
+                            symbols.update(request.get(channel, ()))
+                        else:
+                            symbols.difference_update(request.get(channel, ()))
+                    reply = {'T': 'subscription', **{c: sorted(s) for c, s in self.subscriptions.items()}}
+                    self._subscribed.set()
+                else:
+                    reply = {'T': 'error', 'code': 400, 'msg': 'invalid syntax'}
+                await websocket.send(msgpack.packb([reply]))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._clients.discard(websocket)
+
+    def start(self):
+        """Start serving; returns self once the port is open."""
+        ready = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+
+            async def listen():
+                return await websockets.serve(self._handle, self.host, self.port)
+
+            self._server = self._loop.run_until_complete(listen())
+            self.port = self._server.sockets[0].getsockname()[1]
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, name='fake-data-stream', daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Close every connection and the server. Stop clients first, or they reconnect."""
+        async def close():
+            self._server.close()
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def wait_subscribed(self, timeout=10):
+        """Whether a client subscribed within timeout seconds."""
+        return self._subscribed.wait(timeout)
+
+    def publish(self, *messages):
+        """Send raw stream messages (dicts keyed like Alpaca's, with 'T' and 'S') to every client."""
+        data = msgpack.packb(list(messages))
+
+        async def send():
+            for client in list(self._clients):
+                await client.send(data)
+
+        asyncio.run_coroutine_threadsafe(send(), self._loop).result()
+
+    def trade(self, symbol, price, timestamp, size=100):
+        self.publish({'T': 't', 'S': symbol, 'i': next(self._trade_ids), 'x': 'V', 'p': price, 's': size,
+                      't': _timestamp(timestamp), 'c': ['@'], 'z': 'C'})
+
+    def bar(self, symbol, timestamp, open, high, low, close, volume):
+        """A minute bar; timestamp is the start of the minute."""
+        self.publish({'T': 'b', 'S': symbol, 'o': open, 'h': high, 'l': low, 'c': close, 'v': volume,
+                      't': _timestamp(timestamp), 'n': 1, 'vw': close})
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class RollingWindow:
+    """Fixed-size ring buffer with a running sum, for O(1) rolling means.
+
+    backend='list' keeps plain Python floats; backend='numpy' keeps a
+    float64 array, which makes values() and batch warm-up cheaper for long
+    windows. Values may carry a timestamp, so drop_before() can also bound
+    the window by age.
+    """
+
+    BACKENDS = ('list', 'numpy')
+
+    def __init__(self, capacity, backend='list'):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {self.BACKENDS}")
+        self.capacity = capacity
+        self.backend = backend
+        self._buffer = np.zeros(capacity) if backend == 'numpy' else [0.0] * capacity
+        self._times = [None] * capacity  # timestamp given with each value, if any
+        self._start = 0   # index of the oldest value
+        self._count = 0
+        self._sum = 0.0
+        self._updates = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def full(self):
+        return self._count == self.capacity
+
+    @property
+    def sum(self):
+        return self._sum
+
+    @property
+    def mean(self):
+        return self._sum / self._count if self._count else 0.0
+
+    @property
+    def last(self):
+        if not self._count:
+            raise IndexError("window is empty")
+        return self._buffer[(self._start + self._count - 1) % self.capacity]
+
+    def push(self, value, timestamp=None):
+        """Add a value, dropping the oldest one once the window is full."""
+        value = float(value)
+        if self._count < self.capacity:
+            index = (self._start + self._count) % self.capacity
+            self._buffer[index] = value
+            self._times[index] = timestamp
+            self._count += 1
+            self._sum += value
+        else:
+            self._sum += value - self._buffer[self._start]
+            self._buffer[self._start] = value
+            self._times[self._start] = timestamp
+            self._start = (self._start + 1) % self.capacity
+
+        # Re-add from scratch now and then so float rounding can't drift
+        self._updates += 1
+        if self._updates >= self.capacity * 64:
+            self._sum = float(sum(self.values()))
+            self._updates = 0
+
+    def replace_last(self, value):
+        """Overwrite the newest value, e.g. when a still-forming bar is revised."""
+        if not self._count:
+            raise IndexError("window is empty")
+        index = (self._start + self._count - 1) % self.capacity
+        value = float(value)
+        self._sum += value - self._buffer[index]
+        self._buffer[index] = value
+
+    def warm_up(self, values, timestamps=None):
+        """Load history in one batch; only the last `capacity` values are kept."""
+        values = np.asarray(values, dtype=np.float64)[-self.capacity:]
+        self._start = 0
+        self._count = len(values)
+        self._buffer[:self._count] = values if self.backend == 'numpy' else values.tolist()
+        self._times = ([None] * self._count if timestamps is None
+                       else list(timestamps)[-self.capacity:]) + [None] * (self.capacity - self._count)
+        self._sum = float(sum(values.tolist()))
+        self._updates = 0
+
+    def drop_before(self, timestamp):
+        """Drop the oldest values while their timestamp is earlier than `timestamp`."""
+        while self._count and self._times[self._start] is not None and self._times[self._start] < timestamp:
+            self._sum -= self._buffer[self._start]
+            self._start = (self._start + 1) % self.capacity
+            self._count -= 1
+        if not self._count:
+            self._sum = 0.0
+
+    def values(self):
+        """Window contents, oldest first."""
+        if self.backend == 'numpy':
+            return np.roll(self._buffer, -self._start)[:self._count]
+        ordered = self._buffer[self._start:] + self._buffer[:self._start]
+        return ordered[:self._count]
+
+
+class VolumeSpike:
+    """Incremental version of the volume-spike entry signal.
+
+    update() reports whether a bar's volume exceeds `multiplier` times the
+    mean volume of the previous `window` bars, then adds it to the window.
+    """
+
+    def __init__(self, window=20, multiplier=1.2, backend='list'):
+        self.multiplier = multiplier
+        self.volumes = RollingWindow(window, backend=backend)
+
+    def update(self, volume):
+        spike = self.volumes.full and volume > self.volumes.mean * self.multiplier
+        self.volumes.push(volume)
+        return spike
+
+
+def volume_spike_mask(volume, window=20, multiplier=1.2):
+    """Flag bars whose volume exceeds `multiplier` times the mean of the previous `window` bars.
+
+    Batch equivalent of feeding every bar through VolumeSpike.update().
+    """
+    volume = np.asarray(volume, dtype=np.float64)
+    mask = np.zeros(len(volume), dtype=bool)
+    if len(volume) <= window:
+        return mask
+
+    # Sum of the `window` bars strictly before each bar, via a cumulative sum
+    csum = np.concatenate(([0.0], np.cumsum(volume)))
+    avg_volume = (csum[window:-1] - csum[:-window - 1]) / window
+    mask[window:] = volume[window:] > avg_volume * multiplier
+    return mask
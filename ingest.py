@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+from engine import BAR_COLUMNS
+
+# Bar field names in raw Alpaca API responses
+RAW_FIELDS = {
+    'timestamp': 't',
+    'open': 'o',
+    'high': 'h',
+    'low': 'l',
+    'close': 'c',
+    'volume': 'v',
+    'trade_count': 'n',
+    'vwap': 'vw',
+}
+
+
+def column_dtype(column, price_dtype=np.float64, volume_dtype=np.float64):
+    """NumPy dtype used for a bar column."""
+    if column == 'timestamp':
+        return np.int64
+    if column in ('volume', 'trade_count'):
+        return volume_dtype
+    return price_dtype
+
+
+def empty_arrays(columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+    """Zero-length column arrays, for symbols with no bars."""
+    return {column: np.empty(0, dtype=column_dtype(column, price_dtype, volume_dtype)) for column in columns}
+
+
+def raw_to_arrays(raw_bars, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+    """Convert a list of raw API bar dicts into typed, contiguous column arrays.
+
+    Only the requested columns are read. Timestamps become int64 UTC
+    nanoseconds; prices and volumes use the given dtypes (e.g. float32
+    prices and int64 volumes to halve memory).
+    """
+    n = len(raw_bars)
+    arrays = {}
+    for column in columns:
+        field = RAW_FIELDS[column]
+        if column == 'timestamp':
+            timestamps = pd.to_datetime([bar[field] for bar in raw_bars], utc=True)
+            arrays[column] = np.asarray(timestamps.asi8, dtype=np.int64)
+        else:
+            dtype = column_dtype(column, price_dtype, volume_dtype)
+            arrays[column] = np.fromiter((bar[field] for bar in raw_bars), dtype=dtype, count=n)
+    return arrays
+
+
+def models_to_arrays(bars, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+    """Convert alpaca-py Bar models into column arrays, reading only the requested fields."""
+    n = len(bars)
+    arrays = {}
+    for column in columns:
+        if column == 'timestamp':
+            timestamps = pd.to_datetime([bar.timestamp for bar in bars], utc=True)
+            arrays[column] = np.asarray(timestamps.asi8, dtype=np.int64)
+        else:
+            dtype = column_dtype(column, price_dtype, volume_dtype)
+            arrays[column] = np.fromiter((getattr(bar, column) for bar in bars), dtype=dtype, count=n)
+    return arrays
+
+
+def to_arrays(response, symbol, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+    """Column arrays for one symbol from a get_stock_bars response.
+
+    Accepts the raw dict returned by clients created with raw_data=True, which
+    skips building a pydantic Bar per row, as well as a regular BarSet.
+    """
+    if isinstance(response, dict):
+        bars = response.get(symbol, [])
+        convert = raw_to_arrays
+    else:
+        bars = response.data.get(symbol, [])
+        convert = models_to_arrays
+    if not bars:
+        return empty_arrays(columns, price_dtype, volume_dtype)
+    return convert(bars, columns, price_dtype, volume_dtype)
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+import logging
+
+import pandas as pd
+from alpaca.data.enums import DataFeed
+from alpaca.data.live import StockDataStream
+
+from indicators import RollingWindow
+
+# Feed for streamed and REST market data alike, so streamed volumes compare with
+# REST history: 'iex' works on every plan, 'sip' needs a paid subscription
+DATA_FEED = DataFeed(os.getenv("ALPACA_DATA_FEED", "iex").lower())
+
+
+class MarketDataStream:
+    """In-memory market state per symbol, kept current by Alpaca's StockDataStream.
+
+    Trades update the latest price and minute bars feed rolling close/volume
+    windows, so trading decisions read local state instead of making a REST
+    call. Point url_override (or ALPACA_DATA_STREAM_URL) at a local
+    fake_stream.FakeDataStreamServer to test without a live feed.
+    """
+
+    def __init__(self, symbols, window=120, feed=DATA_FEED, url_override=None):
+        self.symbols = list(symbols)
+        self.feed = feed
+        self.window = window
+        self._lock = threading.Lock()
+        self._latest = {}         # symbol -> (price, timestamp, monotonic receive time)
+        self._bar_listeners = {}  # symbol -> callbacks taking a Bar
+        self.closes = {symbol: RollingWindow(window) for symbol in self.symbols}
+        self.volumes = {symbol: RollingWindow(window) for symbol in self.symbols}
+        self.last_bar_time = {}
+        self._thread = None
+
+        self.stream = StockDataStream(
+            os.getenv("ALPACA_API_KEY"),
+            os.getenv("ALPACA_API_SECRET"),
+            feed=feed,
+            url_override=url_override or os.getenv("ALPACA_DATA_STREAM_URL")
+        )
+        self.stream.subscribe_trades(self._on_trade, *self.symbols)
+        self.stream.subscribe_bars(self._on_bar, *self.symbols)
+
+    async def _on_trade(self, trade):
+        with self._lock:
+            self._latest[trade.symbol] = (trade.price, trade.timestamp, time.monotonic())
+
+    async def _on_bar(self, bar):
+        with self._lock:
+            self.closes[bar.symbol].push(bar.close)
+            self.volumes[bar.symbol].push(bar.volume)
+            self.last_bar_time[bar.symbol] = pd.Timestamp(bar.timestamp)
+            # A bar close is also a price, if no trade has arrived since
+            latest = self._latest.get(bar.symbol)
+            if latest is None or latest[1] < bar.timestamp:
+                self._latest[bar.symbol] = (bar.close, bar.timestamp, time.monotonic())
+            listeners = list(self._bar_listeners.get(bar.symbol, ()))
+
+        for listener in listeners:
+            try:
+                listener(bar)
+            except Exception as e:
+                logging.error(f"Bar listener for {bar.symbol} failed: {e}")
+
+    def add_bar_listener(self, symbol, callback):
+        """Call callback(bar) from the stream thread for every minute bar of symbol."""
+        with self._lock:
+            self._bar_listeners.setdefault(symbol, []).append(callback)
+
+    def latest_price(self, symbol, max_age=60):
+        """Latest trade (or bar close) price, or None if nothing arrived within max_age seconds."""
+        with self._lock:
+            latest = self._latest.get(symbol)
+        if latest is None:
+            return None
+        price, _, received = latest
+        if max_age is not None and time.monotonic() - received > max_age:
+            return None
+        return price
+
+    def start(self):
+        """Run the websocket in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.stream.run, name="market-data-stream", daemon=True)
+            self._thread.start()
+            logging.info(f"Started market data stream for {', '.join(self.symbols)}")
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.stream.stop()
+            self._thread.join(timeout=10)
+        self._thread = None
@@ -0,0 +1,201 @@
+import bisect
+import functools
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency buckets in seconds, from a fast REST call up to a slow fill
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_local = threading.local()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def count(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            return sum(series[:-1]) if series else 0
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, [("le", le)])} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {series[-1]}')
+                lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labels, buckets)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+broker_requests = REGISTRY.counter(
+    'trader_broker_requests_total', 'Alpaca REST calls by endpoint, symbol and outcome',
+    ('endpoint', 'symbol', 'outcome'))
+broker_request_seconds = REGISTRY.histogram(
+    'trader_broker_request_seconds', 'Alpaca REST call latency, excluding rate-limit waits', ('endpoint',))
+rate_limit_wait_seconds = REGISTRY.histogram(
+    'trader_rate_limit_wait_seconds', 'Time calls spent queued for the request budget', ('endpoint',))
+coalesced_requests = REGISTRY.counter(
+    'trader_coalesced_requests_total', 'Read calls answered by an identical call already in flight', ('endpoint',))
+iteration_seconds = REGISTRY.histogram(
+    'trader_iteration_seconds', 'Time per trading loop iteration, excluding sleeps', ('loop',))
+step_seconds = REGISTRY.histogram(
+    'trader_step_seconds', 'Time per trading decision', ('symbol',))
+decisions = REGISTRY.counter(
+    'trader_decisions_total', 'Trading decisions by outcome', ('symbol', 'outcome'))
+signal_to_submit_seconds = REGISTRY.histogram(
+    'trader_signal_to_submit_seconds', 'From a favorable signal to the entry order being accepted', ('symbol',))
+submit_to_fill_seconds = REGISTRY.histogram(
+    'trader_submit_to_fill_seconds', 'From entry order acceptance to its fill', ('symbol',))
+cancel_seconds = REGISTRY.histogram(
+    'trader_cancel_seconds', 'Time to cancel and confirm a symbol\'s open orders', ('symbol',))
+
+
+def current_symbol():
+    """Symbol the calling thread is working on, for attributing API cost."""
+    return getattr(_local, 'symbol', '')
+
+
+@contextmanager
+def symbol_scope(symbol):
+    """Attribute broker calls made by this thread inside the block to symbol."""
+    previous = getattr(_local, 'symbol', '')
+    _local.symbol = symbol
+    try:
+        yield
+    finally:
+        _local.symbol = previous
+
+
+def for_symbol(method):
+    """Decorator attributing broker calls made inside a trader method to self.symbol."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with symbol_scope(self.symbol):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Scrapes would flood the trading log
+
+
+def start_http_server(port, addr='127.0.0.1', registry=REGISTRY):
+    """Serve /metrics on a daemon thread; returns the server."""
+    handler = type('MetricsHandler', (_Handler,), {'registry': registry})
+    server = ThreadingHTTPServer((addr, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Serving metrics on http://{addr}:{server.server_address[1]}/metrics")
+    return server
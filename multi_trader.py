@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+from datetime import datetime, timezone
+
+from alpaca.data.requests import StockBarsRequest
+from alpaca.data.timeframe import TimeFrame
+
+import metrics
+import trader
+from ingest import to_arrays
+from market_stream import DATA_FEED, MarketDataStream
+from order_book import OrderBook
+from order_tracker import OrderTracker, open_orders
+from rate_limit import MONITORING, log_usage, priority
+from scheduler import MarketScheduler
+from state_store import StateStore
+from trade_store import TradeStore
+from trader import OnePercentTrader, naive_utc
+
+
+class MultiSymbolTrader:
+    """Run OnePercentTrader state machines for many symbols in one process.
+
+    Each tick takes one clock, positions and orders snapshot and one batched
+    hourly-bars request for all symbols, then hands them to every symbol's
+    trader. API calls per tick stay constant as symbols are added.
+    """
+
+    def __init__(self, symbols, investment_amount=10000, market_data=None, order_tracker=None,
+                 trading_client=trader.trading_client, data_client=trader.data_client, batch_size=100,
+                 order_book=None, trade_store=None, state_store=None, now=None):
+        self.trading_client = trading_client
+        self.now = now or (lambda: datetime.now(timezone.utc))
+        self.order_book = order_book
+        self.trade_store = trade_store  # Optional TradeStore shared by every symbol
+        self.data_client = data_client
+        self.feed = market_data.feed if market_data is not None else DATA_FEED
+        self.batch_size = batch_size  # Symbols per multi-symbol bars request
+        self.traders = {
+            symbol: OnePercentTrader(
+                symbol, investment_amount,
+                market_data=market_data,
+                order_tracker=order_tracker,
+                trading_client=trading_client,
+                data_client=data_client,
+                order_book=order_book,
+                trade_store=trade_store,
+                state_store=state_store,
+                now=now
+            )
+            for symbol in symbols
+        }
+
+    def update_market_conditions(self):
+        """Bring every trader's hourly volume window up to date with batched requests."""
+        stale = [t for t in self.traders.values() if t.needs_hourly_bars()]
+        if not stale:
+            return
+
+        end_dt = naive_utc(self.now())
+        for i in range(0, len(stale), self.batch_size):
+            batch = stale[i:i + self.batch_size]
+            # One request from the earliest start any trader in the batch needs
+            start_dt = min(t.hourly_bars_start(end_dt) for t in batch)
+            request = StockBarsRequest(
+                symbol_or_symbols=[t.symbol for t in batch],
+                timeframe=TimeFrame.Hour,
+                start=start_dt,
+                end=end_dt,
+                feed=self.feed
+            )
+            bars = self.data_client.get_stock_bars(request)
+            for t in batch:
+                t.update_hourly_volume(to_arrays(bars, t.symbol, columns=['timestamp', 'volume']))
+
+    def warm_up(self):
+        """Bring every symbol's indicators up to date before the session starts."""
+        self.update_market_conditions()
+
+    def sync_trades(self):
+        """Record every symbol's newly completed trades in the trade store."""
+        if self.trade_store is None:
+            return 0
+        return sum(t.sync_trades(self.trade_store) for t in self.traders.values())
+
+    def tick(self, scheduler=None):
+        """Run one decision for every symbol; returns False while the market is closed."""
+        started = time.monotonic()
+        if scheduler is not None:
+            is_open = scheduler.is_open()
+        else:
+            is_open = self.trading_client.get_clock().is_open
+        if not is_open:
+            return False
+
+        if self.order_book is None:
+            positions = self.trading_client.get_all_positions()
+            orders = open_orders(self.trading_client)
+        else:
+            # Traders look their symbol up in the shared order book instead
+            positions = orders = None
+        try:
+            self.update_market_conditions()
+        except Exception as e:
+            logging.error(f"Error fetching hourly bars: {e}")
+
+        traded = False
+        for symbol, symbol_trader in self.traders.items():
+            try:
+                outcome = symbol_trader.step(positions, orders, market_ok=symbol_trader.volume_favorable())
+                traded = traded or outcome == 'traded'
+            except Exception as e:
+                logging.error(f"Error trading {symbol}: {e}")
+
+        if traded:
+            # Entries changed the order book; take one fresh snapshot for everyone
+            if self.order_book is None:
+                with priority(MONITORING):
+                    orders = open_orders(self.trading_client)
+            for symbol_trader in self.traders.values():
+                symbol_trader.monitor_orders(orders)
+        metrics.iteration_seconds.observe(time.monotonic() - started, loop='multi')
+        return True
+
+    def run(self, scheduler=None):
+        """Main trading loop."""
+        logging.info(f"Starting trading bot for {len(self.traders)} symbols: {', '.join(self.traders)}")
+        scheduler = scheduler or MarketScheduler(self.trading_client)
+
+        while True:
+            try:
+                if not self.tick(scheduler):
+                    logging.info("Market is closed. Waiting...")
+                    log_usage([self.trading_client, self.data_client])
+                    self.sync_trades()
+                    scheduler.sleep_until_open(warm_up=self.warm_up)
+                    continue
+
+                # Wait for the next bar to close
+                scheduler.sleep_until_next_bar()
+
+            except Exception as e:
+                logging.error(f"Error in main loop: {e}")
+                time.sleep(60)
+
+
+if __name__ == "__main__":
+    symbols = [s.strip().upper() for s in input("Enter stock symbols to trade, separated by commas (e.g., AAPL,MSFT): ").split(',') if s.strip()]
+    investment = float(input("Enter the investment amount per trade (default: 10000): ") or 10000)
+
+    # One account-wide catch-up instead of a positions and orders request per symbol
+    state_store = StateStore()
+    try:
+        state_store.reconcile(trader.trading_client)
+    except Exception as e:
+        logging.error(f"Error reconciling saved state: {e}")
+
+    market_data = None
+    order_tracker = None
+    order_book = None
+    if os.getenv("ALPACA_STREAM", "False").lower() == "true":
+        market_data = MarketDataStream(symbols)
+        market_data.start()
+        order_tracker = OrderTracker(trader.trading_client, paper=os.getenv("ALPACA_PAPER", "True").lower() == "true")
+        order_book = OrderBook(trader.trading_client, order_tracker)
+        state_store.attach(order_tracker)
+        order_tracker.start()
+
+    if os.getenv("ALPACA_METRICS_PORT"):
+        metrics.start_http_server(int(os.getenv("ALPACA_METRICS_PORT")))
+
+    MultiSymbolTrader(symbols, investment, market_data=market_data, order_tracker=order_tracker,
+                      order_book=order_book, trade_store=TradeStore(), state_store=state_store).run()
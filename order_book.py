@@ -0,0 +1,162 @@
+import threading
+import logging
+from datetime import datetime, timezone
+
+from order_tracker import TERMINAL_STATUSES, open_orders, status_name
+
+
+def _order_key(order):
+    return order.symbol, status_name(order.side), status_name(order.type)
+
+
+class OrderBook:
+    """In-process mirror of open orders and positions.
+
+    Open orders are indexed by id, by symbol and by (symbol, side, type), so
+    "does AAPL have a sell stop?" is a dictionary lookup. With an OrderTracker
+    the mirror follows trade updates as they arrive; either way it is
+    reconciled against one open-orders snapshot at most every
+    reconcile_interval seconds, which corrects anything the stream missed.
+    Positions are refreshed in one call whenever a fill has made them stale.
+    Intervals are timed on the `now` clock (aware UTC), so a simulated clock
+    drives them as well as wall time.
+    """
+
+    def __init__(self, trading_client, order_tracker=None, reconcile_interval=60, now=None):
+        self.trading_client = trading_client
+        self.now = now or (lambda: datetime.now(timezone.utc))
+        self.live = order_tracker is not None  # Whether trade updates keep the mirror current
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.RLock()
+        self._orders = {}      # order id -> open Order
+        self._by_symbol = {}   # symbol -> set of order ids
+        self._by_key = {}      # (symbol, side, type) -> set of order ids
+        self._positions = {}   # symbol -> Position
+        self._touched = {}     # order id -> when apply() last changed it
+        self._reconciled_at = None
+        self._positions_stale = True
+
+        if order_tracker is not None:
+            order_tracker.add_listener(self._on_trade_update)
+
+    def _add(self, order):
+        order_id = str(order.id)
+        self._remove(order_id)
+        self._orders[order_id] = order
+        self._by_symbol.setdefault(order.symbol, set()).add(order_id)
+        self._by_key.setdefault(_order_key(order), set()).add(order_id)
+
+    def _remove(self, order_id):
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return
+        for index, key in ((self._by_symbol, order.symbol), (self._by_key, _order_key(order))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(order_id)
+                if not ids:
+                    del index[key]
+
+    def apply(self, order):
+        """Bring one order (and any bracket legs) up to date in the mirror."""
+        with self._lock:
+            for o in [order] + list(getattr(order, 'legs', None) or []):
+                self._touched[str(o.id)] = self.now()
+                if status_name(o.status) in TERMINAL_STATUSES:
+                    self._remove(str(o.id))
+                else:
+                    self._add(o)
+
+    def _on_trade_update(self, update):
+        self.apply(update.order)
+        if status_name(update.event) in ('fill', 'partial_fill'):
+            self._positions_stale = True
+
+    def reconcile(self):
+        """Diff the mirror against the broker's open orders and apply the delta.
+
+        The snapshot is fetched without holding the lock, so trade updates can
+        land while it is in flight. Orders applied since the request started
+        are left as they are, and a listed order never replaces a copy with a
+        later updated_at.
+        """
+        started = self.now()
+        orders = open_orders(self.trading_client)
+        with self._lock:
+            recent = {order_id for order_id, at in self._touched.items() if at >= started}
+            self._touched = {order_id: self._touched[order_id] for order_id in recent}
+            live = {str(o.id): o for o in orders if str(o.id) not in recent}
+            missing = live.keys() - self._orders.keys()
+            gone = self._orders.keys() - live.keys() - recent
+            for order_id in gone:
+                self._remove(order_id)
+            for order_id, order in live.items():
+                current = self._orders.get(order_id)
+                if (current is not None and current.updated_at is not None and order.updated_at is not None
+                        and order.updated_at < current.updated_at):
+                    continue
+                self._add(order)
+            self._reconciled_at = self.now()
+            self._positions_stale = True
+        if missing or gone:
+            logging.info(f"Order book reconciled: {len(missing)} added, {len(gone)} removed")
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            stale = (self._reconciled_at is None
+                     or (self.now() - self._reconciled_at).total_seconds() > self.reconcile_interval)
+        if stale:
+            self.reconcile()
+
+    def invalidate(self):
+        """Force a reconcile and position refresh on the next lookup."""
+        with self._lock:
+            self._reconciled_at = None
+            self._positions_stale = True
+
+    def changed(self):
+        """Note that orders were just submitted or cancelled.
+
+        A streamed mirror hears about it from trade updates; otherwise the next
+        lookup reconciles.
+        """
+        if not self.live:
+            self.invalidate()
+
+    def get(self, order_id):
+        self._refresh_if_stale()
+        with self._lock:
+            return self._orders.get(str(order_id))
+
+    def open_orders(self, symbol=None, side=None, type=None):
+        """Open orders, optionally narrowed to a symbol and to a side and type."""
+        self._refresh_if_stale()
+        with self._lock:
+            if symbol is None:
+                return list(self._orders.values())
+            if side is None and type is None:
+                ids = self._by_symbol.get(symbol, ())
+            else:
+                ids = self._by_key.get((symbol, status_name(side), status_name(type)), ())
+            return [self._orders[order_id] for order_id in ids]
+
+    def has_order(self, symbol, side, type):
+        self._refresh_if_stale()
+        with self._lock:
+            return bool(self._by_key.get((symbol, status_name(side), status_name(type))))
+
+    def positions(self):
+        """Symbol -> Position, refreshed after fills and on reconciliation."""
+        self._refresh_if_stale()
+        with self._lock:
+            stale = self._positions_stale
+        if stale:
+            positions = self.trading_client.get_all_positions()
+            with self._lock:
+                self._positions = {p.symbol: p for p in positions}
+                self._positions_stale = False
+        with self._lock:
+            return dict(self._positions)
+
+    def position(self, symbol):
+        return self.positions().get(symbol)
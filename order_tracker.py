@@ -0,0 +1,254 @@
+import os
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from alpaca.common.enums import Sort
+from alpaca.trading.enums import QueryOrderStatus
+from alpaca.trading.requests import GetOrdersRequest
+from alpaca.trading.stream import TradingStream
+
+import metrics
+
+# Order statuses after which an order will not change again
+TERMINAL_STATUSES = {'filled', 'canceled', 'expired', 'rejected', 'done_for_day', 'replaced'}
+
+# Most orders the API returns per request
+ORDERS_PAGE_LIMIT = 500
+
+
+def status_name(status):
+    """Plain string for an OrderStatus/TradeEvent enum or string."""
+    return getattr(status, 'value', status)
+
+
+def open_orders(trading_client, symbols=None):
+    """Every open order, bracket legs included, oldest first.
+
+    A bare get_orders() returns at most 50 orders, with each bracket leg
+    counting as one.
+    """
+    return paged_orders(trading_client, QueryOrderStatus.OPEN, symbols=symbols)
+
+
+def paged_orders(trading_client, status, symbols=None, after=None, nested=None):
+    """Every order in a QueryOrderStatus submitted after `after` (if given), oldest first.
+
+    Asks for ORDERS_PAGE_LIMIT orders at a time and pages on submission time
+    until a page comes back short. With nested=True, bracket legs come back
+    under their parent order instead of as orders of their own.
+    """
+    orders = {}
+    while True:
+        page = trading_client.get_orders(filter=GetOrdersRequest(
+            status=status,
+            symbols=symbols,
+            after=after,
+            direction=Sort.ASC,
+            nested=nested,
+            limit=ORDERS_PAGE_LIMIT
+        ))
+        new = [o for o in page if str(o.id) not in orders]
+        for o in new:
+            orders[str(o.id)] = o
+        if len(page) < ORDERS_PAGE_LIMIT or not new:
+            return list(orders.values())
+        # `after` is exclusive and legs share their parent's submission time;
+        # step back a little and drop the repeats rather than skip any
+        after = max(o.submitted_at or o.created_at for o in page) - timedelta(microseconds=1)
+
+
+class OrderTracker:
+    """Local order-state table fed by Alpaca's trade_updates stream.
+
+    Each update replaces the stored order, and waiters for that order wake as
+    soon as it reaches a terminal status. If the stream is quiet, wait_for_fill
+    polls the REST API every poll_interval seconds as a fallback. Orders are
+    dropped from the table `retention` seconds after they finish.
+    """
+
+    def __init__(self, trading_client, paper=True, url_override=None, retention=3600):
+        self.trading_client = trading_client
+        self.retention = retention
+        self._lock = threading.Lock()
+        self.orders = {}         # order id -> latest Order
+        self.last_event = {}     # order id -> last trade update event name
+        self._done = {}          # order id -> threading.Event set at a terminal status
+        self._finished = {}      # order id -> monotonic time it reached a terminal status, oldest first
+        self._listeners = []     # callbacks taking a TradeUpdate
+        self._thread = None
+
+        self.stream = TradingStream(
+            os.getenv("ALPACA_API_KEY"),
+            os.getenv("ALPACA_API_SECRET"),
+            paper=paper,
+            url_override=url_override or os.getenv("ALPACA_TRADING_STREAM_URL")
+        )
+        self.stream.subscribe_trade_updates(self._on_trade_update)
+
+    def done_event(self, order_id):
+        """threading.Event set once the order reaches a terminal status."""
+        with self._lock:
+            return self._done.setdefault(str(order_id), threading.Event())
+
+    def record(self, order, event=None):
+        """Store the latest state of an order and wake its waiters if it is done."""
+        order_id = str(order.id)
+        finished = status_name(order.status) in TERMINAL_STATUSES
+        now = time.monotonic()
+        with self._lock:
+            self.orders[order_id] = order
+            if event is not None:
+                self.last_event[order_id] = status_name(event)
+            done = self._done.setdefault(order_id, threading.Event())
+            if finished:
+                self._finished.setdefault(order_id, now)
+            self._prune(now)
+        if finished:
+            done.set()
+
+    def _prune(self, now):
+        """Forget orders that finished more than retention seconds ago; call with the lock held."""
+        for order_id, finished_at in list(self._finished.items()):
+            if now - finished_at < self.retention:
+                break
+            del self._finished[order_id]
+            self.orders.pop(order_id, None)
+            self.last_event.pop(order_id, None)
+            self._done.pop(order_id, None)
+
+    async def _on_trade_update(self, update):
+        self.record(update.order, update.event)
+        for listener in list(self._listeners):
+            try:
+                listener(update)
+            except Exception as e:
+                logging.error(f"Trade update listener failed: {e}")
+
+    def add_listener(self, callback):
+        """Call callback(update) from the stream thread for every trade update."""
+        self._listeners.append(callback)
+
+    def get(self, order_id):
+        with self._lock:
+            return self.orders.get(str(order_id))
+
+    def forget(self, order_id):
+        """Drop a finished order from the table."""
+        with self._lock:
+            self.orders.pop(str(order_id), None)
+            self.last_event.pop(str(order_id), None)
+            self._done.pop(str(order_id), None)
+            self._finished.pop(str(order_id), None)
+
+    def wait_for_fill(self, order_id, timeout=30, poll_interval=5):
+        """Block until the order reaches a terminal status or timeout seconds pass.
+
+        Returns the latest known Order, which is only filled if status says so.
+        """
+        done = self.done_event(order_id)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if done.wait(max(0, min(poll_interval, remaining))):
+                return self.get(order_id)
+
+            # Nothing from the stream; make sure we didn't miss an update
+            try:
+                self.record(self.trading_client.get_order_by_id(order_id))
+            except Exception as e:
+                logging.error(f"Polling order {order_id} failed: {e}")
+            if done.is_set() or remaining <= 0:
+                return self.get(order_id)
+
+    def start(self):
+        """Run the trade updates websocket in a background thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.stream.run, name="trade-updates-stream", daemon=True)
+            self._thread.start()
+            logging.info("Started trade updates stream")
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self.stream.stop()
+            self._thread.join(timeout=10)
+        self._thread = None
+
+
+def cancel_orders(trading_client, order_ids, tracker=None, timeout=5, poll_interval=0.5, max_workers=8):
+    """Cancel orders concurrently and wait, up to timeout seconds, for them to finish.
+
+    Confirmations come from the tracker's trade updates when one is given;
+    otherwise the orders are polled. Orders still unconfirmed at the deadline
+    get one last REST check. Returns a dict with:
+
+    - orders: order id -> final status ('canceled', 'filled', ...) or 'pending'
+    - errors: order id -> message for cancel requests the API rejected
+    - complete: True when no order is left pending
+    - seconds: time taken
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    order_ids = [str(order_id) for order_id in order_ids]
+    result = {'orders': {}, 'errors': {}, 'complete': True, 'seconds': 0.0}
+    if not order_ids:
+        return result
+    # Worker threads don't inherit the caller's symbol for request metrics
+    symbol = metrics.current_symbol()
+
+    def cancel(order_id):
+        try:
+            with metrics.symbol_scope(symbol):
+                trading_client.cancel_order_by_id(order_id)
+        except Exception as e:
+            # Usually the order filled or was cancelled already; its status says which
+            result['errors'][order_id] = str(e)[:200]
+
+    def fetch(order_id):
+        try:
+            with metrics.symbol_scope(symbol):
+                order = trading_client.get_order_by_id(order_id)
+        except Exception as e:
+            logging.error(f"Checking order {order_id} failed: {e}")
+            return None
+        if tracker is not None:
+            tracker.record(order)
+        return order
+
+    def final_status(order):
+        status = status_name(order.status) if order is not None else None
+        return status if status in TERMINAL_STATUSES else None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(order_ids)), thread_name_prefix="cancel") as pool:
+        list(pool.map(cancel, order_ids))
+
+        pending = set(order_ids)
+        if tracker is not None:
+            # A rejected cancel may concern an order the stream finished before
+            # we started listening; look those up rather than wait on them
+            list(pool.map(fetch, list(result['errors'])))
+            for order_id in order_ids:
+                if tracker.done_event(order_id).wait(max(0, deadline - time.monotonic())):
+                    result['orders'][order_id] = final_status(tracker.get(order_id))
+                    pending.discard(order_id)
+        else:
+            while pending and time.monotonic() < deadline:
+                ids = sorted(pending)
+                for order_id, order in zip(ids, pool.map(fetch, ids)):
+                    status = final_status(order)
+                    if status is not None:
+                        result['orders'][order_id] = status
+                        pending.discard(order_id)
+                if pending:
+                    time.sleep(max(0, min(poll_interval, deadline - time.monotonic())))
+
+        # One last look at anything the deadline caught
+        ids = sorted(pending)
+        for order_id, order in zip(ids, pool.map(fetch, ids)):
+            result['orders'][order_id] = final_status(order) or 'pending'
+
+    result['complete'] = 'pending' not in result['orders'].values()
+    result['seconds'] = time.monotonic() - started
+    return result
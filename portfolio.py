@@ -0,0 +1,195 @@
+import heapq
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from backtest import calculate_stats
+from bar_sources import AlpacaBarSource
+from engine import ExitIndex, to_timestamp
+from indicators import volume_spike_mask
+
+# Load environment variables
+load_dotenv()
+
+
+class PortfolioBacktest:
+    """Run the 1% strategy on a basket of symbols sharing one pool of capital.
+
+    Capital is split into max_positions equal slots; a volume spike only
+    opens a position when there is cash for it.
+    """
+
+    def __init__(self, symbols, initial_capital=10000, max_positions=None,
+                 target_profit_pct=0.01, stop_loss_pct=0.005,
+                 volume_window=20, volume_multiplier=1.2, batch_size=100, source=None):
+        self.symbols = list(symbols)
+        self.initial_capital = initial_capital
+        self.capital = initial_capital
+        self.max_positions = max_positions or len(self.symbols)
+        self.target_profit_pct = target_profit_pct
+        self.stop_loss_pct = stop_loss_pct
+        self.volume_window = volume_window
+        self.volume_multiplier = volume_multiplier
+        self.batch_size = batch_size  # Symbols per multi-symbol request
+        # Where bars come from; a local BarSource skips the Alpaca client entirely
+        self.source = source if source is not None else AlpacaBarSource(batch_size=batch_size)
+        self.data_client = getattr(self.source, 'client', None)  # Alpaca client, if the source has one
+        self.trades = {symbol: [] for symbol in self.symbols}
+        self.positions = {}
+
+    def get_bar_arrays(self, start_date, end_date):
+        """Get column arrays per symbol from the source, in as few requests as it allows."""
+        return self.source.get_bars(self.symbols, start_date, end_date)
+
+    def run_backtest(self, start_date, end_date):
+        """Run the portfolio backtest over the specified period."""
+        self.run(self.get_bar_arrays(start_date, end_date))
+
+    def run(self, arrays):
+        """Run the portfolio backtest over per-symbol column arrays."""
+        self.capital = self.initial_capital
+        self.trades = {symbol: [] for symbol in self.symbols}
+        self.positions = {}
+        cash = self.initial_capital
+        invested = 0.0  # cost basis of open positions
+
+        # Merge every symbol's entry signals into one timestamp-ordered stream
+        signal_times, signal_symbols, signal_bars = [], [], []
+        for symbol_id, symbol in enumerate(self.symbols):
+            mask = volume_spike_mask(
+                arrays[symbol]['volume'], window=self.volume_window, multiplier=self.volume_multiplier
+            )
+            bars = np.flatnonzero(mask)
+            signal_times.append(arrays[symbol]['timestamp'][bars])
+            signal_symbols.append(np.full(len(bars), symbol_id))
+            signal_bars.append(bars)
+        signal_times = np.concatenate(signal_times) if signal_times else np.empty(0, dtype=np.int64)
+        signal_symbols = np.concatenate(signal_symbols) if signal_symbols else np.empty(0, dtype=np.int64)
+        signal_bars = np.concatenate(signal_bars) if signal_bars else np.empty(0, dtype=np.int64)
+        order = np.lexsort((signal_symbols, signal_times))
+
+        exit_indexes = [ExitIndex(arrays[symbol]['high'], arrays[symbol]['low']) for symbol in self.symbols]
+        exits = []  # heap of (exit timestamp, symbol id, exit bar)
+        next_bar = [0] * len(self.symbols)  # first bar each symbol may enter on
+
+        def close_position(symbol_id, exit_bar):
+            nonlocal cash, invested
+            symbol = self.symbols[symbol_id]
+            position = self.positions.pop(symbol)
+            high = arrays[symbol]['high']
+            if high[exit_bar] >= position['target_price']:
+                exit_price = position['target_price']
+                exit_type = 'target'
+            else:
+                exit_price = position['stop_price']
+                exit_type = 'stop'
+
+            pl = (exit_price - position['entry_price']) * position['shares']
+            cash += exit_price * position['shares']
+            invested -= position['entry_price'] * position['shares']
+            self.trades[symbol].append({
+                'symbol': symbol,
+                'entry_time': position['entry_time'],
+                'exit_time': to_timestamp(arrays[symbol]['timestamp'][exit_bar]),
+                'entry_price': position['entry_price'],
+                'exit_price': exit_price,
+                'shares': position['shares'],
+                'pl': pl,
+                'exit_type': exit_type
+            })
+            next_bar[symbol_id] = exit_bar + 1
+
+        for k in order:
+            timestamp, symbol_id, bar = signal_times[k], signal_symbols[k], signal_bars[k]
+
+            # Release capital from positions that closed up to this bar
+            while exits and exits[0][0] <= timestamp:
+                _, exit_symbol, exit_bar = heapq.heappop(exits)
+                close_position(exit_symbol, exit_bar)
+
+            symbol = self.symbols[symbol_id]
+            if symbol in self.positions or bar < next_bar[symbol_id]:
+                continue
+
+            # Size each position as an equal slot of current equity
+            entry_price = float(arrays[symbol]['close'][bar])
+            shares = int(min((cash + invested) / self.max_positions, cash) / entry_price)
+            if shares <= 0:
+                continue
+
+            cash -= shares * entry_price
+            invested += shares * entry_price
+            position = {
+                'shares': shares,
+                'entry_price': entry_price,
+                'entry_time': to_timestamp(timestamp),
+                'target_price': entry_price * (1 + self.target_profit_pct),
+                'stop_price': entry_price * (1 - self.stop_loss_pct)
+            }
+            self.positions[symbol] = position
+
+            exit_bar = exit_indexes[symbol_id].first_hit(
+                bar + 1, position['target_price'], position['stop_price']
+            )
+            if exit_bar is not None:
+                heapq.heappush(exits, (arrays[symbol]['timestamp'][exit_bar], symbol_id, exit_bar))
+
+        while exits:
+            _, exit_symbol, exit_bar = heapq.heappop(exits)
+            close_position(exit_symbol, exit_bar)
+
+        # Open positions are carried at cost, as in the single-symbol backtest
+        self.capital = cash + invested
+
+    def get_all_trades(self):
+        """All closed trades across symbols, in exit order."""
+        trades = [trade for symbol_trades in self.trades.values() for trade in symbol_trades]
+        return sorted(trades, key=lambda t: t['exit_time'])
+
+    def get_stats(self):
+        """Calculate and return aggregate portfolio statistics."""
+        return calculate_stats(self.get_all_trades(), self.initial_capital, self.capital)
+
+    def get_symbol_stats(self):
+        """Per-symbol statistics; returns are each symbol's contribution to the portfolio."""
+        rows = {}
+        for symbol, trades in self.trades.items():
+            if not trades:
+                continue
+            pl = sum(t['pl'] for t in trades)
+            rows[symbol] = calculate_stats(trades, self.initial_capital, self.initial_capital + pl)
+        return pd.DataFrame.from_dict(rows, orient='index')
+
+
+def main():
+    # Get user input
+    symbols = [s.strip().upper() for s in input("Enter stock symbols separated by commas (e.g., AAPL,MSFT): ").split(',') if s.strip()]
+    days = int(input("Enter number of days to backtest (default: 30): ") or 30)
+    capital = float(input("Enter initial capital (default: 10000): ") or 10000)
+    max_positions = int(input(f"Enter maximum open positions (default: {len(symbols)}): ") or len(symbols))
+
+    # Setup dates
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+
+    # Run backtest
+    backtest = PortfolioBacktest(symbols, capital, max_positions=max_positions)
+    print(f"\nRunning portfolio backtest for {len(symbols)} symbols from {start_date.date()} to {end_date.date()}...")
+    backtest.run_backtest(start_date, end_date)
+
+    print("\n=== Portfolio Statistics ===")
+    stats = backtest.get_stats()
+    if isinstance(stats, str):
+        print(stats)
+        return
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+    print("\n=== Per-Symbol Statistics ===")
+    print(backtest.get_symbol_stats().to_string())
+
+
+if __name__ == "__main__":
+    main()
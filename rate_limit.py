@@ -0,0 +1,171 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import metrics
+
+# Priority classes; lower values are served first when the budget is tight
+ORDERS = 0       # order submission and cancellation
+DECISIONS = 1    # reads a trading decision depends on
+MONITORING = 2   # bookkeeping that can wait
+
+DEFAULT_PRIORITIES = {
+    'submit_order': ORDERS,
+    'cancel_order_by_id': ORDERS,
+    'cancel_orders': ORDERS,
+    'replace_order_by_id': ORDERS,
+    'close_position': ORDERS,
+    'close_all_positions': ORDERS,
+}
+
+_local = threading.local()
+
+
+@contextmanager
+def priority(level):
+    """Run the calls made by this thread inside the block at the given priority class."""
+    previous = getattr(_local, 'priority', None)
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+class TokenBucket:
+    """Thread-safe token bucket that serves waiting callers in priority order."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate          # tokens added per second
+        self.capacity = capacity  # burst size
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._waiting = []        # heap of (priority, sequence) tickets
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority=DECISIONS):
+        """Block until a token is available for this caller; returns seconds waited."""
+        started = time.monotonic()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._refill()
+                if self._waiting[0] == ticket:
+                    if self._tokens >= 1:
+                        heapq.heappop(self._waiting)
+                        self._tokens -= 1
+                        self._cond.notify_all()
+                        return time.monotonic() - started
+                    self._cond.wait((1 - self._tokens) / self.rate)
+                else:
+                    # Someone more urgent is ahead; wait for them to be served
+                    self._cond.wait()
+
+
+class RateLimitedClient:
+    """Wraps an Alpaca REST client so every call spends a token from a shared budget.
+
+    Identical read calls (get_*) made while one is already in flight wait for
+    and share its result instead of issuing another request. Per-endpoint
+    counters in `usage` show where the budget goes.
+    """
+
+    def __init__(self, client, limiter, priorities=None, default_priority=DECISIONS):
+        self.client = client
+        self.limiter = limiter
+        self.priorities = {**DEFAULT_PRIORITIES, **(priorities or {})}
+        self.default_priority = default_priority
+        self.usage = {}       # endpoint -> counters
+        self._in_flight = {}  # call key -> Future for coalesced reads
+        self._lock = threading.Lock()
+
+    def _count(self, endpoint, **increments):
+        with self._lock:
+            counters = self.usage.setdefault(endpoint, {
+                'calls': 0, 'coalesced': 0, 'errors': 0, 'wait_seconds': 0.0, 'seconds': 0.0
+            })
+            for key, value in increments.items():
+                counters[key] += value
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+
+        def call(*args, **kwargs):
+            if not name.startswith('get_'):
+                return self._call(name, attr, args, kwargs)
+
+            key = (name, repr(args), repr(sorted(kwargs.items())))
+            with self._lock:
+                future = self._in_flight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._in_flight[key] = Future()
+            if not owner:
+                self._count(name, coalesced=1)
+                metrics.coalesced_requests.inc(endpoint=name)
+                return future.result()
+
+            try:
+                result = self._call(name, attr, args, kwargs)
+                future.set_result(result)
+                return result
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+
+        call.__name__ = name
+        return call
+
+    def _call(self, name, func, args, kwargs):
+        level = getattr(_local, 'priority', None)
+        if level is None:
+            level = self.priorities.get(name, self.default_priority)
+        waited = self.limiter.acquire(level)
+        metrics.rate_limit_wait_seconds.observe(waited, endpoint=name)
+        started = time.monotonic()
+        outcome = 'ok'
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            outcome = 'error'
+            self._count(name, errors=1)
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self._count(name, calls=1, wait_seconds=waited, seconds=elapsed)
+            metrics.broker_request_seconds.observe(elapsed, endpoint=name)
+            metrics.broker_requests.inc(endpoint=name, symbol=metrics.current_symbol(), outcome=outcome)
+
+    def usage_report(self):
+        """Per-endpoint counters, busiest endpoint first."""
+        with self._lock:
+            rows = [{'endpoint': endpoint, **counters} for endpoint, counters in self.usage.items()]
+        return sorted(rows, key=lambda row: row['calls'], reverse=True)
+
+
+def log_usage(clients):
+    """Log the usage report of every rate-limited client among `clients`."""
+    for client in clients:
+        if not isinstance(client, RateLimitedClient):
+            continue
+        for row in client.usage_report():
+            logging.info(
+                f"API usage {row['endpoint']}: {row['calls']} calls, {row['coalesced']} coalesced, "
+                f"{row['errors']} errors, {row['wait_seconds']:.1f}s queued, {row['seconds']:.1f}s in flight"
+            )
@@ -0,0 +1,77 @@
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+
+
+class MarketScheduler:
+    """Decides when the trading loop should wake up.
+
+    The Alpaca clock is fetched once and cached: it already says when the
+    market next opens or closes, so it only needs refreshing once that
+    moment has passed. While the market is closed the loop sleeps straight
+    through to the open, after running a warm-up shortly before it. While it
+    is open, decisions are aligned to bar closes plus a small offset, so each
+    one sees the bar that just finished.
+    """
+
+    def __init__(self, trading_client, bar_seconds=60, offset_seconds=2, warm_up_seconds=300,
+                 max_clock_age=3600, now=None, sleep=time.sleep):
+        self.trading_client = trading_client
+        self.bar_seconds = bar_seconds          # Bar length to align decisions to
+        self.offset_seconds = offset_seconds    # Delay after a bar closes before deciding
+        self.warm_up_seconds = warm_up_seconds  # How long before the open to warm up
+        self.max_clock_age = max_clock_age      # Refresh the clock at least this often
+        self.now = now or (lambda: datetime.now(timezone.utc))
+        self.sleep = sleep
+        self.clock = None
+        self._fetched_at = None
+
+    def get_clock(self):
+        """Cached market clock, refreshed once its next open/close has passed."""
+        now = self.now()
+        if (self.clock is None
+                or now >= self._next_transition()
+                or (now - self._fetched_at).total_seconds() > self.max_clock_age):
+            self.clock = self.trading_client.get_clock()
+            self._fetched_at = now
+        return self.clock
+
+    def _next_transition(self):
+        return self.clock.next_close if self.clock.is_open else self.clock.next_open
+
+    def is_open(self):
+        return self.get_clock().is_open
+
+    def _sleep_until(self, when):
+        seconds = (when - self.now()).total_seconds()
+        if seconds > 0:
+            self.sleep(seconds)
+
+    def sleep_until_open(self, warm_up=None):
+        """Sleep until the next session starts, calling warm_up() just before it."""
+        clock = self.get_clock()
+        if clock.is_open:
+            return
+        next_open = clock.next_open
+        logging.info(f"Market closed; sleeping until {next_open.isoformat()}")
+
+        if warm_up is not None:
+            self._sleep_until(next_open - timedelta(seconds=self.warm_up_seconds))
+            try:
+                warm_up()
+            except Exception as e:
+                logging.error(f"Warm-up before the open failed: {e}")
+        # A second of slack so the refreshed clock already reports the market open
+        self._sleep_until(next_open + timedelta(seconds=1))
+
+    def seconds_until_next_bar(self):
+        """Seconds until the current bar closes, plus the offset."""
+        now = self.now().timestamp()
+        next_bar = (now // self.bar_seconds + 1) * self.bar_seconds + self.offset_seconds
+        # Right after a bar close we are still inside the offset window
+        if next_bar - now > self.bar_seconds:
+            next_bar -= self.bar_seconds
+        return next_bar - now
+
+    def sleep_until_next_bar(self):
+        self.sleep(self.seconds_until_next_bar())
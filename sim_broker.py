@@ -0,0 +1,469 @@
+import argparse
+import logging
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from alpaca.data.timeframe import TimeFrameUnit
+from alpaca.trading.enums import OrderClass, OrderSide, OrderStatus, OrderType
+from alpaca.trading.models import Clock, Order, Position
+
+from bar_cache import to_utc
+from order_tracker import TERMINAL_STATUSES, status_name
+
+MARKET_TZ = 'America/New_York'
+MINUTE_NS = 60 * 10**9
+HOUR_NS = 60 * MINUTE_NS
+WORKING_STATUSES = {'new', 'accepted', 'partially_filled'}
+
+
+def use_placeholder_credentials():
+    """Set dummy Alpaca keys where no real ones are configured.
+
+    trader builds its default broker clients at import, so importing it needs
+    keys even when a replay, benchmark or test never calls those clients.
+    """
+    os.environ.setdefault("ALPACA_API_KEY", "offline")
+    os.environ.setdefault("ALPACA_API_SECRET", "offline")
+
+
+class ReplayFinished(BaseException):
+    """Raised by SimClock.sleep once the replay end is reached.
+
+    A BaseException, like KeyboardInterrupt, so the trading loops' broad
+    `except Exception` handlers let it through and the loop stops.
+    """
+
+
+class SimClock:
+    """Injectable clock for replays; sleeping advances simulated time instantly."""
+
+    def __init__(self, start, end=None):
+        self._now = to_utc(start)
+        self.end = None if end is None else to_utc(end)
+        self._listeners = []  # callbacks(previous, now) run after time advances
+
+    def now(self):
+        return self._now.to_pydatetime()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def sleep(self, seconds):
+        previous = self._now
+        self._now = self._now + pd.Timedelta(seconds=max(0, seconds))
+        if self.end is not None and self._now >= self.end:
+            self._now = self.end
+        for callback in self._listeners:
+            callback(previous, self._now)
+        if self.end is not None and self._now >= self.end:
+            raise ReplayFinished()
+
+
+def _market_session(day):
+    """(open, close) UTC Timestamps of a regular session, or None on weekends."""
+    if day.weekday() >= 5:
+        return None
+    open_ = pd.Timestamp(datetime.combine(day, datetime.min.time())).tz_localize(MARKET_TZ) + pd.Timedelta(hours=9.5)
+    return open_.tz_convert('UTC'), (open_ + pd.Timedelta(hours=6.5)).tz_convert('UTC')
+
+
+class SimDataClient:
+    """Stand-in for StockHistoricalDataClient(raw_data=True) serving recorded bars.
+
+    `bars` maps symbol -> minute bar column arrays (see engine.BAR_COLUMNS).
+    Only bars that have closed by the simulated time are returned, so
+    traders replayed against it need the broker's clock as their `now`.
+    """
+
+    def __init__(self, bars, clock):
+        self.bars = bars
+        self.clock = clock
+        self.requests = 0
+
+    def _window(self, request):
+        now = pd.Timestamp(self.clock.now())
+        end = to_utc(request.end) if request.end is not None else now
+        return to_utc(request.start).value, min(end, now).value
+
+    def closed_index(self, symbol, now_ns=None):
+        """Number of bars for symbol that have closed by now."""
+        now_ns = pd.Timestamp(self.clock.now()).value if now_ns is None else now_ns
+        return int(np.searchsorted(self.bars[symbol]['timestamp'], now_ns - MINUTE_NS, side='right'))
+
+    def last_close(self, symbol):
+        i = self.closed_index(symbol)
+        return float(self.bars[symbol]['close'][i - 1]) if i else None
+
+    def get_stock_bars(self, request):
+        self.requests += 1
+        symbols = request.symbol_or_symbols
+        symbols = [symbols] if isinstance(symbols, str) else symbols
+        start_ns, end_ns = self._window(request)
+        hourly = request.timeframe.unit == TimeFrameUnit.Hour
+        if hourly:
+            start_ns -= start_ns % HOUR_NS  # Whole hours only
+
+        response = {}
+        for symbol in symbols:
+            if symbol not in self.bars:
+                continue
+            arrays = self.bars[symbol]
+            timestamps = arrays['timestamp']
+            lo = int(np.searchsorted(timestamps, start_ns, side='left'))
+            hi = min(int(np.searchsorted(timestamps, end_ns, side='right')), self.closed_index(symbol, end_ns))
+            if hi <= lo:
+                continue
+            ts = timestamps[lo:hi]
+            high, low, close, volume = (arrays[c][lo:hi] for c in ('high', 'low', 'close', 'volume'))
+            if hourly:
+                # Fold minute bars into (possibly still forming) hour bars
+                hours = ts - ts % HOUR_NS
+                starts = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+                ts = hours[starts]
+                high = np.maximum.reduceat(high, starts)
+                low = np.minimum.reduceat(low, starts)
+                close = close[np.r_[starts[1:] - 1, len(close) - 1]]
+                volume = np.add.reduceat(volume, starts)
+            response[symbol] = [
+                {'t': int(t), 'h': float(h), 'l': float(l), 'c': float(c), 'v': float(v)}
+                for t, h, l, c, v in zip(ts, high, low, close, volume)
+            ]
+        return response
+
+
+class SimTradingClient:
+    """Stand-in for TradingClient that fills orders against SimDataClient bars.
+
+    Market orders fill at the last closed bar's close when submitted. Working
+    limit and stop orders are checked against each bar as the clock passes
+    it: a sell limit fills when the high reaches it and a sell stop when the
+    low does, at the order's price, with the target checked first as in the
+    backtest engine. Bracket legs are held until their entry fills and cancel
+    each other once one fills. Sessions are 9:30-16:00 New York time on
+    weekdays, without holidays.
+    """
+
+    def __init__(self, data_client, clock, cash=100000):
+        self.data = data_client
+        self.clock = clock
+        self.cash = cash
+        self.orders = {}     # order id -> Order
+        self._working = {}   # order id -> limit/stop Order waiting for a price
+        self._parents = {}   # bracket leg id -> entry Order
+        self.positions = {}  # symbol -> [qty, avg entry price]
+        self.fills = []      # (time, symbol, side, qty, price)
+        self.requests = 0
+        clock.add_listener(self._on_advance)
+
+    # Clock
+
+    def get_clock(self):
+        self.requests += 1
+        now = pd.Timestamp(self.clock.now())
+        day = now.tz_convert(MARKET_TZ).date()
+        is_open = False
+        next_open = next_close = None
+        for offset in range(8):
+            session = _market_session(day + timedelta(days=offset))
+            if session is None:
+                continue
+            open_, close = session
+            if offset == 0 and open_ <= now < close:
+                is_open, next_close = True, close
+            if next_close is None and now < close:
+                next_close = close
+            if next_open is None and now < open_:
+                next_open = open_
+            if next_open is not None and next_close is not None:
+                break
+        return Clock(timestamp=now.to_pydatetime(), is_open=is_open,
+                     next_open=next_open.to_pydatetime(), next_close=next_close.to_pydatetime())
+
+    # Orders
+
+    def _new_order(self, symbol, side, type, qty, order_class=OrderClass.SIMPLE, limit_price=None,
+                   stop_price=None, status=OrderStatus.NEW, time_in_force='day'):
+        now = self.clock.now()
+        return Order(
+            id=uuid.uuid4(), client_order_id=str(uuid.uuid4()), created_at=now, updated_at=now,
+            submitted_at=now, asset_id=uuid.uuid4(), symbol=symbol, asset_class='us_equity',
+            order_class=order_class, order_type=type, type=type, side=side, time_in_force=time_in_force,
+            status=status, extended_hours=False, qty=str(qty), filled_qty='0',
+            limit_price=None if limit_price is None else str(limit_price),
+            stop_price=None if stop_price is None else str(stop_price), legs=[]
+        )
+
+    def submit_order(self, order_data):
+        self.requests += 1
+        side = OrderSide(status_name(order_data.side))
+        type = OrderType(status_name(order_data.type))
+        order_class = OrderClass(status_name(order_data.order_class or OrderClass.SIMPLE))
+        order = self._new_order(order_data.symbol, side, type, float(order_data.qty), order_class,
+                                getattr(order_data, 'limit_price', None), getattr(order_data, 'stop_price', None),
+                                time_in_force=status_name(order_data.time_in_force))
+        if order_class == OrderClass.BRACKET:
+            exit_side = OrderSide.SELL if side == OrderSide.BUY else OrderSide.BUY
+            order.legs = [
+                self._new_order(order.symbol, exit_side, OrderType.LIMIT, order.qty, order_class,
+                                limit_price=order_data.take_profit.limit_price, status=OrderStatus.HELD),
+                self._new_order(order.symbol, exit_side, OrderType.STOP, order.qty, order_class,
+                                stop_price=order_data.stop_loss.stop_price, status=OrderStatus.HELD),
+            ]
+        self.orders[str(order.id)] = order
+        for leg in order.legs:
+            self.orders[str(leg.id)] = leg
+            self._parents[str(leg.id)] = order
+        self._set_status(order, order.status)
+
+        if type == OrderType.MARKET:
+            price = self.data.last_close(order.symbol)
+            if price is None:
+                self._set_status(order, OrderStatus.REJECTED)
+            else:
+                self._fill(order, price)
+        return order
+
+    def _set_status(self, order, status):
+        order.status = status
+        order.updated_at = self.clock.now()
+        if status_name(status) in WORKING_STATUSES and order.type in (OrderType.LIMIT, OrderType.STOP):
+            self._working[str(order.id)] = order
+        else:
+            self._working.pop(str(order.id), None)
+
+    def _fill(self, order, price):
+        qty = float(order.qty)
+        self.fills.append((self.clock.now(), order.symbol, status_name(order.side), qty, price))
+        position = self.positions.setdefault(order.symbol, [0.0, 0.0])
+        if order.side == OrderSide.BUY:
+            position[1] = (position[0] * position[1] + qty * price) / (position[0] + qty)
+            position[0] += qty
+            self.cash -= qty * price
+        else:
+            position[0] -= qty
+            self.cash += qty * price
+        if position[0] == 0:
+            del self.positions[order.symbol]
+
+        order.filled_qty = str(qty)
+        order.filled_avg_price = str(price)
+        order.filled_at = self.clock.now()
+        self._set_status(order, OrderStatus.FILLED)
+
+        parent = self._parents.get(str(order.id))
+        if parent is not None:
+            # One exit leg filled; the other is cancelled
+            for leg in parent.legs:
+                if leg is not order and status_name(leg.status) not in TERMINAL_STATUSES:
+                    self._set_status(leg, OrderStatus.CANCELED)
+        else:
+            for leg in order.legs or []:
+                self._set_status(leg, OrderStatus.NEW)
+
+    def _on_advance(self, previous, now):
+        """Match working orders against every bar that closed between previous and now."""
+        working = {}
+        for order in self._working.values():
+            working.setdefault(order.symbol, []).append(order)
+
+        for symbol, orders in working.items():
+            arrays = self.data.bars[symbol]
+            lo = self.data.closed_index(symbol, pd.Timestamp(previous).value)
+            hi = self.data.closed_index(symbol, pd.Timestamp(now).value)
+            # Limits (targets) before stops, as in the backtest engine
+            orders.sort(key=lambda o: o.type != OrderType.LIMIT)
+            for i in range(lo, hi):
+                for order in orders:
+                    if status_name(order.status) in TERMINAL_STATUSES:
+                        continue
+                    sell = order.side == OrderSide.SELL
+                    if order.type == OrderType.LIMIT:
+                        price = float(order.limit_price)
+                        hit = arrays['high'][i] >= price if sell else arrays['low'][i] <= price
+                    else:
+                        price = float(order.stop_price)
+                        hit = arrays['low'][i] <= price if sell else arrays['high'][i] >= price
+                    if hit:
+                        self._fill(order, price)
+
+    def get_orders(self, filter=None):
+        """Orders matching a GetOrdersRequest, selected, sorted and limited like Alpaca's endpoint.
+
+        nested=True lists bracket legs only under their entry. after and
+        until are exclusive bounds on submission time; the default is the 50
+        newest open orders.
+        """
+        self.requests += 1
+        status = status_name(getattr(filter, 'status', None) or 'open')
+        symbols = getattr(filter, 'symbols', None)
+        nested = getattr(filter, 'nested', None)
+        after, until = (getattr(filter, name, None) for name in ('after', 'until'))
+        after = None if after is None else to_utc(after).to_pydatetime()
+        until = None if until is None else to_utc(until).to_pydatetime()
+        side = getattr(filter, 'side', None)
+        orders = []
+        for order in self.orders.values():
+            if nested and str(order.id) in self._parents:
+                continue
+            done = status_name(order.status) in TERMINAL_STATUSES
+            if (status == 'open' and done) or (status == 'closed' and not done):
+                continue
+            if symbols and order.symbol not in symbols:
+                continue
+            if side is not None and status_name(order.side) != status_name(side):
+                continue
+            submitted = order.submitted_at
+            if (after is not None and submitted <= after) or (until is not None and submitted >= until):
+                continue
+            orders.append(order)
+        descending = status_name(getattr(filter, 'direction', None) or 'desc') == 'desc'
+        orders.sort(key=lambda o: o.submitted_at, reverse=descending)
+        return orders[:getattr(filter, 'limit', None) or 50]
+
+    def get_order_by_id(self, order_id):
+        self.requests += 1
+        return self.orders[str(order_id)]
+
+    def cancel_order_by_id(self, order_id):
+        self.requests += 1
+        order = self.orders[str(order_id)]
+        if status_name(order.status) in TERMINAL_STATUSES:
+            raise ValueError(f"order {order_id} is already {status_name(order.status)}")
+        self._set_status(order, OrderStatus.CANCELED)
+        for leg in order.legs or []:
+            if status_name(leg.status) not in TERMINAL_STATUSES:
+                self._set_status(leg, OrderStatus.CANCELED)
+
+    # Positions
+
+    def _position(self, symbol):
+        qty, avg_price = self.positions[symbol]
+        price = self.data.last_close(symbol) or avg_price
+        reserved = sum(
+            float(o.qty) for o in self.orders.values()
+            if o.symbol == symbol and o.side == OrderSide.SELL
+            and status_name(o.status) in ('new', 'accepted', 'held')
+        )
+        return Position(
+            asset_id=uuid.uuid4(), symbol=symbol, exchange='NASDAQ', asset_class='us_equity',
+            avg_entry_price=str(avg_price), qty=str(qty), qty_available=str(max(0.0, qty - reserved)), side='long',
+            market_value=str(qty * price), cost_basis=str(qty * avg_price),
+            unrealized_pl=str(qty * (price - avg_price)), unrealized_plpc=str(price / avg_price - 1),
+            unrealized_intraday_pl='0', unrealized_intraday_plpc='0',
+            current_price=str(price), lastday_price=str(price), change_today='0'
+        )
+
+    def get_all_positions(self):
+        self.requests += 1
+        return [self._position(symbol) for symbol in self.positions]
+
+    def get_open_position(self, symbol):
+        self.requests += 1
+        if symbol not in self.positions:
+            raise ValueError(f"position does not exist for {symbol}")
+        return self._position(symbol)
+
+
+class SimBroker:
+    """Clock, data client and trading client wired together for one replay."""
+
+    def __init__(self, bars, start, end, cash=100000):
+        self.clock = SimClock(start, end)
+        self.data_client = SimDataClient(bars, self.clock)
+        self.trading_client = SimTradingClient(self.data_client, self.clock, cash)
+
+    def scheduler(self, **kwargs):
+        # Imported here so the broker itself doesn't pull in the scheduler
+        from scheduler import MarketScheduler
+        return MarketScheduler(self.trading_client, now=self.clock.now, sleep=self.clock.sleep, **kwargs)
+
+    def order_book(self, **kwargs):
+        from order_book import OrderBook
+        return OrderBook(self.trading_client, now=self.clock.now, **kwargs)
+
+    def replay(self, bot, **scheduler_kwargs):
+        """Run bot.run(scheduler) until the replay ends; returns timing and activity stats.
+
+        bot is a OnePercentTrader or MultiSymbolTrader built with this
+        broker's clients and now=broker.clock.now. Decision latency is measured by timing every step().
+        """
+        traders = list(getattr(bot, 'traders', {}).values()) or [bot]
+        latencies = []  # Seconds per step() call
+        for trader in traders:
+            def timed(*args, _step=trader.step, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return _step(*args, **kwargs)
+                finally:
+                    latencies.append(time.perf_counter() - started)
+            trader.step = timed
+
+        sim_start = self.clock.now()
+        started = time.perf_counter()
+        try:
+            bot.run(self.scheduler(**scheduler_kwargs))
+        except ReplayFinished:
+            pass
+        wall = time.perf_counter() - started
+
+        decisions = len(latencies)
+        latencies = np.array(latencies or [0.0])
+        equity = self.trading_client.cash + sum(
+            qty * (self.data_client.last_close(symbol) or price)
+            for symbol, (qty, price) in self.trading_client.positions.items()
+        )
+        return {
+            'simulated_seconds': (self.clock.now() - sim_start).total_seconds(),
+            'wall_seconds': wall,
+            'speedup': (self.clock.now() - sim_start).total_seconds() / wall if wall else float('inf'),
+            'decisions': decisions,
+            'decision_p50_ms': float(np.percentile(latencies, 50) * 1000),
+            'decision_p99_ms': float(np.percentile(latencies, 99) * 1000),
+            'trading_requests': self.trading_client.requests,
+            'data_requests': self.data_client.requests,
+            'fills': len(self.trading_client.fills),
+            'equity': equity,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay OnePercentTrader against recorded bars")
+    parser.add_argument("symbol")
+    parser.add_argument("--days", type=int, default=5, help="trading days to replay, ending yesterday")
+    parser.add_argument("--investment", type=float, default=10000)
+    parser.add_argument("--cash", type=float, default=100000)
+    parser.add_argument("--synthetic", action="store_true", help="replay seeded synthetic bars instead of Alpaca's")
+    parser.add_argument("--order-book", action="store_true", help="look orders and positions up in a local OrderBook")
+    parser.add_argument("--max-gb", type=float, help="bar cache size limit in GB (default: the cache's saved limit)")
+    args = parser.parse_args()
+    symbol = args.symbol.upper()
+    if args.synthetic:
+        use_placeholder_credentials()
+
+    from backtest import OnePercentBacktest
+    from bar_cache import open_cache
+    from synthetic import SyntheticBars
+    from trader import OnePercentTrader
+
+    end = pd.Timestamp.now(tz='UTC').normalize()
+    # Calendar days; bars from before the replay start warm the indicators up
+    start = end - pd.Timedelta(days=int(args.days * 7 / 5) + 2)
+    source = SyntheticBars() if args.synthetic else None
+    bars = OnePercentBacktest(symbol, cache=None if source else open_cache(args.max_gb), source=source).get_bar_arrays(
+        (start - pd.Timedelta(days=7)).tz_localize(None).to_pydatetime(), end.tz_localize(None).to_pydatetime())
+
+    logging.getLogger().setLevel(logging.WARNING)  # The trader logs every decision
+    broker = SimBroker({symbol: bars}, start, end, cash=args.cash)
+    trader = OnePercentTrader(symbol, args.investment, trading_client=broker.trading_client,
+                              data_client=broker.data_client, now=broker.clock.now,
+                              order_book=broker.order_book() if args.order_book else None)
+    for key, value in broker.replay(trader).items():
+        print(f"{key}: {value:,.3f}" if isinstance(value, float) else f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import sqlite3
+import threading
+import time
+import logging
+
+from alpaca.trading.enums import QueryOrderStatus
+from alpaca.trading.models import Order, Position
+
+from order_tracker import TERMINAL_STATUSES, open_orders, paged_orders, status_name
+
+# Status for orders found finished during reconcile whose final status isn't known yet
+CLOSED = 'closed'
+FINISHED_STATUSES = TERMINAL_STATUSES | {CLOSED}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    symbol TEXT PRIMARY KEY,
+    qty REAL NOT NULL,
+    entry_price REAL NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_symbol ON orders (symbol);
+CREATE TABLE IF NOT EXISTS event_cursors (
+    stream TEXT PRIMARY KEY,
+    event_id TEXT,
+    event_at TEXT NOT NULL
+);
+"""
+
+
+class StateStore:
+    """Trader state kept in a local SQLite database in WAL mode.
+
+    Holds each symbol's position and entry price, the last seen status of
+    every order, and the id and time of the last trade update processed.
+    After a restart, traders restore themselves from here instead of each
+    asking the broker, and reconcile() brings the whole file up to date with
+    a fixed handful of account-wide requests, writing only what changed.
+    """
+
+    def __init__(self, path='trader_state.db'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')  # Durable enough with WAL, far fewer fsyncs
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql, rows):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(sql, rows)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _read(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # Positions
+
+    def save_position(self, symbol, position):
+        """Persist a symbol's Position (or filled entry Order); None clears it."""
+        if position is None:
+            self._write('DELETE FROM positions WHERE symbol = ?', [(symbol,)])
+            return
+        if isinstance(position, Order):
+            # An order's qty is what was asked for; only the filled part is held
+            qty, entry_price = position.filled_qty, position.filled_avg_price
+        else:
+            qty, entry_price = position.qty, position.avg_entry_price
+        self._write(
+            'INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?)',
+            [(symbol, float(qty), float(entry_price), f'{type(position).__name__}:{position.json()}', time.time())]
+        )
+
+    def load_position(self, symbol):
+        """The stored Position or Order for a symbol, or None."""
+        rows = self._read('SELECT data FROM positions WHERE symbol = ?', (symbol,))
+        if not rows:
+            return None
+        kind, data = rows[0][0].split(':', 1)
+        return (Order if kind == 'Order' else Position).parse_raw(data)
+
+    def position_symbols(self):
+        return {row[0] for row in self._read('SELECT symbol FROM positions')}
+
+    # Orders
+
+    def save_order_states(self, orders):
+        """Persist the status of each Order (or (order_id, symbol, status) tuple)."""
+        rows = []
+        now = time.time()
+        for order in orders:
+            if isinstance(order, tuple):
+                order_id, symbol, status = order
+            else:
+                order_id, symbol, status = order.id, order.symbol, order.status
+            rows.append((str(order_id), symbol, status_name(status), now))
+        if rows:
+            self._write('INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?)', rows)
+
+    def order_states(self, symbol=None):
+        """order id -> last known status, for one symbol or all."""
+        if symbol is None:
+            rows = self._read('SELECT order_id, status FROM orders')
+        else:
+            rows = self._read('SELECT order_id, status FROM orders WHERE symbol = ?', (symbol,))
+        return dict(rows)
+
+    def prune_orders(self, older_than_days=7):
+        """Drop finished orders that haven't changed in a while."""
+        cutoff = time.time() - older_than_days * 86400
+        statuses = sorted(FINISHED_STATUSES)
+        self._write(
+            f'DELETE FROM orders WHERE updated_at < ? AND status IN ({",".join("?" * len(statuses))})',
+            [(cutoff, *statuses)]
+        )
+
+    # Trade update cursor
+
+    def set_cursor(self, stream, event_id, event_at):
+        self._write('INSERT OR REPLACE INTO event_cursors VALUES (?, ?, ?)',
+                    [(stream, event_id, event_at.isoformat())])
+
+    def cursor(self, stream):
+        """(event id, ISO timestamp) of the last processed event on a stream, or None."""
+        rows = self._read('SELECT event_id, event_at FROM event_cursors WHERE stream = ?', (stream,))
+        return rows[0] if rows else None
+
+    def attach(self, order_tracker):
+        """Persist every trade update the tracker receives."""
+        order_tracker.add_listener(self._on_trade_update)
+
+    def _on_trade_update(self, update):
+        self.save_order_states([update.order])
+        self.set_cursor('trade_updates', update.execution_id and str(update.execution_id), update.timestamp)
+
+    # Startup
+
+    def reconcile(self, trading_client):
+        """Bring the stored state up to date with the broker and return what changed.
+
+        Uses one positions request, then pages through the open orders and
+        the orders submitted since the last processed trade update, 500 at
+        a time, however many symbols there are. Afterwards, orders that
+        finished more than a week ago are pruned.
+        """
+        changed = {'positions': [], 'orders': []}
+
+        positions = {p.symbol: p for p in trading_client.get_all_positions()}
+        stored = {row[0]: (row[1], row[2]) for row in self._read('SELECT symbol, qty, entry_price FROM positions')}
+        for symbol in stored.keys() - positions.keys():
+            self.save_position(symbol, None)
+            changed['positions'].append(symbol)
+        for symbol, position in positions.items():
+            if stored.get(symbol) != (float(position.qty), float(position.avg_entry_price)):
+                self.save_position(symbol, position)
+                changed['positions'].append(symbol)
+
+        known = self.order_states()
+        updates = open_orders(trading_client)
+        cursor = self.cursor('trade_updates')
+        if cursor is not None:
+            # Orders submitted while we were down, including ones already finished
+            updates += paged_orders(trading_client, QueryOrderStatus.ALL, after=cursor[1])
+
+        # Stored open orders the broker no longer lists as open finished while
+        # we were away
+        listed = {str(o.id) for o in updates}
+        for order_id, status in known.items():
+            if status not in FINISHED_STATUSES and order_id not in listed:
+                updates.append((order_id, self._symbol_of(order_id), CLOSED))
+
+        delta = []
+        for order in updates:
+            order_id, status = (order[0], order[2]) if isinstance(order, tuple) else (str(order.id), status_name(order.status))
+            if known.get(order_id) != status:
+                delta.append(order)
+                known[order_id] = status
+        self.save_order_states(delta)
+        changed['orders'] = [o[0] if isinstance(o, tuple) else str(o.id) for o in delta]
+        self.prune_orders()
+
+        logging.info(f"State reconciled: {len(changed['positions'])} positions "
+                     f"and {len(changed['orders'])} orders changed")
+        return changed
+
+    def _symbol_of(self, order_id):
+        rows = self._read('SELECT symbol FROM orders WHERE order_id = ?', (order_id,))
+        return rows[0][0] if rows else ''
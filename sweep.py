@@ -0,0 +1,164 @@
+import argparse
+import itertools
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from backtest import OnePercentBacktest, calculate_stats
+from bar_cache import open_cache
+from engine import BAR_COLUMNS, ExitIndex, simulate
+from indicators import volume_spike_mask
+
+PARAMETERS = ('volume_window', 'volume_multiplier', 'target_profit_pct', 'stop_loss_pct')
+
+# Per-worker state, set up once by _init_worker
+_arrays = None
+_exit_index = None
+_mask = (None, None)  # (volume parameters, entry mask) of the last task
+
+
+def _init_worker(data_dir):
+    """Memory-map the shared bar arrays read-only in each worker process."""
+    global _arrays, _exit_index, _mask
+    _arrays = {
+        column: np.load(os.path.join(data_dir, f'{column}.npy'), mmap_mode='r')
+        for column in BAR_COLUMNS
+    }
+    # Exit searches only depend on the bars, so one index serves every cell
+    _exit_index = ExitIndex(_arrays['high'], _arrays['low'])
+    _mask = (None, None)
+
+
+def _run_cells(task):
+    """Backtest every exit combination for one set of entry parameters."""
+    volume_window, volume_multiplier, exits, initial_capital = task
+
+    global _mask
+    # Entry signals only depend on the volume parameters; keep the last mask
+    # for a worker handed the same ones again, but no more, since each is a
+    # bool per bar
+    key = (volume_window, volume_multiplier)
+    if _mask[0] != key:
+        _mask = (key, volume_spike_mask(_arrays['volume'], window=volume_window, multiplier=volume_multiplier))
+    entry_mask = _mask[1]
+
+    rows = []
+    for target_profit_pct, stop_loss_pct in exits:
+        trades, capital, _ = simulate(
+            _arrays, entry_mask, initial_capital, target_profit_pct, stop_loss_pct, exit_index=_exit_index
+        )
+        stats = calculate_stats(trades, initial_capital, capital)
+        if isinstance(stats, str):
+            stats = {'Total Trades': 0}
+        rows.append({
+            'volume_window': volume_window,
+            'volume_multiplier': volume_multiplier,
+            'target_profit_pct': target_profit_pct,
+            'stop_loss_pct': stop_loss_pct,
+            'return_pct': (capital - initial_capital) / initial_capital * 100,
+            **stats
+        })
+    return rows
+
+
+def _make_tasks(grid, initial_capital, workers):
+    """Group grid cells by entry parameters, split so every worker stays busy."""
+    entries = list(itertools.product(grid['volume_window'], grid['volume_multiplier']))
+    exits = list(itertools.product(grid['target_profit_pct'], grid['stop_loss_pct']))
+    chunks = max(1, -(-workers * 4 // len(entries)))
+    size = max(1, -(-len(exits) // chunks))
+
+    tasks = []
+    for volume_window, volume_multiplier in entries:
+        for i in range(0, len(exits), size):
+            tasks.append((int(volume_window), float(volume_multiplier), exits[i:i + size], initial_capital))
+    return tasks
+
+
+def run_sweep(arrays, grid, initial_capital=10000, workers=None):
+    """Backtest every cell of a parameter grid in parallel.
+
+    `grid` maps each name in PARAMETERS to a list of values; missing names use
+    the OnePercentBacktest defaults. Returns a DataFrame of get_stats results,
+    best total return first.
+    """
+    grid = {
+        'volume_window': [20],
+        'volume_multiplier': [1.2],
+        'target_profit_pct': [0.01],
+        'stop_loss_pct': [0.005],
+        **grid
+    }
+    workers = workers or os.cpu_count()
+
+    # Write the bars once; workers memory-map them instead of each getting a copy
+    data_dir = tempfile.mkdtemp(prefix='sweep-')
+    try:
+        for column in BAR_COLUMNS:
+            np.save(os.path.join(data_dir, f'{column}.npy'), np.ascontiguousarray(arrays[column]))
+
+        tasks = _make_tasks(grid, initial_capital, workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,)) as pool:
+            rows = [row for rows in pool.map(_run_cells, tasks) for row in rows]
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    results = pd.DataFrame(rows)
+    return results.sort_values('return_pct', ascending=False, ignore_index=True)
+
+
+def parse_values(text, cast=float):
+    """Parse '0.005,0.01' as a list or 'start:stop:step' as an inclusive range."""
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        values = np.arange(start, stop + step / 2, step)
+        return [cast(round(value, 10)) for value in values]
+    return [cast(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep for the 1% backtest")
+    parser.add_argument('symbol', type=str.upper, help="Stock symbol to backtest (e.g., AAPL)")
+    parser.add_argument('--days', type=int, default=30, help="Number of days to backtest")
+    parser.add_argument('--capital', type=float, default=10000, help="Initial capital")
+    parser.add_argument('--target', default='0.01', help="target_profit_pct values, list or start:stop:step")
+    parser.add_argument('--stop', default='0.005', help="stop_loss_pct values, list or start:stop:step")
+    parser.add_argument('--window', default='20', help="Volume window lengths, list or start:stop:step")
+    parser.add_argument('--multiplier', default='1.2', help="Volume spike multipliers, list or start:stop:step")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--top', type=int, default=20, help="Number of rows to print")
+    parser.add_argument('--output', help="Write the full ranked table to this CSV file")
+    parser.add_argument('--max-gb', type=float, help="Bar cache size limit in GB (default: the cache's saved limit)")
+    args = parser.parse_args()
+
+    grid = {
+        'target_profit_pct': parse_values(args.target),
+        'stop_loss_pct': parse_values(args.stop),
+        'volume_window': parse_values(args.window, cast=lambda v: int(float(v))),
+        'volume_multiplier': parse_values(args.multiplier),
+    }
+    cells = np.prod([len(values) for values in grid.values()])
+
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=args.days)
+    print(f"Loading {args.symbol} bars from {start_date.date()} to {end_date.date()}...")
+    arrays = OnePercentBacktest(args.symbol, args.capital, cache=open_cache(args.max_gb)).get_bar_arrays(start_date, end_date)
+
+    print(f"Running {cells} backtests over {len(arrays['timestamp'])} bars...")
+    results = run_sweep(arrays, grid, initial_capital=args.capital, workers=args.workers)
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Saved results to {args.output}")
+
+    print(f"\n=== Top {args.top} Parameter Sets ===")
+    print(results.drop(columns='return_pct').head(args.top).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from bar_cache import to_utc
+from bar_sources import BarSource
+from engine import BAR_COLUMNS
+from ingest import column_dtype
+
+MARKET_TZ = 'America/New_York'
+SESSION_MINUTES = 390
+TRADING_DAYS_PER_YEAR = 252
+MINUTE_NS = 60 * 10**9
+
+
+def u_shaped_profile(minutes=SESSION_MINUTES, open_weight=3.0, close_weight=2.0, decay=30.0):
+    """Relative volume for each session minute, heaviest at the open and close; averages 1."""
+    t = np.arange(minutes)
+    profile = (1 + (open_weight - 1) * np.exp(-t / decay)
+               + (close_weight - 1) * np.exp(-(minutes - 1 - t) / decay))
+    return profile / profile.mean()
+
+
+class SyntheticBars(BarSource):
+    """Seeded minute bars for any symbol and date range, generated offline.
+
+    Prices follow geometric Brownian motion with an annual drift and
+    volatility, or, when regimes are given as (drift, volatility,
+    volume_factor) tuples, a Markov chain that switches regime between
+    sessions with probability switch_prob. Volume follows an intraday
+    profile (U-shaped by default) with lognormal noise, and each minute has a
+    spike_rate chance of a volume spike spike_multiplier times normal.
+
+    Bars cover weekday sessions from 9:30 to 16:00 New York time, without
+    holidays. A given symbol, seed and day always produce the same bars,
+    whatever range they are requested in: each day's open is read from a
+    daily path that starts at `origin`, and its minutes are generated from
+    that day's own seed as a bridge to the next day's open.
+    """
+
+    def __init__(self, seed=0, price=100.0, drift=0.05, volatility=0.25, regimes=None, switch_prob=0.02,
+                 base_volume=5000.0, volume_sigma=0.4, volume_profile=None,
+                 spike_rate=0.005, spike_multiplier=4.0, origin='2000-01-03'):
+        self.seed = seed
+        self.price = price
+        self.regimes = np.asarray(regimes if regimes is not None else [(drift, volatility, 1.0)], dtype=np.float64)
+        self.switch_prob = switch_prob
+        self.base_volume = base_volume
+        self.volume_sigma = volume_sigma
+        self.volume_profile = np.asarray(
+            u_shaped_profile() if volume_profile is None else volume_profile, dtype=np.float64)
+        if len(self.volume_profile) != SESSION_MINUTES:
+            raise ValueError(f"volume_profile needs {SESSION_MINUTES} values, got {len(self.volume_profile)}")
+        self.spike_rate = spike_rate
+        self.spike_multiplier = spike_multiplier
+        self.origin = pd.Timestamp(origin).normalize()
+        self._daily = {}  # symbol -> (log open per session, regime per session)
+        self._opens = None  # UTC open (ns) of each session since origin
+        self._opens_through = None  # Last date _opens covers
+
+    def _symbol_key(self, symbol):
+        return zlib.crc32(symbol.encode())
+
+    def _daily_path(self, symbol, sessions):
+        """Log open price and regime for the first `sessions` sessions since origin."""
+        cached = self._daily.get(symbol)
+        if cached is not None and len(cached[0]) >= sessions:
+            return cached
+
+        # A year of slack, so chunked reads don't regenerate on every call
+        n = sessions + TRADING_DAYS_PER_YEAR
+        key = self._symbol_key(symbol)
+        # Separate streams, so a longer path keeps the same prefix
+        shocks = np.random.default_rng([self.seed, key, 0]).standard_normal(n)
+        switches = np.random.default_rng([self.seed, key, 1]).random(n)
+
+        regime = np.zeros(n, dtype=np.intp)
+        count = len(self.regimes)
+        if count > 1:
+            current = 0
+            for i in range(1, n):
+                if switches[i] < self.switch_prob:
+                    # switches[i] / switch_prob is uniform too; use it to pick the next regime
+                    current = (current + 1 + int(switches[i] / self.switch_prob * (count - 1))) % count
+                regime[i] = current
+
+        drift, volatility = self.regimes[regime, 0], self.regimes[regime, 1]
+        returns = ((drift - volatility**2 / 2) / TRADING_DAYS_PER_YEAR
+                   + volatility / np.sqrt(TRADING_DAYS_PER_YEAR) * shocks)
+        log_open = np.log(self.price) + np.concatenate(([0.0], np.cumsum(returns[:-1])))
+        self._daily[symbol] = (log_open, regime)
+        return self._daily[symbol]
+
+    def _session_opens(self, through):
+        """UTC open times (ns) of sessions from origin up to at least the date `through`."""
+        if self._opens_through is None or self._opens_through < through:
+            # A year of slack, so chunked reads don't rebuild the calendar on every call
+            through = through + pd.Timedelta(days=365)
+            dates = pd.bdate_range(self.origin, through)
+            self._opens = (dates.tz_localize(MARKET_TZ) + pd.Timedelta(hours=9, minutes=30)).tz_convert('UTC').asi8
+            self._opens_through = through
+        return self._opens
+
+    def get_bars(self, symbols, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        return {symbol: self.fetch(symbol, start, end, columns, price_dtype, volume_dtype) for symbol in symbols}
+
+    def fetch(self, symbol, start, end, columns=BAR_COLUMNS, price_dtype=np.float64, volume_dtype=np.float64):
+        """Column arrays of minute bars for start..end (inclusive), like ingest.to_arrays."""
+        start, end = to_utc(start), to_utc(end)
+        if start.tz_convert(None).normalize() < self.origin:
+            raise ValueError(f"Synthetic bars start at {self.origin.date()}, got {start}")
+
+        opens = self._session_opens(end.tz_convert(MARKET_TZ).tz_localize(None).normalize())
+        # Sessions whose bars overlap the range
+        first = np.searchsorted(opens, start.value - (SESSION_MINUTES - 1) * MINUTE_NS, side='left')
+        last = np.searchsorted(opens, end.value, side='right')
+        if first >= last:
+            return {column: np.empty(0, dtype=column_dtype(column, price_dtype, volume_dtype)) for column in columns}
+
+        log_open, regime = self._daily_path(symbol, last + 1)
+        days = np.arange(first, last)
+        minute = np.arange(SESSION_MINUTES)
+
+        key = self._symbol_key(symbol)
+        normals = np.empty((len(days), 4, SESSION_MINUTES))
+        uniforms = np.empty((len(days), SESSION_MINUTES))
+        for row, day in enumerate(days):
+            rng = np.random.default_rng([self.seed, key, 2, day])
+            normals[row] = rng.standard_normal((4, SESSION_MINUTES))
+            uniforms[row] = rng.random(SESSION_MINUTES)
+
+        # Brownian bridge from each day's open to the next day's open
+        day_regime = regime[days]
+        minute_sigma = self.regimes[day_regime, 1] / np.sqrt(TRADING_DAYS_PER_YEAR * SESSION_MINUTES)
+        walk = np.cumsum(normals[:, 0] * minute_sigma[:, None], axis=1)
+        fraction = (minute + 1) / SESSION_MINUTES
+        day_return = log_open[days + 1] - log_open[days]
+        log_close = log_open[days, None] + walk - fraction * (walk[:, -1:] - day_return[:, None])
+
+        close = np.exp(log_close)
+        open_ = np.concatenate((np.exp(log_open[days, None]), close[:, :-1]), axis=1)
+        high = np.maximum(open_, close) * np.exp(np.abs(normals[:, 1]) * minute_sigma[:, None] / 2)
+        low = np.minimum(open_, close) * np.exp(-np.abs(normals[:, 2]) * minute_sigma[:, None] / 2)
+
+        volume = (self.base_volume * self.regimes[day_regime, 2][:, None] * self.volume_profile
+                  * np.exp(self.volume_sigma * normals[:, 3] - self.volume_sigma**2 / 2))
+        volume[uniforms < self.spike_rate] *= self.spike_multiplier
+        volume = np.maximum(np.round(volume), 1)
+
+        values = {
+            'timestamp': opens[days, None] + minute * MINUTE_NS,
+            'open': open_,
+            'high': high,
+            'low': low,
+            'close': close,
+            'volume': volume,
+            'trade_count': np.maximum(np.round(volume / 100), 1),
+            'vwap': (high + low + close) / 3,
+        }
+        timestamp = values['timestamp'].ravel()
+        lo = np.searchsorted(timestamp, start.value, side='left')
+        hi = np.searchsorted(timestamp, end.value, side='right')
+        return {
+            column: np.ascontiguousarray(
+                values[column].ravel()[lo:hi], dtype=column_dtype(column, price_dtype, volume_dtype))
+            for column in columns
+        }
@@ -0,0 +1,94 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backfill import Backfill, _windows
+from bar_cache import BarCache, to_utc
+from bar_sources import AlpacaBarSource
+from synthetic import SyntheticBars
+
+START = datetime(2021, 3, 1)
+END = datetime(2021, 3, 3)
+SYMBOLS = ['CCC', 'AAA', 'EMPTY', 'BBB']
+
+
+class PagedDataClient:
+    """Raw-data client that answers like the API: by symbol, then time, at most `limit` bars."""
+
+    def __init__(self, bars):
+        self.bars = bars
+        self.requests = []
+
+    def get_stock_bars(self, request):
+        self.requests.append(request)
+        start, end = to_utc(request.start).value, to_utc(request.end).value
+        response = {}
+        remaining = request.limit
+        for symbol in sorted(request.symbol_or_symbols):
+            arrays = self.bars.get(symbol)
+            if arrays is None or not remaining:
+                continue
+            lo = np.searchsorted(arrays['timestamp'], start, side='left')
+            hi = min(np.searchsorted(arrays['timestamp'], end, side='right'), lo + remaining)
+            if hi > lo:
+                response[symbol] = [
+                    {'t': int(arrays['timestamp'][i]), 'h': float(arrays['high'][i]), 'l': float(arrays['low'][i]),
+                     'c': float(arrays['close'][i]), 'v': float(arrays['volume'][i])}
+                    for i in range(lo, hi)
+                ]
+                remaining -= hi - lo
+        return response
+
+
+def test_pages_add_up_to_the_full_range():
+    source = SyntheticBars()
+    bars = {symbol: source.fetch(symbol, START, END) for symbol in ('AAA', 'BBB', 'CCC')}
+    client = PagedDataClient(bars)
+
+    # 2 sessions of 390 bars per symbol, so pages end part way through a symbol
+    result = AlpacaBarSource(client, page_limit=500).get_bars(SYMBOLS, START, END)
+
+    assert len(client.requests) > 3
+    assert all(request.limit == 500 for request in client.requests)
+    assert set(result) == set(SYMBOLS)
+    assert len(result['EMPTY']['timestamp']) == 0
+    for symbol, arrays in bars.items():
+        for column, values in arrays.items():
+            np.testing.assert_array_equal(result[symbol][column], values)
+
+
+def test_checkpoint_ignores_a_torn_last_line(tmp_path):
+    checkpoint = tmp_path / 'checkpoint.jsonl'
+    checkpoint.write_text(
+        json.dumps({'key': 'AAA/1Min/2021-03-01/2021-03-15', 'bars': 3900}) + '\n'
+        + json.dumps({'key': 'BBB/1Min/2021-03-01/2021-03-15', 'bars': 3900}) + '\n'
+        + '{"key": "CCC/1Min/2021-03-0'
+    )
+    backfill = Backfill(BarCache(str(tmp_path / 'cache')), SyntheticBars(), checkpoint=str(checkpoint))
+
+    assert backfill.load_checkpoint() == {'AAA/1Min/2021-03-01/2021-03-15', 'BBB/1Min/2021-03-01/2021-03-15'}
+
+
+def test_plan_skips_checkpointed_and_cached_windows(tmp_path):
+    source = SyntheticBars()
+    cache = BarCache(str(tmp_path / 'cache'))
+    checkpoint = tmp_path / 'checkpoint.jsonl'
+    backfill = Backfill(cache, source, checkpoint=str(checkpoint), batch_size=2, chunk_days=7)
+    start, end = to_utc('2021-03-01'), to_utc('2021-03-29')
+    first, second = list(_windows(start, end, 7))[:2]
+
+    # AAA's first window is checkpointed, BBB's second was cached by a backtest
+    checkpoint.write_text(json.dumps({'key': backfill._key('AAA', *first), 'bars': 1950}) + '\n')
+    cache.get('BBB', source.timeframe, second[0], second[1] - pd.Timedelta(minutes=1),
+              lambda s, e: source.fetch('BBB', s, e))
+
+    chunks = backfill.plan(['AAA', 'BBB', 'CCC'], start, end)
+    pending = {window: [symbol for symbols, *chunk in chunks if tuple(chunk) == window for symbol in symbols]
+               for window in _windows(start, end, 7)}
+    assert pending[first] == ['BBB', 'CCC']
+    assert pending[second] == ['AAA', 'CCC']
+    assert all(symbols == ['AAA', 'BBB', 'CCC'] for window, symbols in pending.items()
+               if window not in (first, second))
+    assert all(len(symbols) <= 2 for symbols, _, _ in chunks)
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest import OnePercentBacktest
+from bar_sources import MemoryBarSource
+from synthetic import SyntheticBars
+
+START = datetime(2021, 3, 1)
+END = datetime(2021, 4, 15)
+BARS = MemoryBarSource({'TEST': SyntheticBars(seed=7).fetch('TEST', START, END)})
+
+
+def run(engine, **kwargs):
+    backtest = OnePercentBacktest('TEST', engine=engine, source=BARS, **kwargs)
+    backtest.run_backtest(START, END)
+    return backtest
+
+
+@pytest.mark.parametrize('price_dtype, volume_dtype', [(np.float64, np.float64), (np.float32, np.int64)])
+def test_engines_make_the_same_trades(price_dtype, volume_dtype):
+    loop, *others = [run(engine, price_dtype=price_dtype, volume_dtype=volume_dtype)
+                     for engine in OnePercentBacktest.ENGINES]
+    assert len(loop.trades) > 100
+    assert loop.position is not None  # Still in a trade when the bars run out
+
+    for backtest in others:
+        assert backtest.trades == loop.trades, backtest.engine
+        assert backtest.capital == loop.capital, backtest.engine
+        assert backtest.position == loop.position, backtest.engine
+
+
+@pytest.mark.parametrize('chunk_days', [1, 3, 7])
+def test_streaming_carries_positions_across_chunks(chunk_days):
+    vectorized = run('vectorized')
+    streaming = run('streaming', chunk_days=chunk_days)
+
+    boundaries = pd.date_range(START + timedelta(days=chunk_days), END, freq=f'{chunk_days}D', tz='UTC',
+                               inclusive='left')
+    held_over = [t for t in vectorized.trades
+                 if ((t['entry_time'] < boundaries) & (boundaries <= t['exit_time'])).any()]
+    assert held_over
+
+    assert streaming.trades == vectorized.trades
+    assert streaming.capital == vectorized.capital
+    assert streaming.position == vectorized.position
@@ -0,0 +1,94 @@
+import os
+import resource
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_cache import BarCache
+from synthetic import SyntheticBars
+
+START = datetime(2021, 1, 4)
+END = datetime(2021, 4, 1)
+
+
+@pytest.fixture
+def few_open_files():
+    """Lower the open-file limit below what one memmap per cached column would need."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(soft, 128), hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+
+
+def test_long_cached_range_reads_within_the_open_file_limit(tmp_path, few_open_files):
+    source = SyntheticBars()
+    fetches = []
+
+    def fetch(start, end):
+        fetches.append((start, end))
+        return source.fetch('TEST', start, end)
+
+    cache = BarCache(str(tmp_path))
+    first = cache.get('TEST', source.timeframe, START, END, fetch)
+    assert len(fetches) == 1
+
+    # 88 cached days of 5 columns each
+    cached = cache.get('TEST', source.timeframe, START, END, fetch)
+    assert len(fetches) == 1
+    for column, values in first.items():
+        np.testing.assert_array_equal(cached[column], values)
+
+
+def fill(cache, source, start, end):
+    return cache.get('TEST', source.timeframe, start, end, lambda s, e: source.fetch('TEST', s, e))
+
+
+def fetch_nothing(start, end):
+    raise AssertionError(f'fetched {start}..{end} from a cached range')
+
+
+def test_reopening_reads_the_index_instead_of_walking(tmp_path, monkeypatch):
+    source = SyntheticBars()
+    fill(BarCache(str(tmp_path)), source, START, END)
+
+    def walk(*args, **kwargs):
+        raise AssertionError('cache walked on open')
+
+    monkeypatch.setattr('bar_cache.os.walk', walk)
+    cache = BarCache(str(tmp_path))
+    assert cache.has('TEST', source.timeframe, pd.Timestamp('2021-02-01'))
+    assert cache.get('TEST', source.timeframe, START, END, fetch_nothing)['close'].size
+
+
+def test_cache_without_an_index_is_indexed_on_open(tmp_path):
+    source = SyntheticBars()
+    cache = BarCache(str(tmp_path))
+    fill(cache, source, START, END)
+    size = cache._size
+    cache.close()
+    for name in os.listdir(tmp_path):
+        if name.startswith('index.db'):
+            os.remove(tmp_path / name)
+
+    cache = BarCache(str(tmp_path))
+    assert cache._size == size
+    assert cache.get('TEST', source.timeframe, START, END, fetch_nothing)['close'].size
+
+
+def test_least_recently_used_days_are_evicted_across_reopening(tmp_path):
+    source = SyntheticBars()
+    cache = BarCache(str(tmp_path))
+    fill(cache, source, datetime(2021, 3, 1), datetime(2021, 3, 5, 23, 59))
+    day_size = cache._size // 5
+    # Reading the first day makes the second the least recently used
+    fill(cache, source, datetime(2021, 3, 1), datetime(2021, 3, 1, 23, 59))
+    cache.close()
+
+    cache = BarCache(str(tmp_path), max_bytes=5 * day_size + day_size // 2)
+    fill(cache, source, datetime(2021, 3, 8), datetime(2021, 3, 8, 23, 59))
+    cached = [day for day in pd.date_range('2021-03-01', '2021-03-08') if cache.has('TEST', source.timeframe, day)]
+    assert [day.day for day in cached] == [1, 3, 4, 5, 8]
@@ -0,0 +1,69 @@
+import uuid
+
+import pandas as pd
+from alpaca.trading.enums import OrderClass, OrderSide, TimeInForce
+from alpaca.trading.requests import LimitOrderRequest, MarketOrderRequest, StopLossRequest, TakeProfitRequest
+
+from order_tracker import OrderTracker, cancel_orders
+from sim_broker import SimBroker
+from synthetic import SyntheticBars
+
+START = pd.Timestamp('2021-03-01 15:00', tz='UTC')  # 10:00 in New York
+
+
+def broker_with_orders():
+    """A filled bracket entry with working exit legs, plus a resting limit sell."""
+    bars = {'TEST': SyntheticBars().fetch('TEST', START.normalize(), START.normalize() + pd.Timedelta(days=1))}
+    broker = SimBroker(bars, START, START + pd.Timedelta(days=1))
+    client = broker.trading_client
+    entry = client.submit_order(MarketOrderRequest(
+        symbol='TEST', qty=10, side=OrderSide.BUY, time_in_force=TimeInForce.GTC, order_class=OrderClass.BRACKET,
+        take_profit=TakeProfitRequest(limit_price=1000.0), stop_loss=StopLossRequest(stop_price=1.0)))
+    resting = client.submit_order(LimitOrderRequest(
+        symbol='TEST', qty=5, side=OrderSide.SELL, time_in_force=TimeInForce.DAY, limit_price=1000.0))
+    return client, entry, resting
+
+
+def test_cancel_orders_reports_each_final_status():
+    client, entry, resting = broker_with_orders()
+    target, stop = entry.legs
+    unknown = str(uuid.uuid4())
+
+    result = cancel_orders(client, [target.id, resting.id, entry.id, unknown], timeout=0.2, poll_interval=0.05)
+
+    assert result['orders'] == {
+        str(target.id): 'canceled',
+        str(resting.id): 'canceled',
+        str(entry.id): 'filled',  # Filled before the cancel arrived
+        unknown: 'pending',       # The broker never heard of it
+    }
+    assert set(result['errors']) == {str(entry.id), unknown}
+    assert 'already filled' in result['errors'][str(entry.id)]
+    assert result['complete'] is False
+    assert 0 < result['seconds'] < 5
+    # Only the requested leg was cancelled
+    assert stop.status == 'new'
+
+
+def test_cancel_orders_confirms_from_trade_updates():
+    client, entry, resting = broker_with_orders()
+    tracker = OrderTracker(client)
+    cancel_order_by_id = client.cancel_order_by_id
+
+    def cancel_and_stream(order_id):
+        cancel_order_by_id(order_id)
+        tracker.record(client.orders[str(order_id)], 'canceled')
+
+    client.cancel_order_by_id = cancel_and_stream
+    ids = [leg.id for leg in entry.legs] + [resting.id, entry.id]
+    requests = client.requests
+
+    result = cancel_orders(client, ids, tracker=tracker, timeout=5)
+
+    assert result['orders'] == {str(order_id): status for order_id, status in zip(
+        ids, ['canceled', 'canceled', 'canceled', 'filled'])}
+    assert list(result['errors']) == [str(entry.id)]
+    assert result['complete'] is True
+    assert result['seconds'] < 1  # No waiting out the deadline
+    # One cancel per order, plus one lookup for the rejected one
+    assert client.requests - requests == len(ids) + 1
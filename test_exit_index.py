@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from engine import ExitIndex
+
+SHAPES = [(2, 1), (3, 2), (8, 1), (8, 4), (64, 4)]
+
+
+def linear_first_hit(high, low, start, target_price, stop_price):
+    for i in range(start, len(high)):
+        if high[i] >= target_price or low[i] <= stop_price:
+            return i
+    return None
+
+
+def boundaries(n, sizes, most=50):
+    """Indices on and either side of every multiple of sizes, thinned evenly to about `most`."""
+    edges = sorted({edge + offset for size in sizes for edge in range(size, n, size)
+                    for offset in (-1, 0, 1) if edge + offset < n})
+    return edges[::max(1, len(edges) // most)]
+
+
+def random_bars(n, seed=0, nan_fraction=0.05):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.1, n))
+    high = close + rng.uniform(0, 0.05, n)
+    low = close - rng.uniform(0, 0.05, n)
+    gaps = rng.random(n) < nan_fraction
+    high[gaps] = np.nan
+    low[gaps] = np.nan
+    return high, low
+
+
+@pytest.mark.parametrize('block, lead_blocks', SHAPES)
+def test_first_hit_matches_a_linear_scan(block, lead_blocks):
+    high, low = random_bars(1000)
+    index = ExitIndex(high, low, block=block, lead_blocks=lead_blocks)
+    rng = np.random.default_rng(1)
+    for start in [0, 1, block - 1, block, len(high) - 1, len(high), len(high) + 5, *rng.integers(0, len(high), 40)]:
+        start = int(start)
+        entry = np.nanmean(high[max(0, start - 1):start + 1]) if start < len(high) else 100.0
+        for target_pct, stop_pct in [(0.001, 0.001), (0.01, 0.01), (0.05, 0.02), (1.0, 0.9)]:
+            target_price, stop_price = entry * (1 + target_pct), entry * (1 - stop_pct)
+            assert index.first_hit(start, target_price, stop_price) == \
+                linear_first_hit(high, low, start, target_price, stop_price), (start, target_pct, stop_pct)
+
+
+@pytest.mark.parametrize('block, lead_blocks', SHAPES)
+def test_hits_on_block_and_level_boundaries(block, lead_blocks):
+    # Three levels above the bars, or two for wide blocks
+    levels = 3 if block ** 3 <= 4096 else 2
+    n = block ** levels + block // 2
+    # The top level's edges are few and the easiest to get wrong, so test them all
+    hits = sorted(set(boundaries(n, [block ** k for k in range(1, levels)] + [lead_blocks * block]))
+                  | set(boundaries(n, [block ** levels], most=n)))
+    for hit in hits:
+        high = np.full(n, 100.0)
+        low = np.full(n, 100.0)
+        high[::7] = np.nan  # NaN bars never hit, and mustn't hide a hit in their block
+        low[::7] = np.nan
+        high[hit] = 102.0
+        index = ExitIndex(high, low, block=block, lead_blocks=lead_blocks)
+        for start in {0, max(0, hit - block), max(0, hit - 1), hit, hit + 1}:
+            assert index.first_hit(start, 101.0, 99.0) == \
+                linear_first_hit(high, low, start, 101.0, 99.0), (hit, start)
+
+
+def test_start_at_or_past_the_end():
+    high, low = random_bars(100, nan_fraction=0)
+    index = ExitIndex(high, low, block=8)
+    assert index.first_hit(len(high), np.inf, -np.inf) is None
+    assert index.first_hit(len(high), -np.inf, np.inf) is None
+    assert index.first_hit(len(high) + 64, -np.inf, np.inf) is None
+    assert index.first_hit(len(high) - 1, -np.inf, np.inf) == len(high) - 1
+    assert ExitIndex(np.empty(0), np.empty(0)).first_hit(0, -np.inf, np.inf) is None
+
+
+def test_all_nan_bars_never_hit():
+    high = np.full(300, np.nan)
+    index = ExitIndex(high, high.copy(), block=4, lead_blocks=2)
+    assert index.first_hit(0, 0.0, 1e9) is None
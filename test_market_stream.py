@@ -0,0 +1,110 @@
+import time
+
+import pandas as pd
+import pytest
+from alpaca.data.enums import DataFeed
+
+from fake_stream import FakeDataStreamServer
+from indicators import RollingWindow
+from market_stream import MarketDataStream
+from trader import OnePercentTrader
+
+# Recent enough to stay inside the trader's hourly volume lookback
+MINUTE = pd.Timestamp.now(tz='UTC').floor('H') - pd.Timedelta(hours=3)
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def stream():
+    server = FakeDataStreamServer().start()
+    stream = MarketDataStream(['TEST'], url_override=server.url)
+    stream.server = server
+    try:
+        yield stream
+    finally:
+        stream.stop()
+        server.stop()
+
+
+def test_trades_and_bars_reach_the_stream_and_trader(stream):
+    server = stream.server
+    bot = OnePercentTrader('TEST', market_data=stream, trading_client=None, data_client=None)
+    bot.hourly_volume = RollingWindow(120)
+    bot.hourly_volume.push(1000.0, MINUTE.floor('H').value)
+    bot.last_volume_bar = MINUTE.floor('H').value
+    bars = []
+    stream.add_bar_listener('TEST', bars.append)
+
+    stream.start()
+    assert server.wait_subscribed()
+    assert server.subscriptions['trades'] == {'TEST'}
+    assert server.subscriptions['bars'] == {'TEST'}
+
+    server.trade('TEST', 101.25, MINUTE + pd.Timedelta(seconds=50))
+    assert wait_until(lambda: stream.latest_price('TEST') == 101.25)
+    assert bot.get_current_price() == 101.25
+
+    # The bar for the same minute is older than the trade, so the price stays put
+    server.bar('TEST', MINUTE, 100.0, 101.5, 99.5, 101.0, 2500)
+    assert wait_until(lambda: len(bars) == 1)
+    assert stream.latest_price('TEST') == 101.25
+    assert stream.closes['TEST'].last == 101.0
+    assert stream.volumes['TEST'].last == 2500
+    assert bot.hourly_volume.last == 3500
+
+    server.bar('TEST', MINUTE + pd.Timedelta(hours=1), 101.0, 102.0, 100.5, 101.75, 1200)
+    assert wait_until(lambda: len(bars) == 2)
+    assert stream.latest_price('TEST') == 101.75
+    assert len(bot.hourly_volume) == 2
+    assert bot.hourly_volume.last == 1200
+
+
+class RecordingDataClient:
+    def __init__(self, bars=None):
+        self.requests = []
+        self.bars = bars or {}  # Raw response: {symbol: [bar dicts]}
+
+    def get_stock_bars(self, request):
+        self.requests.append(request)
+        return self.bars
+
+
+def test_rest_bars_use_the_stream_feed():
+    stream = MarketDataStream(['TEST'], feed=DataFeed.SIP, url_override='ws://127.0.0.1:1')
+    data_client = RecordingDataClient()
+    bot = OnePercentTrader('TEST', market_data=stream, trading_client=None, data_client=data_client)
+    bot.get_current_price()
+    bot._update_hourly_volume()
+    assert [request.feed for request in data_client.requests] == [DataFeed.SIP, DataFeed.SIP]
+
+
+def test_aged_out_window_is_refilled_from_rest():
+    stream = MarketDataStream(['TEST'], url_override='ws://127.0.0.1:1')
+    now = MINUTE.to_pydatetime()
+    hours = pd.date_range(MINUTE - pd.Timedelta(hours=5), periods=5, freq='H')
+    data_client = RecordingDataClient({'TEST': [{'t': hour.isoformat(), 'v': 1000.0} for hour in hours]})
+    bot = OnePercentTrader('TEST', market_data=stream, trading_client=None, data_client=data_client,
+                           now=lambda: now)
+    assert bot.needs_hourly_bars()
+    assert bot.check_market_conditions()
+    assert len(bot.hourly_volume) == 5
+
+    # The stream keeps a filled window current without REST
+    assert not bot.needs_hourly_bars()
+
+    # Nothing streamed for longer than the lookback, e.g. over a long weekend
+    now += pd.Timedelta(hours=200)
+    hours += pd.Timedelta(hours=200)
+    data_client.bars = {'TEST': [{'t': hour.isoformat(), 'v': 1000.0} for hour in hours]}
+    assert bot.needs_hourly_bars()
+    assert bot.check_market_conditions()
+    assert len(bot.hourly_volume) == 5
+    assert data_client.requests[-1].start == (now - pd.Timedelta(hours=120)).replace(tzinfo=None)
@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from alpaca.trading.enums import OrderSide, OrderStatus, OrderType
+
+from order_book import OrderBook
+
+T0 = datetime(2024, 3, 4, 15, 0, tzinfo=timezone.utc)
+
+
+class Clock:
+    def __init__(self):
+        self.value = T0
+
+    def __call__(self):
+        return self.value
+
+    def advance(self, seconds=1):
+        self.value += timedelta(seconds=seconds)
+
+
+def order(status=OrderStatus.NEW, type=OrderType.LIMIT, updated_at=T0, order_id=None):
+    return SimpleNamespace(id=order_id or uuid.uuid4(), symbol='TEST', side=OrderSide.SELL, type=type,
+                           status=status, updated_at=updated_at, submitted_at=T0, created_at=T0, legs=[])
+
+
+def update(o, status, updated_at):
+    return SimpleNamespace(**{**vars(o), 'status': status, 'updated_at': updated_at})
+
+
+class SnapshotClient:
+    """Returns a fixed open-orders snapshot, running during_request() while it is 'in flight'."""
+
+    def __init__(self, snapshot, during_request=None):
+        self.snapshot = snapshot
+        self.during_request = during_request
+
+    def get_orders(self, filter):
+        if self.during_request is not None:
+            self.during_request()
+            self.during_request = None
+        return list(self.snapshot)
+
+
+def ids(orders):
+    return {str(o.id) for o in orders}
+
+
+def test_reconcile_keeps_updates_that_land_while_the_snapshot_is_in_flight():
+    clock = Clock()
+    filled = order()          # Open in the snapshot, filled by the stream meanwhile
+    placed = order()          # Placed after the snapshot was taken
+    amended = order()         # The mirror already holds a newer copy
+    closed = order()          # Gone from the broker, nothing streamed
+    missed = order()          # Open at the broker, never streamed
+    newer_amended = update(amended, OrderStatus.NEW, T0 + timedelta(seconds=30))
+
+    def stream_updates():
+        clock.advance()
+        book.apply(update(filled, OrderStatus.FILLED, clock()))
+        book.apply(placed)
+
+    client = SnapshotClient([filled, update(amended, OrderStatus.NEW, T0), missed], stream_updates)
+    book = OrderBook(client, now=clock)
+    for o in (filled, newer_amended, closed):
+        book.apply(o)
+    clock.advance()
+
+    book.reconcile()
+
+    assert ids(book.open_orders()) == ids([placed, amended, missed])
+    assert book.get(filled.id) is None
+    assert book.get(amended.id) is newer_amended
+    assert book.has_order('TEST', OrderSide.SELL, OrderType.LIMIT)
+
+
+def test_untouched_orders_follow_the_snapshot():
+    clock = Clock()
+    kept, replaced = order(), order()
+    client = SnapshotClient([kept, update(replaced, OrderStatus.NEW, T0 + timedelta(seconds=5))])
+    book = OrderBook(client, now=clock)
+    book.apply(kept)
+    book.apply(replaced)
+    clock.advance()
+
+    book.reconcile()
+    assert book.get(replaced.id).updated_at == T0 + timedelta(seconds=5)
+
+    # The next reconcile no longer treats earlier updates as in flight
+    client.snapshot = []
+    clock.advance(61)
+    assert book.open_orders() == []
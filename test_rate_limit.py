@@ -0,0 +1,143 @@
+import threading
+import time
+
+from rate_limit import DECISIONS, MONITORING, ORDERS, RateLimitedClient, TokenBucket, priority
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+
+def test_waiting_callers_are_served_by_priority():
+    bucket = TokenBucket(rate=4, capacity=1)
+    bucket.acquire()  # Spend the burst, so everyone below has to queue
+    served = []
+
+    def acquire(level):
+        bucket.acquire(level)
+        served.append(level)
+
+    threads = []
+    # Queue in the opposite order of how they should be served
+    for level in (MONITORING, DECISIONS, ORDERS):
+        thread = threading.Thread(target=acquire, args=(level,))
+        thread.start()
+        threads.append(thread)
+        assert wait_until(lambda: len(bucket._waiting) == len(threads))
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert served == [ORDERS, DECISIONS, MONITORING]
+
+
+class SlowClient:
+    """Broker client whose calls block until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+
+    def get_order_by_id(self, order_id):
+        self.calls.append(('get_order_by_id', order_id))
+        self.release.wait(5)
+        if order_id == 'missing':
+            raise KeyError(order_id)
+        return {'id': order_id}
+
+    def cancel_order_by_id(self, order_id):
+        self.calls.append(('cancel_order_by_id', order_id))
+        self.release.wait(5)
+
+
+def call_concurrently(func, *args, count=4):
+    """Start `count` threads calling func(*args); returns (threads, results)."""
+    results = []
+
+    def call():
+        try:
+            results.append(func(*args))
+        except Exception as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_reads_in_flight_share_one_request():
+    slow = SlowClient()
+    client = RateLimitedClient(slow, TokenBucket(rate=1000, capacity=100))
+
+    threads, results = call_concurrently(client.get_order_by_id, 'a')
+    other_threads, other_results = call_concurrently(client.get_order_by_id, 'b', count=1)
+    assert wait_until(lambda: client.usage.get('get_order_by_id', {}).get('coalesced') == 3)
+    assert wait_until(lambda: len(slow.calls) == 2)
+    slow.release.set()
+    for thread in threads + other_threads:
+        thread.join(timeout=5)
+
+    assert sorted(slow.calls) == [('get_order_by_id', 'a'), ('get_order_by_id', 'b')]
+    assert results == [{'id': 'a'}] * 4
+    assert all(result is results[0] for result in results)
+    assert other_results == [{'id': 'b'}]
+    report = client.usage_report()
+    assert [(row['endpoint'], row['calls'], row['coalesced'], row['errors']) for row in report] == [
+        ('get_order_by_id', 2, 3, 0)
+    ]
+
+    # Finished requests are not reused
+    client.get_order_by_id('a')
+    assert len(slow.calls) == 3
+
+
+def test_coalesced_readers_share_the_error():
+    slow = SlowClient()
+    client = RateLimitedClient(slow, TokenBucket(rate=1000, capacity=100))
+
+    threads, results = call_concurrently(client.get_order_by_id, 'missing', count=3)
+    assert wait_until(lambda: client.usage.get('get_order_by_id', {}).get('coalesced') == 2)
+    slow.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(slow.calls) == 1
+    assert [type(result) for result in results] == [KeyError] * 3
+    assert client.usage['get_order_by_id']['errors'] == 1
+
+
+def test_writes_are_never_coalesced():
+    slow = SlowClient()
+    slow.release.set()
+    client = RateLimitedClient(slow, TokenBucket(rate=1000, capacity=100))
+
+    threads, _ = call_concurrently(client.cancel_order_by_id, 'a', count=3)
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert slow.calls == [('cancel_order_by_id', 'a')] * 3
+    assert client.usage['cancel_order_by_id']['coalesced'] == 0
+
+
+def test_priority_context_overrides_the_endpoint_default():
+    levels = []
+
+    class RecordingBucket:
+        def acquire(self, level):
+            levels.append(level)
+            return 0.0
+
+    slow = SlowClient()
+    slow.release.set()
+    client = RateLimitedClient(slow, RecordingBucket())
+    client.get_order_by_id('a')
+    client.cancel_order_by_id('a')
+    with priority(MONITORING):
+        client.cancel_order_by_id('a')
+
+    assert levels == [DECISIONS, ORDERS, MONITORING]
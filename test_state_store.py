@@ -0,0 +1,99 @@
+import time
+
+import pandas as pd
+from alpaca.trading.enums import OrderClass, OrderSide, TimeInForce
+from alpaca.trading.requests import LimitOrderRequest, MarketOrderRequest, StopLossRequest, TakeProfitRequest
+
+from sim_broker import SimBroker
+from state_store import CLOSED, StateStore
+from synthetic import SyntheticBars
+from trader import OnePercentTrader
+
+START = pd.Timestamp('2021-03-01 15:00', tz='UTC')  # 10:00 in New York
+
+
+def sim_broker():
+    bars = {'TEST': SyntheticBars().fetch('TEST', START.normalize(), START.normalize() + pd.Timedelta(days=1))}
+    return SimBroker(bars, START, START + pd.Timedelta(days=1))
+
+
+def buy(client, qty, bracket=False):
+    exits = {}
+    if bracket:
+        exits = dict(order_class=OrderClass.BRACKET, take_profit=TakeProfitRequest(limit_price=1000.0),
+                     stop_loss=StopLossRequest(stop_price=1.0))
+    return client.submit_order(MarketOrderRequest(
+        symbol='TEST', qty=qty, side=OrderSide.BUY, time_in_force=TimeInForce.GTC, **exits))
+
+
+def test_state_survives_reopening(tmp_path):
+    path = str(tmp_path / 'state.db')
+    broker = sim_broker()
+    entry = buy(broker.trading_client, 10, bracket=True)
+    position = broker.trading_client.get_open_position('TEST')
+
+    store = StateStore(path)
+    store.save_position('TEST', position)
+    store.save_position('PART', entry)
+    store.save_order_states([entry, *entry.legs, ('other', 'AAPL', 'canceled')])
+    store.set_cursor('trade_updates', 'event-1', START.to_pydatetime())
+    store.close()
+
+    store = StateStore(path)
+    assert store.load_position('TEST') == position
+    assert store.load_position('PART') == entry
+    assert store.position_symbols() == {'TEST', 'PART'}
+    assert store.order_states('TEST') == {str(entry.id): 'filled', **{str(leg.id): 'new' for leg in entry.legs}}
+    assert store.order_states()['other'] == 'canceled'
+    assert store.cursor('trade_updates') == ('event-1', START.isoformat())
+
+    trader = OnePercentTrader('TEST', trading_client=broker.trading_client, data_client=broker.data_client,
+                              state_store=store, now=broker.clock.now)
+    assert trader.position == position
+    assert trader.entry_price == float(position.avg_entry_price)
+    assert trader.order_states == store.order_states('TEST')
+
+    store.save_position('PART', None)
+    assert store.load_position('PART') is None
+
+
+def test_reconcile_catches_up_with_the_broker(tmp_path):
+    broker = sim_broker()
+    client = broker.trading_client
+    store = StateStore(str(tmp_path / 'state.db'))
+
+    # State as of the last run
+    entry = buy(client, 10, bracket=True)
+    target, stop = entry.legs
+    store.save_position('TEST', client.get_open_position('TEST'))
+    store.save_position('GONE', client.get_open_position('TEST'))
+    store.save_order_states([entry, target, stop, ('lost', 'GONE', 'new')])
+    store.save_order_states([('old-done', 'GONE', 'filled'), ('old-open', 'GONE', 'new')])
+    store._write('UPDATE orders SET updated_at = ? WHERE order_id LIKE ?', [(time.time() - 8 * 86400, 'old-%')])
+    store.set_cursor('trade_updates', None, broker.clock.now())
+
+    # What happened while the trader was down
+    broker.clock.sleep(60)
+    client.cancel_order_by_id(stop.id)
+    added = buy(client, 5)
+    resting = client.submit_order(LimitOrderRequest(
+        symbol='TEST', qty=5, side=OrderSide.SELL, time_in_force=TimeInForce.DAY, limit_price=1000.0))
+
+    changed = store.reconcile(client)
+
+    assert sorted(changed['positions']) == ['GONE', 'TEST']
+    assert store.position_symbols() == {'TEST'}
+    assert store.load_position('TEST').qty == '15.0'
+    assert sorted(changed['orders']) == sorted([str(stop.id), str(added.id), str(resting.id), 'lost', 'old-open'])
+    states = store.order_states()
+    assert states[str(added.id)] == 'filled'
+    assert states[str(resting.id)] == 'new'
+    assert states[str(target.id)] == 'new'
+    # No longer open, and submitted before the cursor or unknown to the broker
+    assert states[str(stop.id)] == CLOSED
+    assert states['lost'] == CLOSED
+    # Finished over a week ago, so pruned; an order only just found closed is kept
+    assert 'old-done' not in states
+    assert states['old-open'] == CLOSED
+
+    assert store.reconcile(client) == {'positions': [], 'orders': []}
@@ -0,0 +1,134 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pandas as pd
+from alpaca.trading.enums import OrderSide, OrderType
+
+from async_trader import AsyncTraderLoop
+from multi_trader import MultiSymbolTrader
+from sim_broker import SimBroker
+from synthetic import SyntheticBars
+from trade_store import TradeStore
+from trader import OnePercentTrader, naive_utc
+
+# Recent enough for the default sync window
+EXIT = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=2)
+NEXT_EXIT = EXIT + timedelta(hours=19, minutes=30)
+
+
+def trade(entry_time, exit_time, pl=10.0):
+    return {'entry_time': entry_time, 'exit_time': exit_time, 'entry_price': 100.0,
+            'exit_price': 100.0 + pl / 10, 'shares': 10.0, 'pl': pl, 'exit_type': 'target'}
+
+
+def order(side, type, submitted_at, filled_at=None, price=100.0, legs=()):
+    return SimpleNamespace(
+        id=uuid.uuid4(), symbol='TEST', side=side, type=type,
+        submitted_at=submitted_at, created_at=submitted_at, filled_at=filled_at,
+        filled_qty='10' if filled_at else '0', filled_avg_price=str(price) if filled_at else None,
+        legs=list(legs)
+    )
+
+
+def bracket(entry_at, exit_at):
+    """A filled bracket entry whose take-profit leg filled at exit_at."""
+    return order(OrderSide.BUY, OrderType.MARKET, entry_at, entry_at, legs=[
+        order(OrderSide.SELL, OrderType.LIMIT, entry_at, exit_at, price=101.0),
+        order(OrderSide.SELL, OrderType.STOP, entry_at),
+    ])
+
+
+class FakeTradingClient:
+    """Closed orders as Alpaca lists them: oldest first, `after` exclusive on submission time."""
+
+    def __init__(self, orders=()):
+        self.orders = list(orders)
+
+    def get_orders(self, filter):
+        after = filter.after.replace(tzinfo=timezone.utc) if filter.after is not None else None
+        orders = sorted((o for o in self.orders if after is None or o.submitted_at > after),
+                        key=lambda o: o.submitted_at)
+        return orders[:filter.limit]
+
+
+def test_append_skips_repeats_but_keeps_trades_sharing_the_last_exit(tmp_path):
+    store = TradeStore(str(tmp_path))
+    first = trade(EXIT - timedelta(hours=2), EXIT)
+    assert store.append('TEST', [first]) == 1
+
+    # A re-sync hands back the recorded trade next to another one exiting at the same moment
+    second = trade(EXIT - timedelta(hours=1), EXIT, pl=-5.0)
+    assert store.append('TEST', [first, second]) == 1
+    assert store.append('TEST', [trade(EXIT - timedelta(hours=3), EXIT - timedelta(minutes=1)), first, second]) == 0
+
+    assert store.load_index('TEST')['rows'] == 2
+    assert store.stats('TEST')['trades'] == 2
+
+
+def test_sync_trades_keeps_entry_submitted_at_the_last_exit(tmp_path):
+    store = TradeStore(str(tmp_path))
+    client = FakeTradingClient([bracket(EXIT - timedelta(hours=5), EXIT)])
+    trader = OnePercentTrader('TEST', trading_client=client, data_client=None)
+    assert trader.sync_trades(store) == 1
+
+    # The next entry went in the moment the previous exit filled
+    client.orders.append(bracket(EXIT, NEXT_EXIT))
+    assert trader.sync_trades(store) == 1
+    assert trader.sync_trades(store) == 0
+
+    frame = store.trade_frame('TEST')
+    assert list(frame['exit_time']) == [EXIT, NEXT_EXIT]
+
+
+def replay_bars(symbols, days=3):
+    """Synthetic bars for `days` sessions plus a warm-up week, and the replay start and end."""
+    start = pd.Timestamp('2021-03-08 14:25', tz='UTC')  # Just before Monday's open
+    bars = {symbol: SyntheticBars(seed=3).fetch(symbol, start - pd.Timedelta(days=7), start + pd.Timedelta(days=days))
+            for symbol in symbols}
+    return bars, start, start + pd.Timedelta(days=days - 1, hours=8)  # Ends after the last close
+
+
+def recorded(store, symbol):
+    return store.stats(symbol)['trades'] if store.load_index(symbol)['rows'] else 0
+
+
+def test_multi_symbol_loop_records_trades_at_the_close(tmp_path):
+    bars, start, end = replay_bars(['AAA', 'BBB'])
+    broker = SimBroker(bars, start, end)
+    store = TradeStore(str(tmp_path))
+    bot = MultiSymbolTrader(list(bars), trading_client=broker.trading_client, data_client=broker.data_client,
+                            trade_store=store, now=broker.clock.now)
+    assert all(t.trade_store is store for t in bot.traders.values())
+    broker.replay(bot)
+
+    since = naive_utc(start.to_pydatetime()) - timedelta(days=1)
+    for symbol, symbol_trader in bot.traders.items():
+        completed = symbol_trader.completed_trades(since)
+        assert completed
+        assert recorded(store, symbol) == len(completed)
+
+
+def test_async_loop_records_trades_at_the_close(tmp_path):
+    bars, start, end = replay_bars(['AAA'])
+    broker = SimBroker(bars, start, end)
+    bot = OnePercentTrader('AAA', trading_client=broker.trading_client, data_client=broker.data_client,
+                           now=broker.clock.now)
+    broker.replay(bot)
+    completed = bot.completed_trades(naive_utc(start.to_pydatetime()) - timedelta(days=1))
+    assert completed
+
+    bot.trade_store = TradeStore(str(tmp_path))
+    loop = AsyncTraderLoop(bot, scheduler=broker.scheduler())
+
+    async def closed_clock_checks():
+        loop._market_open = asyncio.Event()
+        await loop.refresh_clock()
+        await loop.refresh_clock()
+
+    try:
+        asyncio.run(closed_clock_checks())
+    finally:
+        loop.executor.shutdown()
+    assert recorded(bot.trade_store, 'AAA') == len(completed)
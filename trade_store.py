@@ -0,0 +1,261 @@
+import csv
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Journal columns and their on-disk dtypes; exit_type is stored as a code
+JOURNAL_COLUMNS = {
+    'entry_time': np.int64,   # UTC nanoseconds
+    'exit_time': np.int64,
+    'entry_price': np.float64,
+    'exit_price': np.float64,
+    'shares': np.float64,
+    'pl': np.float64,
+    'exit_type': np.uint8,
+}
+EXIT_TYPES = ['target', 'stop', 'other']
+
+CSV_FIELDS = ['entry_time', 'exit_time', 'entry_price', 'exit_price', 'shares', 'pl', 'exit_type']
+
+
+def _empty_stats():
+    return {
+        'trades': 0, 'wins': 0, 'losses': 0,
+        'gross_profit': 0.0, 'gross_loss': 0.0,
+        'max_profit': 0.0, 'max_loss': 0.0,
+        'target_exits': 0, 'stop_exits': 0,
+    }
+
+
+def _add_trade(stats, pl, exit_type):
+    stats['trades'] += 1
+    if pl > 0:
+        stats['wins'] += 1
+        stats['gross_profit'] += pl
+        stats['max_profit'] = max(stats['max_profit'], pl)
+    else:
+        stats['losses'] += 1
+        stats['gross_loss'] += pl
+        stats['max_loss'] = min(stats['max_loss'], pl)
+    if exit_type == 'target':
+        stats['target_exits'] += 1
+    elif exit_type == 'stop':
+        stats['stop_exits'] += 1
+
+
+def _merge_stats(total, stats):
+    for key in ('trades', 'wins', 'losses', 'gross_profit', 'gross_loss', 'target_exits', 'stop_exits'):
+        total[key] += stats[key]
+    total['max_profit'] = max(total['max_profit'], stats['max_profit'])
+    total['max_loss'] = min(total['max_loss'], stats['max_loss'])
+
+
+def format_stats(stats):
+    """Readable performance metrics from aggregate trade stats."""
+    if not stats['trades']:
+        return "No trades recorded"
+
+    total_pl = stats['gross_profit'] + stats['gross_loss']
+    avg_profit = stats['gross_profit'] / stats['wins'] if stats['wins'] else 0
+    avg_loss = stats['gross_loss'] / stats['losses'] if stats['losses'] else 0
+    if stats['gross_loss']:
+        profit_factor = f"{stats['gross_profit'] / -stats['gross_loss']:.2f}"
+    else:
+        profit_factor = "inf" if stats['gross_profit'] else "n/a"
+
+    return {
+        'Total Trades': stats['trades'],
+        'Profitable Trades': stats['wins'],
+        'Losing Trades': stats['losses'],
+        'Win Rate': f"{stats['wins'] / stats['trades'] * 100:.2f}%",
+        'Win/Loss Ratio': f"{stats['wins'] / stats['losses']:.2f}" if stats['losses'] else "inf",
+        'Total P/L': f"${total_pl:,.2f}",
+        'Average P/L': f"${total_pl / stats['trades']:,.2f}",
+        'Average Profit': f"${avg_profit:,.2f}",
+        'Average Loss': f"${avg_loss:,.2f}",
+        'Max Profit': f"${stats['max_profit']:,.2f}",
+        'Max Loss': f"${stats['max_loss']:,.2f}",
+        'Profit Factor': profit_factor,
+        'Target Exits': stats['target_exits'],
+        'Stop-Loss Exits': stats['stop_exits'],
+    }
+
+
+class TradeStore:
+    """Append-only trade journal with a per-symbol, per-date index.
+
+    Each symbol's journal is one raw binary file per column under
+    root/journal/symbol/, only ever appended to. Its index.json records the
+    committed row count, the row range and aggregate stats of every exit date,
+    and running totals, so a summary never re-reads the journal: all-time
+    stats are read straight from the totals, and a date window sums one entry
+    per day. Rows past the committed count (an interrupted append) are
+    truncated away on the next write.
+
+    Alongside the journal, every batch is written to
+    root/{symbol}_trades_{timestamp}.json and appended to
+    root/{symbol}_summary.csv for reading outside Python.
+    """
+
+    def __init__(self, root='trades'):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def _journal_dir(self, symbol):
+        return os.path.join(self.root, 'journal', symbol)
+
+    def _index_path(self, symbol):
+        return os.path.join(self._journal_dir(symbol), 'index.json')
+
+    def load_index(self, symbol):
+        try:
+            with open(self._index_path(symbol)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'rows': 0, 'last_exit': None, 'days': {}, 'totals': _empty_stats()}
+
+    def _save_index(self, symbol, index):
+        path = self._index_path(symbol)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+    def last_exit(self, symbol):
+        """Exit time of the newest recorded trade, as a UTC Timestamp, or None."""
+        last_exit = self.load_index(symbol)['last_exit']
+        return pd.Timestamp(last_exit, tz='UTC') if last_exit is not None else None
+
+    def append(self, symbol, trades):
+        """Record completed trades (dicts like the backtest's); returns how many were new.
+
+        Trades exiting before the last recorded exit are skipped, as are
+        repeats of a recorded trade (same entry and exit time), so re-syncing
+        an overlapping period is harmless.
+        """
+        index = self.load_index(symbol)
+        rows = []
+        for trade in trades:
+            exit_time = pd.Timestamp(trade['exit_time'])
+            exit_time = exit_time.tz_localize('UTC') if exit_time.tzinfo is None else exit_time.tz_convert('UTC')
+            rows.append((exit_time.value, trade))
+        rows.sort(key=lambda row: row[0])
+        seen = set()
+        if index['last_exit'] is not None:
+            rows = [row for row in rows if row[0] >= index['last_exit']]
+            if rows:
+                # Another trade can share the last exit time; only skip the ones recorded
+                day = pd.Timestamp(index['last_exit'], tz='UTC')
+                recorded = self.trades(symbol, day, day)
+                at_last = recorded['exit_time'] == index['last_exit']
+                seen = set(zip(recorded['entry_time'][at_last].tolist(), recorded['exit_time'][at_last].tolist()))
+        unique = []
+        for ns, trade in rows:
+            key = (pd.Timestamp(trade['entry_time']).value, ns)
+            if key not in seen:
+                seen.add(key)
+                unique.append((ns, trade))
+        rows = unique
+        if not rows:
+            return 0
+
+        columns = {
+            'entry_time': [pd.Timestamp(t['entry_time']).value for _, t in rows],
+            'exit_time': [ns for ns, _ in rows],
+            'entry_price': [t['entry_price'] for _, t in rows],
+            'exit_price': [t['exit_price'] for _, t in rows],
+            'shares': [t['shares'] for _, t in rows],
+            'pl': [t['pl'] for _, t in rows],
+            'exit_type': [EXIT_TYPES.index(t['exit_type']) if t['exit_type'] in EXIT_TYPES else 2 for _, t in rows],
+        }
+
+        journal_dir = self._journal_dir(symbol)
+        os.makedirs(journal_dir, exist_ok=True)
+        for column, dtype in JOURNAL_COLUMNS.items():
+            path = os.path.join(journal_dir, f'{column}.bin')
+            with open(path, 'ab') as f:
+                f.truncate(index['rows'] * np.dtype(dtype).itemsize)
+                f.seek(0, os.SEEK_END)
+                f.write(np.asarray(columns[column], dtype=dtype).tobytes())
+
+        # Fold the new rows into the per-day and running aggregates
+        row = index['rows']
+        for ns, trade in rows:
+            day = pd.Timestamp(ns, tz='UTC').strftime('%Y-%m-%d')
+            entry = index['days'].setdefault(day, {'start': row, 'end': row, 'stats': _empty_stats()})
+            entry['end'] = row + 1
+            _add_trade(entry['stats'], float(trade['pl']), trade['exit_type'])
+            _add_trade(index['totals'], float(trade['pl']), trade['exit_type'])
+            row += 1
+        index['rows'] = row
+        index['last_exit'] = rows[-1][0]
+        self._save_index(symbol, index)
+
+        self._write_exports(symbol, [trade for _, trade in rows])
+        return len(rows)
+
+    def _write_exports(self, symbol, trades):
+        records = [
+            {field: str(trade[field]) if field.endswith('_time') else trade[field] for field in CSV_FIELDS}
+            for trade in trades
+        ]
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        batch_stats = _empty_stats()
+        for trade in trades:
+            _add_trade(batch_stats, float(trade['pl']), trade['exit_type'])
+        with open(os.path.join(self.root, f'{symbol}_trades_{timestamp}.json'), 'w') as f:
+            json.dump({'symbol': symbol, 'trades': records, 'summary': format_stats(batch_stats)}, f, indent=2)
+
+        csv_path = os.path.join(self.root, f'{symbol}_summary.csv')
+        new_file = not os.path.exists(csv_path)
+        with open(csv_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            if new_file:
+                writer.writeheader()
+            writer.writerows(records)
+
+    def stats(self, symbol, start=None, end=None):
+        """Aggregate stats for trades exiting on UTC dates start..end (inclusive; None = open)."""
+        index = self.load_index(symbol)
+        if start is None and end is None:
+            return index['totals']
+        start = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else ''
+        end = pd.Timestamp(end).strftime('%Y-%m-%d') if end is not None else '9999'
+        total = _empty_stats()
+        for day, entry in index['days'].items():
+            if start <= day <= end:
+                _merge_stats(total, entry['stats'])
+        return total
+
+    def summary(self, symbol, start=None, end=None):
+        return format_stats(self.stats(symbol, start, end))
+
+    def trades(self, symbol, start=None, end=None):
+        """Journal rows for trades exiting on UTC dates start..end, as arrays."""
+        index = self.load_index(symbol)
+        start = pd.Timestamp(start).strftime('%Y-%m-%d') if start is not None else ''
+        end = pd.Timestamp(end).strftime('%Y-%m-%d') if end is not None else '9999'
+        ranges = [(e['start'], e['end']) for day, e in index['days'].items() if start <= day <= end]
+        if not ranges:
+            return {column: np.empty(0, dtype=dtype) for column, dtype in JOURNAL_COLUMNS.items()}
+
+        # Days are appended in order, so the window is one contiguous row range
+        first = min(r[0] for r in ranges)
+        last = max(r[1] for r in ranges)
+        arrays = {}
+        for column, dtype in JOURNAL_COLUMNS.items():
+            path = os.path.join(self._journal_dir(symbol), f'{column}.bin')
+            arrays[column] = np.memmap(path, dtype=dtype, mode='r', shape=(index['rows'],))[first:last]
+        return arrays
+
+    def trade_frame(self, symbol, start=None, end=None):
+        """Journal rows as a DataFrame with readable times and exit types."""
+        arrays = self.trades(symbol, start, end)
+        df = pd.DataFrame({column: np.asarray(values) for column, values in arrays.items()})
+        df['entry_time'] = pd.to_datetime(df['entry_time'], utc=True)
+        df['exit_time'] = pd.to_datetime(df['exit_time'], utc=True)
+        df['exit_type'] = [EXIT_TYPES[code] for code in df['exit_type']]
+        return df
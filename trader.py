@@ -1,17 +1,32 @@
 import os
 import time
-from datetime import datetime, timedelta
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from alpaca.trading.client import TradingClient
 from alpaca.trading.requests import (
     MarketOrderRequest, LimitOrderRequest, StopOrderRequest,
     OrderRequest, TakeProfitRequest, StopLossRequest
 )
-from alpaca.trading.enums import OrderSide, TimeInForce, OrderType, OrderClass
+from alpaca.trading.enums import OrderSide, TimeInForce, OrderType, OrderClass, QueryOrderStatus
 from alpaca.data.historical import StockHistoricalDataClient
 from alpaca.data.requests import StockBarsRequest
 from alpaca.data.timeframe import TimeFrame
 import logging
+import pandas as pd
+import async_trader
+import metrics
+from engine import to_timestamp
+from indicators import RollingWindow
+from ingest import to_arrays
+from market_stream import DATA_FEED, MarketDataStream
+from order_book import OrderBook
+from order_tracker import OrderTracker, TERMINAL_STATUSES, cancel_orders, open_orders, paged_orders, status_name
+from rate_limit import MONITORING, RateLimitedClient, TokenBucket, log_usage, priority
+from scheduler import MarketScheduler
+from state_store import StateStore
+from trade_store import TradeStore
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,20 +34,43 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Load environment variables
 load_dotenv()
 
+# One request budget for the account (Alpaca allows 200 requests per minute),
+# shared by both clients so bursts queue here instead of failing with 429s
+rate_limiter = TokenBucket(
+    rate=float(os.getenv("ALPACA_RATE_LIMIT", 200)) / 60,
+    capacity=int(os.getenv("ALPACA_RATE_BURST", 10))
+)
+
 # Initialize Alpaca clients
-trading_client = TradingClient(
+trading_client = RateLimitedClient(TradingClient(
     os.getenv("ALPACA_API_KEY"),
     os.getenv("ALPACA_API_SECRET"),
     paper=os.getenv("ALPACA_PAPER", "True").lower() == "true"
-)
+), rate_limiter)
 
-data_client = StockHistoricalDataClient(
+# Raw responses are converted straight to columns, without a Bar object per row
+data_client = RateLimitedClient(StockHistoricalDataClient(
     os.getenv("ALPACA_API_KEY"),
-    os.getenv("ALPACA_API_SECRET")
-)
+    os.getenv("ALPACA_API_SECRET"),
+    raw_data=True
+), rate_limiter)
+
+# Hours of hourly bars averaged by the volume check; at most one bar per hour
+HOURLY_LOOKBACK_HOURS = 120
+
+# How far before the last recorded exit a trade sync starts looking for orders
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+def naive_utc(moment):
+    """An aware datetime as naive UTC, the form alpaca-py request fields expect."""
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
 
 class OnePercentTrader:
-    def __init__(self, symbol, investment_amount=10000):
+    def __init__(self, symbol, investment_amount=10000, market_data=None, order_tracker=None,
+                 fill_timeout=30, trading_client=trading_client, data_client=data_client, order_book=None,
+                 trade_store=None, state_store=None, now=None):
         self.symbol = symbol
         self.investment_amount = investment_amount
         self.position = None
@@ -40,12 +78,67 @@ class OnePercentTrader:
         self.target_profit_pct = 0.01  # 1%
         self.stop_loss_pct = 0.005     # 0.5%
         self.order_states = {}
-
+        self.hourly_volume = None     # RollingWindow of recent hourly volumes
+        self.last_volume_bar = None   # Timestamp (ns) of the newest bar in hourly_volume
+        self.signal_at = None         # When conditions last turned favorable (monotonic)
+        self._volume_lock = threading.Lock()
+
+        # Broker clients default to the module-level ones
+        self.trading_client = trading_client
+        self.data_client = data_client
+        self.now = now or (lambda: datetime.now(timezone.utc))  # Aware UTC; replays pass a simulated clock
+
+        # Optional OrderTracker; when set, fills arrive from the trade_updates stream
+        self.order_tracker = order_tracker
+        self.fill_timeout = fill_timeout  # Seconds to wait for an entry to fill
+
+        # Optional OrderBook; when set, order and position checks are local lookups
+        self.order_book = order_book
+
+        # Optional TradeStore; when set, completed trades are recorded after each session
+        self.trade_store = trade_store
+
+        # Optional StateStore; when set, position and order states survive restarts
+        self.state_store = state_store
+        if state_store is not None:
+            self.position = state_store.load_position(symbol)
+            if self.position is not None:
+                self.entry_price = float(getattr(self.position, 'avg_entry_price', None)
+                                         or self.position.filled_avg_price)
+                logging.info(f"Restored {symbol} position at {self.entry_price} from {state_store.path}")
+            self.order_states = state_store.order_states(symbol)
+
+        # Optional MarketDataStream; when set, prices and volumes come from the websocket
+        self.market_data = market_data
+        self.feed = market_data.feed if market_data is not None else DATA_FEED  # REST bars match the stream
+        if market_data is not None:
+            market_data.add_bar_listener(symbol, self._on_stream_bar)
+
+    def _on_stream_bar(self, bar):
+        """Fold a streamed minute bar into the hourly volume window."""
+        with self._volume_lock:
+            if self.hourly_volume is None:
+                return
+            hour = pd.Timestamp(bar.timestamp).floor('H').value
+            if hour == self.last_volume_bar:
+                self.hourly_volume.replace_last(self.hourly_volume.last + bar.volume)
+            elif hour > self.last_volume_bar:
+                self.hourly_volume.push(bar.volume, hour)
+                self.last_volume_bar = hour
+                self._drop_old_volume()
+
+    @metrics.for_symbol
     def get_current_price(self):
         """Get the current price of the symbol."""
+        if self.market_data is not None:
+            price = self.market_data.latest_price(self.symbol)
+            if price is not None:
+                return price
+            logging.info(f"No fresh streamed price for {self.symbol}, falling back to REST")
+
         try:
             # Use proper datetime objects
-            end_dt = datetime.now()
+            end_dt = naive_utc(self.now())
             start_dt = end_dt - timedelta(minutes=10)  # Get data for the last 10 minutes
             
             logging.info(f"Getting current price for {self.symbol}")
@@ -54,41 +147,74 @@ class OnePercentTrader:
                 symbol_or_symbols=[self.symbol],
                 timeframe=TimeFrame.Minute,
                 start=start_dt,
-                end=end_dt
+                end=end_dt,
+                feed=self.feed
             )
-            bars = data_client.get_stock_bars(request)
-            return bars[self.symbol][-1].close
+            bars = self.data_client.get_stock_bars(request)
+            return float(to_arrays(bars, self.symbol, columns=['close'])['close'][-1])
         except Exception as e:
             logging.error(f"Error getting current price: {e}")
             return None
 
+    @metrics.for_symbol
     def place_buy_order(self):
-        """Place a market buy order."""
+        """Place a market buy with its take-profit and stop-loss legs attached.
+
+        The exits are part of the same bracket request, so the position is
+        protected from the moment it fills.
+        """
         try:
             current_price = self.get_current_price()
             if not current_price:
                 return False
 
-            # Calculate quantity based on investment amount
-            qty = self.investment_amount // current_price
+            # Bracket orders can't be sized by notional; use whole shares
+            qty = int(self.investment_amount // current_price)
+            if qty <= 0:
+                logging.error(f"Investment amount {self.investment_amount} buys no shares at {current_price}")
+                return False
+
+            # Legs are priced off the reference price, as the fill isn't known yet
+            target_price = round(current_price * (1 + self.target_profit_pct), 2)
+            stop_price = round(current_price * (1 - self.stop_loss_pct), 2)
 
-            # Place market buy order
             order_details = MarketOrderRequest(
                 symbol=self.symbol,
                 qty=qty,
                 side=OrderSide.BUY,
-                time_in_force=TimeInForce.DAY
+                time_in_force=TimeInForce.GTC,
+                order_class=OrderClass.BRACKET,
+                take_profit=TakeProfitRequest(limit_price=target_price),
+                stop_loss=StopLossRequest(stop_price=stop_price)
             )
-            order = trading_client.submit_order(order_details)
-            
+            order = self.trading_client.submit_order(order_details)
+            submitted_at = time.monotonic()
+            if self.signal_at is not None:
+                metrics.signal_to_submit_seconds.observe(submitted_at - self.signal_at, symbol=self.symbol)
+                self.signal_at = None
+            self._orders_changed(order)
+            logging.info(f"Bracket buy for {qty} {self.symbol} submitted: target {target_price}, stop {stop_price}")
+
             # Wait for order to fill
-            filled_order = trading_client.get_order_by_id(order.id)
-            while filled_order.status != 'filled':
-                time.sleep(1)
-                filled_order = trading_client.get_order_by_id(order.id)
+            filled_order = self.wait_for_fill(order.id)
+            status = status_name(filled_order.status)
+            if status not in TERMINAL_STATUSES:
+                # Don't leave the rest of a slow or partial fill working; a
+                # filled part without exits is picked up by the next position check
+                logging.warning(f"Buy order {order.id} still {status} after {self.fill_timeout}s, cancelling")
+                self.trading_client.cancel_order_by_id(order.id)
+                filled_order = self.trading_client.get_order_by_id(order.id)
+                self._orders_changed(filled_order)
+
+            if not float(filled_order.filled_qty or 0):
+                logging.error(f"Buy order {order.id} ended {status_name(filled_order.status)} without a fill")
+                return False
 
+            if status_name(filled_order.status) == 'filled':
+                metrics.submit_to_fill_seconds.observe(time.monotonic() - submitted_at, symbol=self.symbol)
             self.entry_price = float(filled_order.filled_avg_price)
             self.position = filled_order
+            self._save_position()
             
             logging.info(f"Buy order filled at {self.entry_price}")
             return True
@@ -97,6 +223,22 @@ class OnePercentTrader:
             logging.error(f"Error placing buy order: {e}")
             return False
 
+    def wait_for_fill(self, order_id):
+        """Wait until an order is done or fill_timeout passes, and return its latest state."""
+        if self.order_tracker is not None:
+            order = self.order_tracker.wait_for_fill(order_id, timeout=self.fill_timeout)
+            if order is not None:
+                return order
+
+        # No stream: poll, but stop on rejection, cancellation or timeout
+        deadline = time.monotonic() + self.fill_timeout
+        order = self.trading_client.get_order_by_id(order_id)
+        while status_name(order.status) not in TERMINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(1)
+            order = self.trading_client.get_order_by_id(order_id)
+        return order
+
+    @metrics.for_symbol
     def place_sell_orders(self):
         """Smart order placement with quantity validation"""
         try:
@@ -104,7 +246,7 @@ class OnePercentTrader:
                 return False
 
             # Get REAL available shares
-            position = trading_client.get_open_position(self.symbol)
+            position = self.trading_client.get_open_position(self.symbol)
             available_qty = int(position.qty_available)
             
             if available_qty <= 0:
@@ -112,8 +254,9 @@ class OnePercentTrader:
                 return False
 
             # Calculate prices
-            target_price = round(float(position.avg_entry_price) * 1.01, 2)
-            stop_price = round(float(position.avg_entry_price) * 0.99, 2)
+            entry_price = float(position.avg_entry_price)
+            target_price = round(entry_price * (1 + self.target_profit_pct), 2)
+            stop_price = round(entry_price * (1 - self.stop_loss_pct), 2)
 
             # Place bracket order
             bracket_order = OrderRequest(
@@ -128,7 +271,7 @@ class OnePercentTrader:
                 stop_loss=StopLossRequest(stop_price=str(stop_price))
             )
             
-            trading_client.submit_order(bracket_order)
+            self._orders_changed(self.trading_client.submit_order(bracket_order))
             logging.info(f"✅ Bracket order placed for {available_qty} shares")
             return True
 
@@ -136,63 +279,81 @@ class OnePercentTrader:
             logging.error(f"Order placement failed: {str(e)[:200]}")
             return False
 
-    def cancel_existing_orders(self):
-        """Cancel orders with retries and verification"""
-        try:
-            # First pass cancellation
-            orders = trading_client.get_orders(status='open')
-            for order in orders:
-                if order.symbol == self.symbol:
-                    trading_client.cancel_order_by_id(order.id)
-                    logging.info(f"Initiated cancellation for order {order.id}")
-
-            # Verify cancellation
-            retries = 0
-            while retries < 3:
-                remaining_orders = [
-                    o for o in trading_client.get_orders(status='open') 
-                    if o.symbol == self.symbol
-                ]
-                
-                if not remaining_orders:
-                    break
-                    
-                for order in remaining_orders:
-                    trading_client.cancel_order_by_id(order.id)
-                    logging.warning(f"Retrying cancellation for {order.id}")
-                
-                time.sleep(1)
-                retries += 1
-
-            # Final check
-            if remaining_orders:
-                logging.error(f"Failed to cancel orders: {[o.id for o in remaining_orders]}")
-                return False
-                
-            return True
-
-        except Exception as e:
-            logging.error(f"Order cancellation error: {str(e)[:200]}")
-            return False
-
-    def check_and_handle_existing_position(self):
-        """Check for existing positions and create exit orders if needed."""
+    def _orders_changed(self, order=None):
+        """Let the order book know about an order we just submitted or cancelled."""
+        if self.order_book is not None:
+            if order is not None:
+                self.order_book.apply(order)
+            self.order_book.changed()
+
+    def _save_position(self):
+        """Persist the current position so a restart doesn't have to ask the broker."""
+        if self.state_store is not None:
+            self.state_store.save_position(self.symbol, self.position)
+
+    def _open_orders(self):
+        """Open orders for this symbol, from the order book when there is one."""
+        if self.order_book is not None:
+            return self.order_book.open_orders(self.symbol)
+        return open_orders(self.trading_client, [self.symbol])
+
+    @metrics.for_symbol
+    def cancel_existing_orders(self, timeout=5):
+        """Cancel all open orders for this symbol at once.
+
+        Returns the cancel_orders result: final status per order, rejected
+        cancel requests, and whether every order was confirmed within timeout.
+        """
+        orders = self._open_orders()
+        result = cancel_orders(self.trading_client, [o.id for o in orders],
+                               tracker=self.order_tracker, timeout=timeout)
+        self._orders_changed()
+        if orders:
+            metrics.cancel_seconds.observe(result['seconds'], symbol=self.symbol)
+
+        for order_id, status in result['orders'].items():
+            logging.info(f"Order {order_id} {status} after cancel request")
+        if not result['complete']:
+            pending = [order_id for order_id, status in result['orders'].items() if status == 'pending']
+            logging.error(f"Failed to cancel orders within {timeout}s: {pending}")
+        return result
+
+    @metrics.for_symbol
+    def check_and_handle_existing_position(self, positions=None, orders=None):
+        """Check for existing positions and create exit orders if needed.
+
+        positions and orders may be passed in when already fetched for this tick.
+        """
         try:
             # Get all positions
-            positions = trading_client.get_all_positions()
-            position = next((p for p in positions if p.symbol == self.symbol), None)
+            if positions is None and self.order_book is not None:
+                position = self.order_book.position(self.symbol)
+            else:
+                if positions is None:
+                    positions = self.trading_client.get_all_positions()
+                position = next((p for p in positions if p.symbol == self.symbol), None)
             
             if position:
                 logging.info(f"Found existing position for {self.symbol}: {position.qty} shares at avg price {position.avg_entry_price}")
                 
                 # Check if there are any existing orders for this symbol
-                orders = trading_client.get_orders()
-                has_tp_order = any(o.symbol == self.symbol and o.side == 'sell' and o.type == 'limit' for o in orders)
-                has_sl_order = any(o.symbol == self.symbol and o.side == 'sell' and o.type == 'stop' for o in orders)
+                if orders is None and self.order_book is not None:
+                    has_tp_order = self.order_book.has_order(self.symbol, 'sell', 'limit')
+                    has_sl_order = self.order_book.has_order(self.symbol, 'sell', 'stop')
+                else:
+                    if orders is None:
+                        orders = open_orders(self.trading_client, [self.symbol])
+                    has_tp_order = any(o.symbol == self.symbol and o.side == 'sell' and o.type == 'limit' for o in orders)
+                    has_sl_order = any(o.symbol == self.symbol and o.side == 'sell' and o.type == 'stop' for o in orders)
                 
                 # Set up the position and entry price
+                changed = (self.position is None
+                           or self._get_position_quantity() != position.qty
+                           or self.entry_price != float(position.avg_entry_price))
                 self.position = position
                 self.entry_price = float(position.avg_entry_price)
+                if changed:
+                    self._save_position()
                 
                 if not has_tp_order or not has_sl_order:
                     logging.info(f"Missing exit orders for existing position. Creating exit orders...")
@@ -202,104 +363,319 @@ class OnePercentTrader:
                     logging.info(f"Exit orders already exist for {self.symbol}. Continuing monitoring...")
                 
                 return True
-            
+
+            if self.position is not None:
+                # The position was closed since we last looked
+                self.position = None
+                self.entry_price = None
+                self._save_position()
             return False
             
         except Exception as e:
             logging.error(f"Error checking existing positions: {e}")
             return False
 
+    @metrics.for_symbol
     def check_market_conditions(self):
         """
         Check if market conditions are favorable for trading.
         This is a simple implementation - you can enhance it with your own criteria.
         """
         try:
-            # Get recent price data
-        # Use datetime objects properly formatted for Alpaca API
-            end_dt = datetime.now()
-            start_dt = end_dt - timedelta(hours=120)  # Get data for the last 24 hours
-        
-            logging.info(f"Requesting bars for {self.symbol} from {start_dt.isoformat()} to {end_dt.isoformat()}")
-        
-            request = StockBarsRequest(
-                symbol_or_symbols=[self.symbol],
-                timeframe=TimeFrame.Hour,
-                start=start_dt,
-                end=end_dt
-            )
-            
-            bars = data_client.get_stock_bars(request)
-            
-            # Simple volume check
-            recent_volume = bars[self.symbol][-1].volume
-            avg_volume = sum(bar.volume for bar in bars[self.symbol]) / len(bars[self.symbol])
-            
-            return recent_volume > avg_volume * 0.8  # 80% of average volume
+            # With a live stream the window is kept current by _on_stream_bar
+            if self.needs_hourly_bars():
+                self._update_hourly_volume()
+            return self.volume_favorable()
         
         except Exception as e:
             logging.error(f"Error checking market conditions: {e}")
             return False
 
-    def monitor_orders(self):
+    def volume_favorable(self):
+        """Whether the latest hourly volume is at least 80% of the rolling average."""
+        with self._volume_lock:
+            if self.hourly_volume is not None:
+                self._drop_old_volume()
+            if not self.hourly_volume:
+                logging.warning(f"No hourly bars for {self.symbol}")
+                return False
+
+            # Simple volume check
+            recent_volume = self.hourly_volume.last
+            avg_volume = self.hourly_volume.mean
+        
+        favorable = recent_volume > avg_volume * 0.8  # 80% of average volume
+        if favorable:
+            self.signal_at = time.monotonic()
+        return favorable
+
+    def needs_hourly_bars(self):
+        """Whether the hourly volume window has to be filled from REST."""
+        if self.market_data is None:
+            return True
+        # The stream keeps a filled window current, but can't refill one that aged out
+        with self._volume_lock:
+            if self.hourly_volume is not None:
+                self._drop_old_volume()
+            return not self.hourly_volume
+
+    def hourly_bars_start(self, end_dt):
+        """Start of the hourly bar request that brings the volume window up to date."""
+        if not self.hourly_volume:
+            return end_dt - timedelta(hours=HOURLY_LOOKBACK_HOURS)
+        # The window is already warm; only fetch from its newest bar on
+        # (naive UTC, which is how the Alpaca client sends naive datetimes)
+        return to_timestamp(self.last_volume_bar).tz_localize(None).to_pydatetime()
+
+    def _update_hourly_volume(self):
+        """Warm up the hourly volume window from REST, or top it up with newer bars."""
+        # Use datetime objects properly formatted for Alpaca API
+        end_dt = naive_utc(self.now())
+        start_dt = self.hourly_bars_start(end_dt)
+        
+        logging.info(f"Requesting bars for {self.symbol} from {start_dt.isoformat()} to {end_dt.isoformat()}")
+        
+        request = StockBarsRequest(
+            symbol_or_symbols=[self.symbol],
+            timeframe=TimeFrame.Hour,
+            start=start_dt,
+            end=end_dt,
+            feed=self.feed
+        )
+        
+        bars = self.data_client.get_stock_bars(request)
+        self.update_hourly_volume(to_arrays(bars, self.symbol, columns=['timestamp', 'volume']))
+
+    def update_hourly_volume(self, arrays):
+        """Add hourly bars (timestamp and volume arrays) to the volume window."""
+        if not len(arrays['timestamp']):
+            return
+
+        with self._volume_lock:
+            if self.hourly_volume is None:
+                # Room for one bar per hour of the lookback; older bars are dropped by age
+                self.hourly_volume = RollingWindow(HOURLY_LOOKBACK_HOURS)
+                self.hourly_volume.warm_up(arrays['volume'], arrays['timestamp'].tolist())
+            else:
+                for timestamp, volume in zip(arrays['timestamp'].tolist(), arrays['volume']):
+                    if timestamp == self.last_volume_bar:
+                        # The newest bar may still have been forming last time
+                        self.hourly_volume.replace_last(volume)
+                    elif timestamp > self.last_volume_bar:
+                        self.hourly_volume.push(volume, timestamp)
+            self.last_volume_bar = max(self.last_volume_bar or 0, int(arrays['timestamp'][-1]))
+            self._drop_old_volume()
+
+    def _drop_old_volume(self):
+        """Keep only bars from the last HOURLY_LOOKBACK_HOURS, like a fresh request would; hold _volume_lock."""
+        self.hourly_volume.drop_before(pd.Timestamp(self.now()).value - HOURLY_LOOKBACK_HOURS * 3600 * 10**9)
+
+    @metrics.for_symbol
+    def monitor_orders(self, orders=None):
         """Track order state changes with expiry alerts"""
         try:
-            orders = trading_client.get_orders()
+            if orders is None and self.order_book is not None:
+                orders = self.order_book.open_orders(self.symbol)
+            elif orders is None:
+                # Bookkeeping only; order submission goes first
+                with priority(MONITORING):
+                    orders = open_orders(self.trading_client, [self.symbol])
+            changed = []
             for order in orders:
                 if order.symbol == self.symbol:
                     status = order.status.value
-                    if status != self.order_states.get(order.id):
+                    if status != self.order_states.get(str(order.id)):
                         logging.info(f"Order {order.id} changed to {status}")
-                        self.order_states[order.id] = status
+                        self.order_states[str(order.id)] = status
+                        changed.append(order)
                     
                     # Alert on stale orders
-                    if (datetime.now() - order.created_at).seconds > 3600:
+                    if (self.now() - order.created_at).total_seconds() > 3600:
                         logging.warning(f"Stale order {order.id} ({status}) older than 1 hour")
+            if changed and self.state_store is not None:
+                self.state_store.save_order_states(changed)
         except Exception as e:
             logging.error(f"Order monitoring failed: {str(e)[:200]}")
 
-    def run(self):
+    @metrics.for_symbol
+    def step(self, positions=None, orders=None, market_ok=None):
+        """Make one trading decision while the market is open.
+
+        Returns 'position' if a position is being held, 'waiting' if conditions
+        are unfavorable, or 'traded' after an entry attempt. Broker snapshots and
+        the market-condition check can be passed in when computed elsewhere.
+        """
+        started = time.monotonic()
+        outcome = self._step(positions, orders, market_ok)
+        metrics.step_seconds.observe(time.monotonic() - started, symbol=self.symbol)
+        metrics.decisions.inc(symbol=self.symbol, outcome=outcome)
+        return outcome
+
+    def _step(self, positions, orders, market_ok):
+        # Check if we have any existing position
+        if self.check_and_handle_existing_position(positions, orders):
+            logging.info("Existing position found. Monitoring...")
+            return 'position'
+
+        # Check market conditions
+        if market_ok is None:
+            market_ok = self.check_market_conditions()
+        if not market_ok:
+            logging.info("Market conditions not favorable. Waiting...")
+            return 'waiting'
+
+        # Place buy order; its exit legs go in with it
+        self.place_buy_order()
+        return 'traded'
+
+    @metrics.for_symbol
+    def warm_up(self):
+        """Bring indicators up to date before the session starts."""
+        self._update_hourly_volume()
+
+    def run(self, scheduler=None):
         """Main trading loop."""
         logging.info(f"Starting trading bot for {self.symbol}")
+        scheduler = scheduler or MarketScheduler(self.trading_client)
         
         while True:
             try:
                 # Check if market is open
-                clock = trading_client.get_clock()
-                if not clock.is_open:
+                if not scheduler.is_open():
                     logging.info("Market is closed. Waiting...")
-                    time.sleep(60)
+                    log_usage([self.trading_client, self.data_client])
+                    if self.trade_store is not None:
+                        self.sync_trades(self.trade_store)
+                    scheduler.sleep_until_open(warm_up=self.warm_up)
                     continue
 
-                # Check if we have any existing position
-                if self.check_and_handle_existing_position():
-                    logging.info("Existing position found. Monitoring...")
-                    time.sleep(60)
-                    continue
-
-                # Check market conditions
-                if not self.check_market_conditions():
-                    logging.info("Market conditions not favorable. Waiting...")
-                    time.sleep(60)
-                    continue
-
-                # Place buy order
-                if self.place_buy_order():
-                    # Place take-profit and stop-loss orders
-                    self.place_sell_orders()
+                with metrics.iteration_seconds.time(loop='trader'):
+                    if self.step() == 'traded':
+                        self.monitor_orders()
 
-                self.monitor_orders()
-
-                time.sleep(60)  # Wait for 1 minute before next iteration
+                # Wait for the next bar to close
+                scheduler.sleep_until_next_bar()
 
             except Exception as e:
                 logging.error(f"Error in main loop: {e}")
                 time.sleep(60)
 
+    @metrics.for_symbol
+    def completed_trades(self, since):
+        """Round trips for this symbol whose entry was submitted after `since`, rebuilt from filled orders."""
+        # Bracket legs come back under their entry
+        orders = paged_orders(self.trading_client, QueryOrderStatus.CLOSED, symbols=[self.symbol],
+                              after=since, nested=True)
+
+        fills = [
+            o for order in orders for o in [order] + list(order.legs or [])
+            if float(o.filled_qty or 0) > 0
+        ]
+        # An exit and the next entry can fill in the same instant; close the old position first
+        fills.sort(key=lambda o: (o.filled_at, status_name(o.side) == 'buy'))
+
+        trades = []
+        shares = 0.0
+        avg_price = 0.0
+        entry_time = None
+        for o in fills:
+            qty = float(o.filled_qty)
+            price = float(o.filled_avg_price)
+            if status_name(o.side) == 'buy':
+                avg_price = (avg_price * shares + price * qty) / (shares + qty)
+                shares += qty
+                entry_time = entry_time or o.filled_at
+                continue
+            if shares <= 0:
+                continue  # Exit of a position opened before the window
+            qty = min(qty, shares)
+            order_type = status_name(o.type)
+            trades.append({
+                'entry_time': entry_time,
+                'exit_time': o.filled_at,
+                'entry_price': avg_price,
+                'exit_price': price,
+                'shares': qty,
+                'pl': (price - avg_price) * qty,
+                'exit_type': {'limit': 'target', 'stop': 'stop'}.get(order_type, 'other')
+            })
+            shares -= qty
+            if shares <= 0:
+                shares, avg_price, entry_time = 0.0, 0.0, None
+        return trades
+
+    def sync_trades(self, store, days=7):
+        """Record trades completed in the past `days` that the store doesn't have yet."""
+        since = naive_utc(self.now()) - timedelta(days=days)
+        last_exit = store.last_exit(self.symbol)
+        if last_exit is not None:
+            # `after` is exclusive, and the next entry can be submitted the moment
+            # the last exit fills; start a little earlier and let the store drop repeats
+            since = max(since, last_exit.tz_localize(None).to_pydatetime() - SYNC_OVERLAP)
+        try:
+            added = store.append(self.symbol, self.completed_trades(since))
+        except Exception as e:
+            logging.error(f"Error syncing trades for {self.symbol}: {e}")
+            return 0
+        if added:
+            logging.info(f"Recorded {added} completed trades for {self.symbol}")
+        return added
+
     def _get_position_quantity(self):
         return self.position.qty if hasattr(self.position, 'qty') else self.position.filled_qty
 
+def print_summary(store, symbol, days=7):
+    """Print all-time and recent performance from the trade store's aggregates."""
+    start = (pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=days)).date()
+    for title, summary in ((f"All trades for {symbol}", store.summary(symbol)),
+                           (f"Past {days} days", store.summary(symbol, start=start))):
+        print(f"\n=== {title} ===")
+        if isinstance(summary, str):
+            print(summary)
+        else:
+            for key, value in summary.items():
+                print(f"{key}: {value}")
+
+
+# Sample trades live in their own store, so they never mix with (or get ahead of) real ones
+SAMPLE_TRADES_ROOT = os.path.join('trades', 'sample')
+
+
+def force_summary(symbol, root=SAMPLE_TRADES_ROOT):
+    """Record a sample profitable trade in a separate store, so the summary files can be checked without trading.
+
+    Returns the sample TradeStore.
+    """
+    store = TradeStore(root)
+    exit_time = pd.Timestamp.now(tz='UTC')
+    entry_price = 100.0
+    store.append(symbol, [{
+        'entry_time': exit_time - pd.Timedelta(minutes=30),
+        'exit_time': exit_time,
+        'entry_price': entry_price,
+        'exit_price': entry_price * 1.01,
+        'shares': 10.0,
+        'pl': entry_price * 0.01 * 10,
+        'exit_type': 'target'
+    }])
+    return store
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OnePercent trading bot")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--summary", metavar="SYMBOL", help="record completed trades and show performance for SYMBOL")
+    mode.add_argument("--force-summary", metavar="SYMBOL", help="write a sample profitable trade for SYMBOL and show the summary")
+    parser.add_argument("--days", type=int, default=7, help="days of order history to check for completed trades")
+    args = parser.parse_args()
+
+    if args.force_summary:
+        symbol = args.force_summary.upper()
+        store = force_summary(symbol)
+        print(f"Sample trade written to {store.root}; the real journal is untouched")
+        print_summary(store, symbol, args.days)
+        exit(0)
+
     # Create .env file if it doesn't exist
     if not os.path.exists(".env"):
         with open(".env", "w") as f:
@@ -309,8 +685,40 @@ if __name__ == "__main__":
         logging.warning("Created .env file. Please fill in your Alpaca API credentials.")
         exit(1)
 
+    if args.summary:
+        symbol = args.summary.upper()
+        store = TradeStore()
+        OnePercentTrader(symbol).sync_trades(store, args.days)
+        print_summary(store, symbol, args.days)
+        exit(0)
+
     symbol = input("Enter the stock symbol to trade (e.g., AAPL): ").upper()
     investment = float(input("Enter the investment amount per trade (default: 10000): ") or 10000)
+
+    # Restore state from the last run, catching up on what changed since
+    state_store = StateStore()
+    try:
+        state_store.reconcile(trading_client)
+    except Exception as e:
+        logging.error(f"Error reconciling saved state: {e}")
     
-    trader = OnePercentTrader(symbol, investment)
-    trader.run()
+    market_data = None
+    order_tracker = None
+    order_book = None
+    if os.getenv("ALPACA_STREAM", "False").lower() == "true":
+        market_data = MarketDataStream([symbol])
+        market_data.start()
+        order_tracker = OrderTracker(trading_client, paper=os.getenv("ALPACA_PAPER", "True").lower() == "true")
+        order_book = OrderBook(trading_client, order_tracker)
+        state_store.attach(order_tracker)
+        order_tracker.start()
+
+    if os.getenv("ALPACA_METRICS_PORT"):
+        metrics.start_http_server(int(os.getenv("ALPACA_METRICS_PORT")))
+
+    trader = OnePercentTrader(symbol, investment, market_data=market_data, order_tracker=order_tracker,
+                              order_book=order_book, trade_store=TradeStore(), state_store=state_store)
+    if os.getenv("ALPACA_ASYNC", "False").lower() == "true":
+        async_trader.run(trader)
+    else:
+        trader.run()